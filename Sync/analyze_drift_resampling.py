@@ -7,10 +7,17 @@ Analyse du drift en supposant que:
 3. On resample Xsens pour avoir le même nombre d'échantillons que TDMS
 """
 
+import os
+import sys
+
 import pandas as pd
 import numpy as np
 from nptdms import TdmsFile
 
+# Estimateurs partagés (sync_estimation.py à la racine du projet)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sync_estimation import trial_drift
+
 print("=" * 80)
 print("ANALYSE DU DRIFT AVEC RESAMPLING")
 print("=" * 80)
@@ -167,4 +174,23 @@ print(f"  Drift:        {drift:+.6f} s")
 print(f"\nDifférence:")
 print(f"  Réduction du drift: {drift_original - drift:.6f} s")
 
+# ============================================================================
+# 7. DRIFT PAR FENÊTRES GLISSANTES (corrélation, régression robuste)
+# ============================================================================
+print("\n" + "=" * 80)
+print("DRIFT PAR FENÊTRES GLISSANTES")
+print("=" * 80)
+
+clock, windows = trial_drift(df_txt, df_tdms.set_index('timestamp').rename(columns={'Edges': 'TDMS_Edges_RoueAR'}),
+                             time_col='timestamp')
+if clock is None:
+    print(f"\n⚠️  Pas assez de fenêtres corrélées ({len(windows)} fenêtres)")
+else:
+    inl = windows[windows['Inlier']]
+    print(f"\nFenêtres retenues: {len(inl)}/{len(windows)}")
+    print(f"  Offset à t=0: {clock.offset(0.0):+.6f} s")
+    print(f"  Drift:        {clock.drift_ppm:+.2f} ppm (2 points: {drift / tdms_duration * 1e6:+.2f} ppm)")
+    print(f"  Résidu RMS:   {np.sqrt(np.mean(inl['Residual_s'] ** 2)) * 1e3:.3f} ms")
+    print(f"  Résidu max:   {inl['Residual_s'].abs().max() * 1e3:.3f} ms")
+
 print("\n" + "=" * 80)
@@ -4,11 +4,19 @@
 Analyse de la détection de mouvement GPS vs TDMS
 """
 
+import os
+import sys
+
 import pandas as pd
 import numpy as np
 from nptdms import TdmsFile
 import matplotlib.pyplot as plt
 
+# Détecteurs partagés (racine du projet)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from onset_detection import cusum_onsets, first_above, hysteresis_onsets
+from wheel_speed import wheel_speed
+
 print("=" * 80)
 print("ANALYSE DE LA DÉTECTION DE MOUVEMENT")
 print("=" * 80)
@@ -57,27 +65,37 @@ print("DÉTECTION AVEC DIFFÉRENTS SEUILS GPS")
 print("=" * 80)
 
 thresholds = [0.1, 0.3, 0.5, 1.0, 2.0]
-for thresh in thresholds:
-    gps_idx = df_txt[df_txt['GPS_Speed'] > thresh].index.min()
-    if pd.notna(gps_idx):
-        gps_time = df_txt.loc[gps_idx, 'timestamp']
-        gps_speed = df_txt.loc[gps_idx, 'GPS_Speed']
+# Tous les seuils en une passe : premier dépassement simple, puis hystérésis (maintien
+# HOLD_S au-dessus du seuil, départ = dernier passage sous le bruit)
+first_idx = first_above(df_txt['GPS_Speed'].values, thresholds)
+onsets, noise = hysteresis_onsets(df_txt['timestamp'], df_txt['GPS_Speed'].values, thresholds)
+print(f"\nBruit à l'arrêt: niveau {noise['Level']:.4f} m/s, sigma {noise['Sigma']:.4f} m/s, seuil bas {noise['Low']:.4f} m/s")
+for thresh, gps_idx, (_, row) in zip(thresholds, first_idx, onsets.iterrows()):
+    if gps_idx >= 0:
         print(f"\nSeuil {thresh:.1f} m/s:")
         print(f"  Index: {gps_idx}")
-        print(f"  Time: {gps_time}")
-        print(f"  Speed: {gps_speed:.4f} m/s")
+        print(f"  Time: {df_txt.loc[gps_idx, 'timestamp']}")
+        print(f"  Speed: {df_txt.loc[gps_idx, 'GPS_Speed']:.4f} m/s")
+        if row['Onset_Index'] >= 0:
+            print(f"  Hystérésis: départ {row['Onset_Time']} (index {row['Onset_Index']}, détection {row['Detect_Index']})")
 
 # Détection TDMS
 print("\n" + "=" * 80)
 print("DÉTECTION TDMS (Edge_Diff > 0)")
 print("=" * 80)
 
-tdms_idx = df_tdms[df_tdms['Edge_Diff'] > 0].index.min()
+tdms_idx = int(first_above(df_tdms['Edge_Diff'].values, 0.0)[0])
 tdms_time = df_tdms.loc[tdms_idx, 'timestamp']
 print(f"  Index: {tdms_idx}")
 print(f"  Time: {tdms_time}")
 print(f"  Edge_Diff: {df_tdms.loc[tdms_idx, 'Edge_Diff']:.4f}")
 
+# CUSUM sur la vitesse roue : un front isolé (vibration) ne déclenche pas
+wheel_mps, _ = wheel_speed(df_tdms['Edges'].values, 1 / increment)
+cusum, noise_tdms = cusum_onsets(df_tdms['timestamp'], wheel_mps)
+if cusum['Onset_Index'].iloc[0] >= 0:
+    print(f"  CUSUM (vitesse roue): départ {cusum['Onset_Time'].iloc[0]} (index {cusum['Onset_Index'].iloc[0]})")
+
 # Visualisation
 print("\n📈 Création du graphique de comparaison...")
 fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 10))
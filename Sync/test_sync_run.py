@@ -6,6 +6,12 @@ from datetime import timedelta
 import sys
 import os
 
+# Détection de départ et corrélation partagées (racine du projet)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from onset_detection import movement_onset
+from sync_estimation import estimate_offset
+from wheel_speed import wheel_speed
+
 # File Paths
 txt_path = 'Moto_Chicane_100_P1.txt'
 tdms_path = 'Moto_Chicane_100.tdms'
@@ -104,35 +110,40 @@ except Exception as e:
     sys.exit(1)
 
 # 3. Detect Start of Movement
+# CUSUM sur le bruit à l'arrêt (au lieu de GPS_Speed > 0.5 / Edge_Diff > 0), puis
+# corrélation vitesse GPS / vitesse roue autour de l'offset des départs
 print("Detecting Start...")
-gps_speed_threshold = 0.5 # m/s roughly
 df_txt_sorted = df_txt.sort_values('timestamp').reset_index(drop=True)
+df_tdms_sorted = df_tdms.sort_values('timestamp').reset_index(drop=True)
+wheel_mps, _ = wheel_speed(df_tdms_sorted['Edges'].values, 1 / increment)
 
-# Find where speed > threshold
-gps_moving = df_txt_sorted[df_txt_sorted['GPS_Speed'] > gps_speed_threshold]
-
-if gps_moving.empty:
-    print("No GPS movement detected based on speed threshold.")
-    gps_start_time = df_txt_sorted.iloc[0]['timestamp'] 
+gps_onset = movement_onset(df_txt_sorted['timestamp'], df_txt_sorted['GPS_Speed'].values)
+if gps_onset['Onset_Time'] is None:
+    print("No GPS movement detected.")
+    gps_start_time = df_txt_sorted.iloc[0]['timestamp']
 else:
-    gps_start_idx = gps_moving.index.min()
-    gps_start_time = df_txt_sorted.iloc[gps_start_idx]['timestamp']
-    print(f"GPS Start Detected at: {gps_start_time} (Index {gps_start_idx}, Speed={df_txt_sorted.iloc[gps_start_idx]['GPS_Speed']:.2f} m/s)")
-
+    gps_start_idx = gps_onset['Onset_Index']
+    gps_start_time = gps_onset['Onset_Time']
+    print(f"GPS Start Detected at: {gps_start_time} (Index {gps_start_idx}, "
+          f"noise {gps_onset['Level']:.2f} +/- {gps_onset['Sigma']:.2f} m/s)")
 
-# TDMS Start: When Edge_Diff > 0
-df_tdms_sorted = df_tdms.sort_values('timestamp').reset_index(drop=True)
-tdms_moving = df_tdms_sorted[df_tdms_sorted['Edge_Diff'] > 0]
-
-if tdms_moving.empty:
+tdms_onset = movement_onset(df_tdms_sorted['timestamp'], wheel_mps)
+if tdms_onset['Onset_Time'] is None:
     print("No Edge movement detected.")
     tdms_start_time = df_tdms_sorted.iloc[0]['timestamp']
 else:
-    tdms_start_idx = tdms_moving.index.min()
-    tdms_start_time = df_tdms_sorted.iloc[tdms_start_idx]['timestamp']
+    tdms_start_idx = tdms_onset['Onset_Index']
+    tdms_start_time = tdms_onset['Onset_Time']
     print(f"TDMS Start Detected at: {tdms_start_time} (Index {tdms_start_idx})")
 
 time_offset = gps_start_time - tdms_start_time
+print(f"Onset Time Offset: {time_offset}")
+
+est = estimate_offset(df_txt_sorted['timestamp'], df_txt_sorted['GPS_Speed'].values,
+                      df_tdms_sorted['timestamp'], wheel_mps, lag0_s=time_offset.total_seconds(), max_lag_s=2.0)
+if np.isfinite(est['Offset_s']) and est['Confidence'] > 0.3:
+    time_offset = pd.Timedelta(seconds=est['Offset_s'])
+    print(f"Refined by correlation (confidence {est['Confidence']:.2f})")
 print(f"Calculated Time Offset to add to TDMS: {time_offset}")
 
 # Plotting to verify
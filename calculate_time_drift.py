@@ -5,8 +5,9 @@ Calcul du décalage temporel entre TDMS et TXT au début et à la fin
 """
 
 import pandas as pd
-import numpy as np
 from nptdms import TdmsFile
+from xsens_io import utc_timestamps
+from tdms_io import channel_time_base
 
 # Chemins des fichiers
 tdms_path = "Moto_Chicane_100.tdms"
@@ -30,20 +31,15 @@ if group is None:
     group = tdms_file.groups()[0]
 
 channel = group['Edges_RoueAR']
-edges_cal = channel[:]
 
-start_time = channel.properties.get('wf_start_time')
-increment = channel.properties.get('wf_increment')
+# Base de temps calculée (wf_start_time + i * wf_increment), sans tableau de timestamps
+tdms_base = channel_time_base(channel)
 
-start_time = pd.to_datetime(start_time).tz_localize(None)
-tdms_time = start_time + pd.to_timedelta(np.arange(len(edges_cal)) * increment, unit='s')
-df_tdms = pd.DataFrame({'timestamp': tdms_time, 'Edges': edges_cal})
-
-tdms_start = df_tdms['timestamp'].min()
-tdms_end = df_tdms['timestamp'].max()
+tdms_start = tdms_base.start
+tdms_end = tdms_base.end
 tdms_duration = (tdms_end - tdms_start).total_seconds()
 
-print(f"  Nombre de points: {len(df_tdms)}")
+print(f"  Nombre de points: {len(tdms_base)}")
 print(f"  Start: {tdms_start}")
 print(f"  End:   {tdms_end}")
 print(f"  Durée: {tdms_duration:.3f} secondes")
@@ -58,11 +54,7 @@ df_txt.columns = df_txt.columns.str.strip()
 req_cols = ['UTC_Year', 'UTC_Month', 'UTC_Day', 'UTC_Hour', 'UTC_Minute', 'UTC_Second', 'UTC_Nano']
 df_txt = df_txt.dropna(subset=req_cols)
 
-time_series = pd.to_datetime(df_txt[req_cols[:-1]].astype(int).rename(columns={
-    'UTC_Year': 'year', 'UTC_Month': 'month', 'UTC_Day': 'day',
-    'UTC_Hour': 'hour', 'UTC_Minute': 'minute', 'UTC_Second': 'second'
-}))
-df_txt['timestamp'] = time_series + pd.to_timedelta(df_txt['UTC_Nano'], unit='ns')
+df_txt['timestamp'] = utc_timestamps(df_txt)
 
 txt_start = df_txt['timestamp'].min()
 txt_end = df_txt['timestamp'].max()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Décodage vectorisé des signaux CAN depuis une définition DBC
+
+Le DBC est lu en dicts (messages BO_, signaux SG_, tables VAL_, types SIG_VALTYPE_,
+multiplexage simple M / mN et étendu SG_MUL_VAL_). Les trames (colonnes de
+can_mf4.read_can_frames) sont groupées par identifiant en un tri, puis tous les
+signaux d'un message sont extraits pour toutes ses trames à la fois :
+- charge utile <= 8 octets : un mot uint64 little-endian (Intel) et un mot
+  big-endian (Motorola) par trame, chaque signal = décalage + masque ;
+- CAN FD (> 8 octets) : assemblage des octets couverts par le signal.
+Signe par extension du bit de poids fort, puis physique = brut * facteur + offset.
+Un signal multiplexé vaut NaN quand le multiplexeur n'a pas sa valeur, comme un
+signal dont les octets dépassent la longueur de la trame.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+EXTENDED_FLAG = 0x80000000  # bit 31 de l'identifiant DBC : trame étendue (29 bits)
+ID_MASK = 0x1FFFFFFF
+
+_BO = re.compile(r'^BO_\s+(\d+)\s+(\w+)\s*:\s*(\d+)\s+(\w+)')
+_SG = re.compile(r'^SG_\s+(\w+)\s*(M|m\d+M?)?\s*:\s*(\d+)\|(\d+)@([01])([+-])\s*'
+                 r'\(([^,]+),([^)]+)\)\s*\[([^|]*)\|([^\]]*)\]\s*"([^"]*)"')
+_VAL = re.compile(r'^VAL_\s+(\d+)\s+(\w+)\s+(.*);')
+_VALTYPE = re.compile(r'^SIG_VALTYPE_\s+(\d+)\s+(\w+)\s*:?\s*(\d)\s*;')
+_MUL_VAL = re.compile(r'^SG_MUL_VAL_\s+(\d+)\s+(\w+)\s+(\w+)\s+(.*);')
+
+
+def parse_dbc(text):
+    """Texte DBC -> {identifiant DBC: message}. Message : {'Name', 'ID', 'Extended', 'Length',
+    'Signals': {nom: signal}} ; signal : {'Start', 'Length', 'Intel', 'Signed', 'Factor',
+    'Offset', 'Min', 'Max', 'Unit', 'Mux', 'Is_Muxer', 'Muxer', 'Mux_Ranges', 'Value_Type', 'Choices'}.
+    'Mux' : 'M' (multiplexeur), valeur du multiplexeur (int) ou None."""
+    messages, msg = {}, None
+    for raw in text.splitlines():
+        line = raw.strip()
+        m = _BO.match(line)
+        if m:
+            dbc_id = int(m.group(1))
+            msg = {'Name': m.group(2), 'ID': dbc_id & ID_MASK, 'Extended': bool(dbc_id & EXTENDED_FLAG),
+                   'Length': int(m.group(3)), 'Signals': {}}
+            messages[dbc_id] = msg
+            continue
+        m = _SG.match(line)
+        if m and msg is not None:
+            name, mux, start, length, order, sign, factor, offset, lo, hi, unit = m.groups()
+            mux_value = None
+            if mux == 'M':
+                mux_value = 'M'
+            elif mux:
+                mux_value = int(mux[1:].rstrip('M'))
+            msg['Signals'][name] = {
+                'Start': int(start), 'Length': int(length), 'Intel': order == '1', 'Signed': sign == '-',
+                'Factor': float(factor), 'Offset': float(offset), 'Min': float(lo or 0), 'Max': float(hi or 0),
+                'Unit': unit, 'Mux': mux_value, 'Is_Muxer': bool(mux) and mux.endswith('M'), 'Muxer': None,
+                'Mux_Ranges': None if mux_value in (None, 'M') else [(mux_value, mux_value)],
+                'Value_Type': 0, 'Choices': {}}
+            continue
+        m = _VAL.match(line)
+        if m and int(m.group(1)) in messages:
+            sig = messages[int(m.group(1))]['Signals'].get(m.group(2))
+            if sig is not None:
+                sig['Choices'] = {int(k): v for k, v in re.findall(r'(-?\d+)\s+"([^"]*)"', m.group(3))}
+            continue
+        m = _VALTYPE.match(line)
+        if m and int(m.group(1)) in messages:
+            sig = messages[int(m.group(1))]['Signals'].get(m.group(2))
+            if sig is not None:
+                sig['Value_Type'] = int(m.group(3))  # 1 : float32, 2 : float64
+            continue
+        m = _MUL_VAL.match(line)
+        if m and int(m.group(1)) in messages:
+            sig = messages[int(m.group(1))]['Signals'].get(m.group(2))
+            if sig is not None:
+                sig['Muxer'] = m.group(3)
+                sig['Mux_Ranges'] = [(int(a), int(b)) for a, b in re.findall(r'(\d+)\s*-\s*(\d+)', m.group(4))]
+    for msg in messages.values():
+        sigs = msg['Signals']
+        muxer = next((n for n, s in sigs.items() if s['Mux'] == 'M'), None)
+        for s in sigs.values():
+            if s['Mux_Ranges'] is not None and s['Muxer'] is None:
+                s['Muxer'] = muxer  # multiplexage simple : le multiplexeur unique du message
+    return messages
+
+
+def load_dbc(path, encoding='latin-1'):
+    """Lit un fichier DBC (latin-1 par défaut, encodage usuel des exports Vector)."""
+    with open(path, encoding=encoding, errors='replace') as f:
+        return parse_dbc(f.read())
+
+
+def find_message(db, name_or_id):
+    """Message par nom ou identifiant CAN (sans le bit 31), None si absent."""
+    for msg in db.values():
+        if msg['Name'] == name_or_id or msg['ID'] == name_or_id:
+            return msg
+    return None
+
+
+def _lsb_position(sig):
+    """Position du bit de poids faible dans la numérotation little-endian (Intel) ou
+    dans le mot big-endian de 8 octets (Motorola : Start = bit de poids fort)."""
+    if sig['Intel']:
+        return sig['Start']
+    s = sig['Start']
+    return (7 - s // 8) * 8 + s % 8 - sig['Length'] + 1
+
+
+def extract_bits(payload, sig):
+    """Valeurs brutes (uint64) d'un signal pour toutes les lignes de payload (n, largeur) uint8."""
+    n_bits, s = sig['Length'], sig['Start']
+    mask = np.uint64((1 << n_bits) - 1)
+    if sig['Intel']:
+        b0, shift = s // 8, s % 8
+        n_bytes = (shift + n_bits + 7) // 8
+        pos = [8 * j - shift for j in range(n_bytes)]
+    else:
+        b0 = s // 8
+        n_bytes = (n_bits + 7 - s % 8 + 7) // 8
+        shift = 8 * (n_bytes - 1) + s % 8 - n_bits + 1
+        pos = [8 * (n_bytes - 1 - j) - shift for j in range(n_bytes)]
+    raw = np.zeros(len(payload), dtype=np.uint64)
+    for j, p in enumerate(pos):
+        if b0 + j >= payload.shape[1]:
+            break
+        part = payload[:, b0 + j].astype(np.uint64)
+        raw |= (part << np.uint64(p)) if p >= 0 else (part >> np.uint64(-p))
+    return raw & mask
+
+
+def _words(payload):
+    """Mots (little-endian, big-endian) uint64 d'une charge utile de <= 8 octets."""
+    block = np.zeros((len(payload), 8), dtype=np.uint8)
+    block[:, :payload.shape[1]] = payload
+    return block.view('<u8').ravel(), block.view('>u8').ravel().astype(np.uint64)
+
+
+def _physical(raw, sig):
+    n_bits = sig['Length']
+    if sig['Value_Type'] == 1 and n_bits == 32:
+        with np.errstate(invalid='ignore'):  # NaN signalants du float32 brut
+            return raw.astype(np.uint32).view(np.float32).astype(np.float64) * sig['Factor'] + sig['Offset']
+    if sig['Value_Type'] == 2 and n_bits == 64:
+        return raw.view(np.float64) * sig['Factor'] + sig['Offset']
+    if sig['Signed'] and n_bits < 64:
+        sign = np.uint64(1 << (n_bits - 1))
+        value = (raw ^ sign).astype(np.int64) - np.int64(1 << (n_bits - 1))
+    else:
+        value = raw.view(np.int64) if sig['Signed'] else raw
+    return value * sig['Factor'] + sig['Offset']
+
+
+def _needed_bytes(sig):
+    if sig['Intel']:
+        return (sig['Start'] + sig['Length'] + 7) // 8
+    return sig['Start'] // 8 + (sig['Length'] + 7 - sig['Start'] % 8 + 7) // 8
+
+
+def decode_message(msg, payload, data_length=None, signals=None):
+    """Signaux physiques (float64) d'un message pour toutes ses trames.
+    payload : (n, largeur) uint8 ; data_length : octets utiles par trame (None = largeur).
+    Retourne {nom: tableau}, NaN hors multiplexage ou si la trame est trop courte."""
+    payload = np.asarray(payload, dtype=np.uint8)
+    n, width = payload.shape
+    sigs = msg['Signals'] if signals is None else {k: msg['Signals'][k] for k in signals}
+    le = be = None
+    if width <= 8:
+        le, be = _words(payload)
+
+    raws = {}
+
+    def raw_of(name):
+        if name not in raws:
+            sig = msg['Signals'][name]
+            lsb = _lsb_position(sig)
+            if le is not None and 0 <= lsb and lsb + sig['Length'] <= 64:
+                word = le if sig['Intel'] else be
+                raws[name] = (word >> np.uint64(lsb)) & np.uint64((1 << sig['Length']) - 1)
+            else:
+                raws[name] = extract_bits(payload, sig)
+        return raws[name]
+
+    def valid_of(name):
+        """Trames où le signal est présent (chaîne de multiplexeurs incluse)."""
+        sig = msg['Signals'][name]
+        ok = np.ones(n, dtype=bool)
+        if data_length is not None:
+            ok &= np.asarray(data_length) >= _needed_bytes(sig)
+        if sig['Mux_Ranges'] is not None and sig['Muxer'] in msg['Signals']:
+            mux = raw_of(sig['Muxer']).astype(np.int64)
+            sel = np.zeros(n, dtype=bool)
+            for lo, hi in sig['Mux_Ranges']:
+                sel |= (mux >= lo) & (mux <= hi)
+            ok &= sel & valid_of(sig['Muxer'])
+        return ok
+
+    out = {}
+    for name, sig in sigs.items():
+        value = _physical(raw_of(name), sig).astype(np.float64)
+        ok = valid_of(name)
+        if not ok.all():
+            value[~ok] = np.nan
+        out[name] = value
+    return out
+
+
+def frame_groups(frames):
+    """{(ID, IDE): indices des trames} en un tri stable (ordre temporel conservé)."""
+    key = frames['ID'].astype(np.int64) | (frames['IDE'].astype(np.int64) << 32)
+    order = np.argsort(key, kind='stable')
+    keys, first = np.unique(key[order], return_index=True)
+    bounds = np.append(first, len(order))
+    return {(int(k & 0xFFFFFFFF), int(k >> 32)): order[bounds[i]:bounds[i + 1]] for i, k in enumerate(keys)}
+
+
+def decode_frames(db, frames, messages=None, bus=None, groups=None):
+    """Décode les trames (colonnes de can_mf4) : {nom du message: DataFrame indexé par
+    l'instant de la trame (datetime64 UTC), une colonne par signal}.
+    messages : noms / identifiants à décoder (None = tous ceux présents) ; bus : canal
+    CAN à retenir (None = tous) ; groups : frame_groups(frames) déjà calculé."""
+    if bus is not None:
+        keep = frames['BusChannel'] == bus
+        frames = {c: v[keep] for c, v in frames.items()}
+        groups = None
+    groups = groups if groups is not None else frame_groups(frames)
+    wanted = db.values() if messages is None else [m for m in (find_message(db, k) for k in messages) if m]
+    out = {}
+    for msg in wanted:
+        rows = groups.get((msg['ID'], int(msg['Extended'])))
+        if rows is None or not msg['Signals']:
+            continue
+        values = decode_message(msg, frames['Payload'][rows], frames['DataLength'][rows])
+        index = pd.DatetimeIndex(frames['Timestamp'][rows].astype('datetime64[ns]'), name='Time')
+        out[msg['Name']] = pd.DataFrame(values, index=index)
+    return out
+
+
+def decode_signal(db, frames, signal, message=None, bus=None):
+    """Un signal physique en Series (index temps), message déduit du nom si non donné.
+    Series vide si le signal ou ses trames sont absents."""
+    msgs = [find_message(db, message)] if message is not None else list(db.values())
+    msg = next((m for m in msgs if m and signal in m['Signals']), None)
+    if msg is None:
+        return pd.Series(dtype=np.float64, name=signal)
+    df = decode_frames(db, frames, [msg['Name']], bus=bus).get(msg['Name'])
+    if df is None:
+        return pd.Series(dtype=np.float64, name=signal)
+    return df[signal]
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Index des trames CAN par identifiant, stocké à côté du MF4 (sidecar .idx.npz)
+
+Construit une fois par fichier (un décodage complet par can_mf4), il contient :
+- par trame, triées par (ID, IDE) puis temps : offset du record dans le MF4,
+  instant (ns UTC), canal CAN ;
+- par identifiant : plage [Start, Stop) dans ces tableaux, nombre de trames,
+  premier / dernier instant.
+Une extraction (quelques IDs, fenêtre de temps) se réduit à des searchsorted
+dans l'index puis au décodage des seuls records retenus (read_can_frames(offsets=...)).
+
+Invalidation comme trial_cache : taille + mtime identiques -> index valide ;
+sinon le hash du contenu (blake2b) décide entre simple mise à jour du tampon
+(fichier copié / touché) et reconstruction (fichier modifié).
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from can_mf4 import empty_frames, read_can_frames
+from time_base import as_ns
+from trial_cache import file_digest
+
+INDEX_VERSION = 1
+SIDECAR_SUFFIX = '.idx.npz'
+FRAME_ARRAYS = ['Offset', 'Timestamp', 'BusChannel']
+ID_COLS = ['ID', 'IDE', 'Start', 'Stop', 'Count', 'T_First', 'T_Last']
+
+
+def sidecar_path(path, index_dir=None):
+    """Fichier d'index : à côté du MF4, ou dans index_dir (nom dérivé du chemin absolu)
+    si le dossier des données n'est pas accessible en écriture."""
+    if index_dir is None:
+        return str(path) + SIDECAR_SUFFIX
+    src = os.path.abspath(path)
+    tag = hashlib.blake2b(src.encode(), digest_size=8).hexdigest()
+    return os.path.join(index_dir, f"{os.path.basename(src)}.{tag}{SIDECAR_SUFFIX}")
+
+
+def build_index(path):
+    """Index d'un MF4 : {'Meta', FRAME_ARRAYS..., ID_COLS...} (tableaux numpy)."""
+    st = os.stat(path)
+    frames = read_can_frames(path)
+    key = frames['ID'] | (frames['IDE'] << 32)
+    order = np.lexsort((frames['Timestamp'], key))
+    key = key[order]
+    keys, start = np.unique(key, return_index=True)
+    stop = np.append(start[1:], len(key)).astype(np.int64)
+    index = {c: frames[c][order] for c in FRAME_ARRAYS}
+    # Sidecar compact : offsets sur 32 bits tant que le fichier le permet, canal sur 8 bits
+    if st.st_size < 2 ** 32:
+        index['Offset'] = index['Offset'].astype(np.uint32)
+    index['BusChannel'] = index['BusChannel'].astype(np.uint8)
+    ts = index['Timestamp']
+    index.update({'ID': keys & 0xFFFFFFFF, 'IDE': keys >> 32, 'Start': start.astype(np.int64), 'Stop': stop,
+                  'Count': stop - start, 'T_First': ts[start], 'T_Last': ts[stop - 1]})
+    index['Meta'] = {'version': INDEX_VERSION, 'path': os.path.abspath(path), 'size': st.st_size,
+                     'mtime_ns': st.st_mtime_ns, 'hash': file_digest(path)}
+    return index
+
+
+def _write(index, sidecar):
+    os.makedirs(os.path.dirname(os.path.abspath(sidecar)), exist_ok=True)
+    tmp = sidecar + '.tmp.npz'
+    arrays = {c: index[c] for c in FRAME_ARRAYS + ID_COLS}
+    np.savez(tmp, __meta__=np.array(json.dumps(index['Meta'])), **arrays)
+    os.replace(tmp, sidecar)
+
+
+def _read(sidecar):
+    with np.load(sidecar) as z:
+        index = {c: z[c] for c in FRAME_ARRAYS + ID_COLS}
+        index['Meta'] = json.loads(str(z['__meta__']))
+    return index
+
+
+def load_index(path, index_dir=None, write=True):
+    """Index valide du MF4 : relu depuis le sidecar s'il correspond au fichier, sinon
+    reconstruit (et réécrit si write). Un sidecar illisible est reconstruit."""
+    sidecar = sidecar_path(path, index_dir)
+    st = os.stat(path)
+    index = None
+    try:
+        index = _read(sidecar)
+    except (OSError, ValueError, KeyError):
+        pass
+    if index is not None and index['Meta'].get('version') == INDEX_VERSION:
+        meta = index['Meta']
+        if meta['size'] == st.st_size and meta['mtime_ns'] == st.st_mtime_ns:
+            return index
+        if meta['size'] == st.st_size and meta['hash'] == file_digest(path):
+            # Même contenu (fichier copié / touché) : seul le tampon change
+            meta.update(path=os.path.abspath(path), mtime_ns=st.st_mtime_ns)
+            if write:
+                _write(index, sidecar)
+            return index
+    index = build_index(path)
+    if write:
+        try:
+            _write(index, sidecar)
+        except OSError:
+            pass  # dossier en lecture seule : index gardé en mémoire
+    return index
+
+
+def id_table(index):
+    """Résumé par identifiant (DataFrame ID_COLS, instants en datetime64)."""
+    df = pd.DataFrame({c: index[c] for c in ID_COLS})
+    for c in ('T_First', 'T_Last'):
+        df[c] = pd.to_datetime(df[c])
+    return df
+
+
+def select_offsets(index, ids=None, t_start=None, t_end=None, ide=None, bus=None):
+    """Offsets (ordre du fichier) des trames des identifiants ids (None = tous) dont
+    l'instant est dans [t_start, t_end] ; ide / bus filtrent le format et le canal."""
+    sel = np.ones(len(index['ID']), dtype=bool)
+    if ids is not None:
+        sel &= np.isin(index['ID'], np.atleast_1d(np.asarray(ids, dtype=np.int64)))
+    if ide is not None:
+        sel &= index['IDE'] == int(ide)
+    lo_ns = as_ns(t_start) if t_start is not None else None
+    hi_ns = as_ns(t_end) if t_end is not None else None
+    if lo_ns is not None:
+        sel &= index['T_Last'] >= lo_ns
+    if hi_ns is not None:
+        sel &= index['T_First'] <= hi_ns
+
+    ts, parts = index['Timestamp'], []
+    for s, e in zip(index['Start'][sel], index['Stop'][sel]):
+        # Trames d'un ID triées par temps : la fenêtre est une sous-plage
+        if lo_ns is not None:
+            s = s + np.searchsorted(ts[s:e], lo_ns, side='left')
+        if hi_ns is not None:
+            e = s + np.searchsorted(ts[s:e], hi_ns, side='right')
+        rows = np.arange(s, e)
+        if bus is not None:
+            rows = rows[index['BusChannel'][rows] == bus]
+        parts.append(index['Offset'][rows].astype(np.int64))
+    return np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+
+
+def read_indexed_frames(path, ids=None, t_start=None, t_end=None, ide=None, bus=None, index=None, index_dir=None):
+    """Trames (colonnes de can_mf4) des seuls identifiants / fenêtre demandés, via l'index
+    (construit si besoin). Seuls les records retenus sont décodés."""
+    index = index if index is not None else load_index(path, index_dir)
+    offsets = select_offsets(index, ids, t_start, t_end, ide, bus)
+    if len(offsets) == 0:
+        return empty_frames()
+    return read_can_frames(path, offsets)
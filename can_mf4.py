@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lecture native des logs CANedge MF4 (MDF 4.11), y compris non finalisés
+
+Un fichier écrit par l'enregistreur commence par 'UnFinMF ' : la chaîne de blocs
+(HD -> DG -> CG -> CN) est complète, mais les compteurs de cycles des CG valent 0 et
+la longueur du dernier bloc DT n'est pas mise à jour (24 octets = en-tête seul).
+On reconstruit donc la chaîne en lisant les blocs, on prolonge le dernier DT jusqu'à
+la fin du fichier et on recompte les enregistrements.
+
+Bloc de données d'un DG non trié : suite d'enregistrements
+    record id (dg_rec_id_size octets) | cg_data_bytes + cg_inval_bytes
+ou, pour un CG VLSD : record id | longueur (uint32) | octets.
+Le parcours est vectorisé par séries d'enregistrements de même taille (un sondage
+numpy de tous les débuts candidats), puis chaque canal est décodé pour tous les
+enregistrements de son CG en une opération (décalage / masque sur les octets).
+
+Le fichier est projeté en mémoire (mmap) : seuls les octets des enregistrements
+sont copiés. Les trames CAN_DataFrame sont rendues en colonnes (read_can_frames).
+"""
+
+import mmap
+import struct
+from contextlib import contextmanager
+
+import numpy as np
+
+ID_FINALIZED = b'MDF     '
+ID_UNFINALIZED = b'UnFinMF '
+HD_OFFSET = 64
+BLOCK_HEADER = struct.Struct('<4s4xQQ')  # id, longueur, nombre de liens
+UNFIN_DT_LENGTH = 0x4   # id_unfin_flags : longueur du dernier DT non mise à jour
+CG_VLSD = 0x1           # cg_flags : CG de données de longueur variable
+CN_VLSD, CN_MASTER, CN_VIRTUAL_MASTER, CN_VIRTUAL = 1, 2, 3, 6
+CC_LINEAR = 1
+FRAME_GROUP = 'CAN_DataFrame'
+FRAME_COLS = ['Timestamp', 'BusChannel', 'ID', 'IDE', 'DLC', 'DataLength', 'Dir', 'Offset']
+PROBE_MIN = 64  # enregistrements sondés par pas du parcours (doublé tant que la taille ne change pas)
+
+
+@contextmanager
+def mapped(path):
+    """Fichier projeté en lecture seule. Les vues numpy sur le buffer doivent être
+    libérées avant la sortie du bloc (mmap.close refuse les exports actifs)."""
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        yield mm
+    finally:
+        try:
+            mm.close()
+        except BufferError:  # vue encore référencée (trace d'une exception) : fermé par le GC
+            pass
+
+
+def _block(buf, off, expect=None):
+    """(id, longueur, liens, début des données) du bloc à l'offset off."""
+    bid, length, n_links = BLOCK_HEADER.unpack_from(buf, off)
+    if not bid.startswith(b'##') or (expect and bid != expect):
+        raise ValueError(f"Bloc {expect or '##..'} attendu à l'offset {off}, trouvé {bid!r}")
+    links = struct.unpack_from(f'<{n_links}Q', buf, off + 24)
+    return bid, length, links, off + 24 + 8 * n_links
+
+
+def _text(buf, off):
+    if not off:
+        return None
+    _, length, _, p = _block(buf, off)
+    return bytes(buf[p:off + length]).split(b'\0')[0].decode('utf-8', 'replace')
+
+
+def _conversion(buf, off):
+    """(a0, a1) d'une conversion linéaire (CC type 1), None sinon (valeur brute)."""
+    if not off:
+        return None
+    _, _, _, p = _block(buf, off, b'##CC')
+    cc_type, _, _, _, n_val = struct.unpack_from('<BBHHH', buf, p)
+    if cc_type != CC_LINEAR or n_val < 2:
+        return None
+    return struct.unpack_from('<2d', buf, p + 24)
+
+
+def _channels(buf, off):
+    """Liste chaînée de CN -> dicts (composants d'une structure dans 'Children')."""
+    out = []
+    while off:
+        _, _, links, p = _block(buf, off, b'##CN')
+        cn_type, _, data_type, bit, byte, n_bits = struct.unpack_from('<BBBBII', buf, p)
+        composition = links[1]
+        children = []
+        if composition and bytes(buf[composition:composition + 4]) == b'##CN':
+            children = _channels(buf, composition)
+        out.append({'Name': _text(buf, links[2]), 'Type': cn_type, 'DataType': data_type, 'Byte': byte,
+                    'Bit': bit, 'Bits': n_bits, 'Conversion': _conversion(buf, links[4]), 'Data': links[5],
+                    'Children': children})
+        off = links[0]
+    return out
+
+
+def _data_ranges(buf, off, extend_last):
+    """Plages (début, fin) des octets de données d'un DG (DT direct ou liste DL / HL).
+    extend_last : le dernier DT court jusqu'à la fin du fichier (fichier non finalisé)."""
+    ranges = []
+    while off:
+        bid, length, links, p = _block(buf, off)
+        if bid == b'##DT':
+            ranges.append([p, off + length])
+            off = 0
+        elif bid == b'##HL':
+            off = links[0]
+        elif bid == b'##DL':
+            for dt in links[1:]:
+                ranges.extend(_data_ranges(buf, dt, False))
+            off = links[0]
+        else:
+            raise ValueError(f"Bloc de données {bid!r} non supporté (offset {off})")
+    if ranges and extend_last:
+        ranges[-1][1] = len(buf)
+    return [tuple(r) for r in ranges]
+
+
+def read_structure(buf):
+    """En-tête et chaîne DG -> CG -> CN d'un MF4 4.x (finalisé ou non).
+    Retourne {'Finalized', 'Unfin_Flags', 'Start_ns', 'Groups': [DG]}, chaque DG étant
+    {'Rec_Id_Size', 'Ranges', 'Channel_Groups': {record id: CG}}."""
+    file_id, version = bytes(buf[:8]), bytes(buf[8:16]).decode('ascii', 'replace').strip()
+    if file_id not in (ID_FINALIZED, ID_UNFINALIZED) or not version.startswith('4.'):
+        raise ValueError(f"Pas un fichier MDF 4 : {file_id!r} {version!r}")
+    unfin_flags = struct.unpack_from('<H', buf, 60)[0] if file_id == ID_UNFINALIZED else 0
+    _, _, hd_links, p = _block(buf, HD_OFFSET, b'##HD')
+    start_ns = struct.unpack_from('<Q', buf, p)[0]
+
+    groups = []
+    dg = hd_links[0]
+    while dg:
+        _, _, dg_links, p = _block(buf, dg, b'##DG')
+        cgs = {}
+        cg = dg_links[1]
+        while cg:
+            _, _, cg_links, q = _block(buf, cg, b'##CG')
+            rec_id, _, flags, _, _, data_bytes, inval_bytes = struct.unpack_from('<QQHHIII', buf, q)
+            cgs[rec_id] = {'Name': _text(buf, cg_links[2]), 'Offset': cg, 'VLSD': bool(flags & CG_VLSD),
+                           'Size': data_bytes + inval_bytes, 'Channels': _channels(buf, cg_links[1])}
+            cg = cg_links[0]
+        last = dg_links[0] == 0
+        groups.append({'Rec_Id_Size': buf[p], 'Channel_Groups': cgs,
+                       'Ranges': _data_ranges(buf, dg_links[2], last and bool(unfin_flags & UNFIN_DT_LENGTH))})
+        dg = dg_links[0]
+    return {'Finalized': file_id == ID_FINALIZED, 'Unfin_Flags': unfin_flags, 'Start_ns': start_ns,
+            'Groups': groups}
+
+
+def _uint_le(a, pos, size):
+    """Entiers little-endian de size octets lus aux positions pos d'un buffer uint8."""
+    v = np.zeros(len(pos), dtype=np.int64)
+    for j in range(size):
+        v |= a[pos + j].astype(np.int64) << (8 * j)
+    return v
+
+
+def record_offsets(a, start, end, id_size, cgs):
+    """Débuts des enregistrements (offsets du record id) et record ids sur [start, end).
+    Le parcours s'arrête sur un record id inconnu ou un enregistrement tronqué
+    (fin d'un fichier coupé pendant l'écriture)."""
+    if id_size == 0:  # DG trié : un seul CG, taille fixe
+        (rid, cg), = cgs.items()
+        offs = np.arange(start, end - cg['Size'] + 1, cg['Size'], dtype=np.int64)
+        return offs, np.full(len(offs), rid, dtype=np.int64)
+    keys = np.array(sorted(cgs), dtype=np.int64)
+    sizes = np.array([-1 if cgs[k]['VLSD'] else cgs[k]['Size'] for k in keys], dtype=np.int64)
+
+    def size_of(pos):
+        rid = _uint_le(a, pos, id_size)
+        i = np.searchsorted(keys, rid).clip(0, len(keys) - 1)
+        return np.where(keys[i] == rid, sizes[i], -2)  # -2 : record id inconnu
+
+    parts = []
+    p, probe = start, PROBE_MIN
+    while p + id_size <= end:
+        s = int(size_of(np.array([p]))[0])
+        if s == -2:
+            break
+        if s == -1:  # VLSD : longueur en tête des données
+            if p + id_size + 4 > end:
+                break
+            step = id_size + 4 + struct.unpack_from('<I', a, p + id_size)[0]
+            if p + step > end:
+                break
+            parts.append(np.array([p], dtype=np.int64))
+            p += step
+            continue
+        step = id_size + s
+        k = min(probe, (end - p) // step)
+        if k == 0:
+            break
+        pos = p + step * np.arange(k, dtype=np.int64)
+        same = size_of(pos) == s
+        n = k if same.all() else int(np.argmin(same))
+        parts.append(pos[:n])
+        p += n * step
+        probe = probe * 2 if n == k else PROBE_MIN
+    offs = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+    return offs, _uint_le(a, offs, id_size)
+
+
+def _field(M, ch):
+    """Valeurs brutes d'un canal pour toutes les lignes M (n, taille d'enregistrement)."""
+    byte, bit, n_bits, dt = ch['Byte'], ch['Bit'], ch['Bits'], ch['DataType']
+    if dt == 10:  # tableau d'octets
+        return M[:, byte:byte + n_bits // 8]
+    n_bytes = (bit + n_bits + 7) // 8
+    cols = range(n_bytes) if dt in (0, 2, 4) else range(n_bytes - 1, -1, -1)
+    if dt in (4, 5) and bit == 0 and n_bits in (32, 64):
+        raw = np.ascontiguousarray(M[:, byte:byte + n_bytes]).view('<f%d' % (n_bits // 8) if dt == 4
+                                                                  else '>f%d' % (n_bits // 8)).ravel()
+        return raw.astype(np.float64)
+    raw = np.zeros(len(M), dtype=np.uint64)
+    for j, c in enumerate(cols):
+        raw |= M[:, byte + c].astype(np.uint64) << np.uint64(8 * j)
+    raw = (raw >> np.uint64(bit)) & np.uint64((1 << n_bits) - 1)
+    if dt in (2, 3):  # entier signé : extension du bit de signe
+        sign = np.uint64(1 << (n_bits - 1))
+        return (raw ^ sign).astype(np.int64) - np.int64(1 << (n_bits - 1))
+    return raw.astype(np.int64)
+
+
+def _convert(raw, conv):
+    if conv is None or conv == (0.0, 1.0):
+        return raw
+    a0, a1 = conv
+    if a1 == 0.0 and float(a0).is_integer():  # canal virtuel constant (BusChannel, Dir, IDE)
+        return np.full(len(raw), int(a0), dtype=np.int64)
+    return a0 + a1 * raw
+
+
+def _timestamps_ns(raw, conv, start_ns):
+    """Instants absolus (ns UTC, int64) depuis le canal maître (secondes après conversion)."""
+    a0, a1 = conv or (0.0, 1.0)
+    scale = a1 * 1e9
+    if float(scale).is_integer() and float(a0 * 1e9).is_integer():
+        return start_ns + int(a0 * 1e9) + raw.astype(np.int64) * int(scale)
+    return start_ns + np.round((a0 + a1 * raw.astype(np.float64)) * 1e9).astype(np.int64)
+
+
+def _vlsd_payload(a, offs_vlsd, id_size, ref):
+    """Octets VLSD référencés par ref (offsets dans le flux du CG VLSD) -> (n, largeur) uint8."""
+    lengths = _uint_le(a, offs_vlsd + id_size, 4)
+    starts = np.concatenate(([0], np.cumsum(4 + lengths)[:-1]))
+    i = np.searchsorted(starts, ref).clip(0, max(len(starts) - 1, 0))
+    if len(starts) == 0 or not (starts[i] == ref).all():
+        raise ValueError("Référence VLSD invalide")
+    ln, src = lengths[i], offs_vlsd[i] + id_size + 4
+    width = int(ln.max()) if len(ln) else 0
+    j = np.arange(width)
+    take = j < ln[:, None]
+    out = np.zeros((len(ref), width), dtype=np.uint8)
+    out[take] = a[(src[:, None] + j)[take]]
+    return out
+
+
+def _frame_group(a, M, offs, cg, id_size, start_ns, vlsd):
+    """Colonnes FRAME_COLS + 'Payload' d'un CG de trames CAN_DataFrame."""
+    master = next(ch for ch in cg['Channels'] if ch['Type'] in (CN_MASTER, CN_VIRTUAL_MASTER))
+    frame = next(ch for ch in cg['Channels'] if ch['Name'] == FRAME_GROUP)
+    n = len(M)
+    raw_t = np.arange(n) if master['Type'] == CN_VIRTUAL_MASTER else _field(M, master)
+    cols = {'Timestamp': _timestamps_ns(raw_t, master['Conversion'], start_ns), 'Offset': offs}
+    for ch in frame['Children']:
+        name = ch['Name'].split('.', 1)[-1]
+        if name == 'DataBytes':
+            if ch['Type'] == CN_VLSD:
+                cols['Payload'] = _vlsd_payload(a, vlsd[ch['Data']], id_size, _field(M, ch))
+            else:
+                cols['Payload'] = np.ascontiguousarray(_field(M, ch))
+        elif name in FRAME_COLS:
+            raw = np.arange(n) if ch['Type'] == CN_VIRTUAL else _field(M, ch)
+            cols[name] = _convert(raw, ch['Conversion'])
+    return cols
+
+
+def empty_frames(width=8):
+    frames = {c: np.zeros(0, dtype=np.int64) for c in FRAME_COLS}
+    frames['Payload'] = np.zeros((0, width), dtype=np.uint8)
+    return frames
+
+
+def _walk(a, dg):
+    """(offsets, record ids) de tous les enregistrements d'un DG."""
+    offs, rids = [np.zeros(0, np.int64)], [np.zeros(0, np.int64)]
+    for start, end in dg['Ranges']:
+        o, r = record_offsets(a, start, end, dg['Rec_Id_Size'], dg['Channel_Groups'])
+        offs.append(o)
+        rids.append(r)
+    return np.concatenate(offs), np.concatenate(rids)
+
+
+def _decode_frames(mm, offsets=None):
+    a = np.frombuffer(mm, dtype=np.uint8)
+    info = read_structure(mm)
+    parts = []
+    for dg in info['Groups']:
+        cgs, id_size = dg['Channel_Groups'], dg['Rec_Id_Size']
+        if offsets is None:
+            offs, rids = _walk(a, dg)
+        else:
+            inside = np.zeros(len(offsets), dtype=bool)
+            for start, end in dg['Ranges']:
+                inside |= (offsets >= start) & (offsets < end)
+            offs = np.asarray(offsets, dtype=np.int64)[inside]
+            rids = _uint_le(a, offs, id_size) if id_size else np.full(len(offs), next(iter(cgs)), np.int64)
+            if any(cg['VLSD'] for cg in cgs.values()):
+                # Références VLSD relatives au flux complet du CG : il faut tous ses enregistrements
+                all_offs, all_rids = _walk(a, dg)
+                vlsd = np.isin(all_rids, [r for r, cg in cgs.items() if cg['VLSD']])
+                offs, rids = np.concatenate((offs, all_offs[vlsd])), np.concatenate((rids, all_rids[vlsd]))
+        present = [int(r) for r in np.unique(rids) if int(r) in cgs]
+        by_cg = {cgs[r]['Offset']: offs[rids == r] for r in present}
+        for rid in present:
+            cg = cgs[rid]
+            if cg['VLSD'] or not any(ch['Name'] == FRAME_GROUP for ch in cg['Channels']):
+                continue
+            o = by_cg[cg['Offset']]
+            M = np.lib.stride_tricks.sliding_window_view(a, cg['Size'])[o + id_size]
+            parts.append(_frame_group(a, M, o, cg, id_size, info['Start_ns'], by_cg))
+    if not parts:
+        return empty_frames()
+    width = max(p['Payload'].shape[1] for p in parts)
+    frames = {}
+    for c in FRAME_COLS:
+        frames[c] = np.concatenate([p.get(c, np.zeros(len(p['Offset']), np.int64)) for p in parts]).astype(np.int64)
+    frames['Payload'] = np.concatenate([np.pad(p['Payload'], ((0, 0), (0, width - p['Payload'].shape[1])))
+                                        for p in parts])
+    if len(parts) == 1 and (np.diff(frames['Timestamp']) >= 0).all():
+        return frames
+    order = np.argsort(frames['Timestamp'], kind='stable')
+    return {c: v[order] for c, v in frames.items()}
+
+
+HEAD_BYTES = 64 * 1024  # octets parcourus pour trouver le premier instant d'un fichier
+
+
+def first_timestamp(path):
+    """Instant (ns UTC) du premier record horodaté du fichier, sans parcourir tout le
+    bloc de données. None si le fichier n'en contient pas."""
+    with mapped(path) as mm:
+        a = np.frombuffer(mm, dtype=np.uint8)
+        info = read_structure(mm)
+        first = []
+        for dg in info['Groups']:
+            cgs, id_size = dg['Channel_Groups'], dg['Rec_Id_Size']
+            for start, end in dg['Ranges'][:1]:
+                offs, rids = record_offsets(a, start, min(end, start + HEAD_BYTES), id_size, cgs)
+                for o, rid in zip(offs, rids):
+                    cg = cgs[int(rid)]
+                    master = next((ch for ch in cg['Channels'] if ch['Type'] == CN_MASTER), None)
+                    if cg['VLSD'] or master is None:
+                        continue
+                    M = a[o + id_size:o + id_size + cg['Size']].copy()[None, :]
+                    first.append(int(_timestamps_ns(_field(M, master), master['Conversion'], info['Start_ns'])[0]))
+                    break
+        del a
+        return min(first) if first else None
+
+
+def read_can_frames(path, offsets=None):
+    """Trames CAN (CAN_DataFrame) d'un MF4, triées par temps, en colonnes :
+    Timestamp (ns UTC), BusChannel, ID, IDE, DLC, DataLength, Dir, Offset (octet du
+    record dans le fichier), Payload (n, largeur max) uint8 complété par des zéros.
+    offsets : débuts d'enregistrements déjà connus (index can_index), seuls ceux-ci
+    sont décodés, sans parcourir le bloc de données."""
+    with mapped(path) as mm:
+        return _decode_frames(mm, offsets)
+
+
+def load_can_frames(path):
+    """read_can_frames, colonnes vides si le fichier est illisible."""
+    try:
+        return read_can_frames(path)
+    except (OSError, ValueError, struct.error):
+        return empty_frames()
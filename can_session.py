@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Session CANedge découpée en splits : une seule série temporelle, chargée à la demande
+
+L'enregistreur coupe une session en dossiers numérotés (00000001, 00000002, ...),
+chacun contenant un 00000001.MF4. CanSession découvre les splits, les ordonne par
+premier instant (lecture de l'en-tête et du premier record seulement) et considère
+que le split i couvre [début_i, début_i+1). Une requête sur [t_start, t_end]
+n'ouvre que les splits qui chevauchent la fenêtre, et seulement les IDs utiles
+via l'index par identifiant (can_index).
+
+Un signal de la session (SessionSignal) est une concaténation paresseuse :
+between() / chunks() ne décodent que les splits demandés, to_series() tout.
+"""
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from can_dbc import decode_message, find_message
+from can_index import load_index, read_indexed_frames
+from can_mf4 import FRAME_COLS, empty_frames, first_timestamp
+from time_base import as_ns
+
+SPLIT_DIR = re.compile(r'^\d{8}$')  # dossiers de split CANedge
+
+
+def discover_splits(root):
+    """Fichiers .MF4 sous root (récursif), sidecars exclus."""
+    found = []
+    for dirpath, _, files in os.walk(root):
+        found.extend(os.path.join(dirpath, f) for f in files if f.upper().endswith('.MF4'))
+    return sorted(found)
+
+
+def find_sessions(root):
+    """{chemin relatif: dossier} des sessions sous root : dossiers dont les sous-dossiers
+    de split (8 chiffres) contiennent des .MF4 (ex. 'ch50/3C447876', 'Chicanes Mouille bus CAN')."""
+    sessions = {}
+    for dirpath, dirnames, _ in os.walk(root):
+        splits = [d for d in dirnames if SPLIT_DIR.match(d)]
+        if any(discover_splits(os.path.join(dirpath, d)) for d in splits):
+            sessions[os.path.relpath(dirpath, root)] = dirpath
+            dirnames[:] = [d for d in dirnames if not SPLIT_DIR.match(d)]
+    return sessions
+
+
+def concat_frames(parts):
+    """Concatène des colonnes de trames (largeurs de charge utile complétées par des zéros)."""
+    parts = [p for p in parts if len(p['Timestamp'])]
+    if not parts:
+        return empty_frames()
+    width = max(p['Payload'].shape[1] for p in parts)
+    out = {c: np.concatenate([p[c] for p in parts]) for c in FRAME_COLS}
+    out['Payload'] = np.concatenate([np.pad(p['Payload'], ((0, 0), (0, width - p['Payload'].shape[1])))
+                                     for p in parts])
+    out['Split'] = np.concatenate([np.full(len(p['Timestamp']), p['Split'], dtype=np.int64) for p in parts])
+    return out
+
+
+class CanSession:
+    """Splits d'une session CANedge ordonnés par premier instant.
+
+    db : définition DBC (can_dbc.load_dbc) pour les signaux physiques ;
+    index_dir : dossier des index par ID (None = sidecar à côté de chaque MF4)."""
+
+    def __init__(self, root, db=None, index_dir=None):
+        self.root = root
+        self.db = db
+        self.index_dir = index_dir
+        starts = []
+        for path in discover_splits(root):
+            try:
+                t0 = first_timestamp(path)
+            except (OSError, ValueError):
+                t0 = None
+            if t0 is not None:
+                starts.append((t0, path))
+        starts.sort()
+        self.paths = [p for _, p in starts]
+        self.starts = np.array([t for t, _ in starts], dtype=np.int64)
+        self._indexes = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __repr__(self):
+        return f"CanSession({self.root!r}, {len(self)} splits)"
+
+    @property
+    def start(self):
+        return pd.Timestamp(self.starts[0]) if len(self) else None
+
+    def index(self, i):
+        """Index par ID du split i (chargé / construit au premier accès)."""
+        if i not in self._indexes:
+            self._indexes[i] = load_index(self.paths[i], self.index_dir)
+        return self._indexes[i]
+
+    def end(self):
+        """Dernier instant de la session (ouvre l'index du dernier split)."""
+        if not len(self):
+            return None
+        ix = self.index(len(self) - 1)
+        return pd.Timestamp(int(ix['T_Last'].max()) if len(ix['T_Last']) else int(self.starts[-1]))
+
+    def overlapping(self, t_start=None, t_end=None):
+        """Indices des splits qui chevauchent [t_start, t_end], sans les ouvrir."""
+        lo = 0 if t_start is None else max(int(np.searchsorted(self.starts, as_ns(t_start), side='right')) - 1, 0)
+        hi = len(self) if t_end is None else int(np.searchsorted(self.starts, as_ns(t_end), side='right'))
+        return list(range(lo, hi))
+
+    def frames(self, ids=None, t_start=None, t_end=None, bus=None):
+        """Trames des identifiants ids sur la fenêtre, splits concaténés dans l'ordre
+        (colonne 'Split' en plus des colonnes de can_mf4)."""
+        parts = []
+        for i in self.overlapping(t_start, t_end):
+            part = read_indexed_frames(self.paths[i], ids, t_start, t_end, bus=bus, index=self.index(i))
+            part['Split'] = i
+            parts.append(part)
+        return concat_frames(parts)
+
+    def signal(self, name, message=None, bus=None):
+        """Signal DBC name sur toute la session, sans rien décoder à la création."""
+        if self.db is None:
+            raise ValueError("Aucune définition DBC pour cette session")
+        msgs = [find_message(self.db, message)] if message is not None else list(self.db.values())
+        msg = next((m for m in msgs if m and name in m['Signals']), None)
+        if msg is None:
+            raise KeyError(f"Signal inconnu dans le DBC : {name}")
+        return SessionSignal(self, msg, name, bus)
+
+
+class SessionSignal:
+    """Série temporelle d'un signal DBC, concaténée paresseusement sur les splits."""
+
+    def __init__(self, session, message, name, bus=None):
+        self.session = session
+        self.message = message
+        self.name = name
+        self.bus = bus
+
+    def __repr__(self):
+        return f"SessionSignal({self.name!r}, {self.message['Name']}, {len(self.session)} splits)"
+
+    def _decode(self, frames):
+        sig = self.message['Signals'][self.name]
+        if not len(frames['Timestamp']):
+            return pd.Series(dtype=np.float64, name=self.name, index=pd.DatetimeIndex([], name='Time'))
+        keep = frames['IDE'] == int(self.message['Extended'])
+        values = decode_message(self.message, frames['Payload'][keep], frames['DataLength'][keep],
+                                signals=[self.name])[self.name]
+        index = pd.DatetimeIndex(frames['Timestamp'][keep].astype('datetime64[ns]'), name='Time')
+        s = pd.Series(values, index=index, name=self.name)
+        s.attrs['Unit'] = sig['Unit']
+        return s
+
+    def chunks(self, t_start=None, t_end=None):
+        """Un morceau (Series) par split chevauchant la fenêtre, décodé à l'itération."""
+        ids = [self.message['ID']]
+        for i in self.session.overlapping(t_start, t_end):
+            part = read_indexed_frames(self.session.paths[i], ids, t_start, t_end, bus=self.bus,
+                                       index=self.session.index(i))
+            yield self._decode(part)
+
+    def between(self, t_start=None, t_end=None):
+        """Series du signal sur [t_start, t_end] (seuls les splits concernés sont ouverts)."""
+        parts = [s for s in self.chunks(t_start, t_end) if len(s)]
+        if not parts:
+            return self._decode(empty_frames())
+        out = pd.concat(parts) if len(parts) > 1 else parts[0]
+        out.attrs['Unit'] = self.message['Signals'][self.name]['Unit']
+        return out
+
+    def to_series(self):
+        return self.between()
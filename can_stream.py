@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Flux CAN (CANedge) comme esclave supplémentaire de la fusion Xsens
+
+1. Lecture de la session (can_session) sur la fenêtre de l'essai Xsens élargie de
+   la marge de recherche : seuls les splits et les identifiants utiles sont décodés.
+2. Un DataFrame par message DBC (base de temps propre au message), colonnes
+   CAN_<signal>, index trié sans doublons.
+3. Horloge du flux : offset global par corrélation de la vitesse véhicule CAN
+   (m/s) avec la vitesse horizontale Xsens (sync_estimation.estimate_offset), puis
+   dérive par fenêtres glissantes si assez de fenêtres fiables (estimate_drift).
+   Le même modèle recale tous les messages (référence : premier échantillon vitesse).
+Les DataFrames recalés sont passés à merge_stream avec le TDMS (esclaves multiples).
+"""
+
+import numpy as np
+import pandas as pd
+
+from can_dbc import decode_frames, find_message
+from clock_model import ClockModel
+from sync_estimation import MAX_LAG_S, MIN_CONFIDENCE, WINDOW_COLS, estimate_drift, estimate_offset
+from time_base import as_ns
+
+CAN_PREFIX = 'CAN_'
+MARGIN_S = 10.0  # lecture CAN au-delà de l'essai Xsens, en plus de max_lag_s (s)
+SPEED_UNITS = {'km/h': 1 / 3.6, 'kph': 1 / 3.6, 'kmh': 1 / 3.6, 'm/s': 1.0, 'mph': 0.44704}
+DEFAULT_SPEED_FACTOR = 1 / 3.6  # unité absente du DBC : km/h (usage des bus véhicule)
+
+
+def signal_messages(db, signals):
+    """{nom du message: [signaux]} des signaux demandés (KeyError si un signal est inconnu)."""
+    out = {}
+    for name in signals:
+        msg = next((m for m in db.values() if name in m['Signals']), None)
+        if msg is None:
+            raise KeyError(f"Signal inconnu dans le DBC : {name}")
+        out.setdefault(msg['Name'], []).append(name)
+    return out
+
+
+def can_streams(session, signals, t_start, t_end, bus=None, prefix=CAN_PREFIX):
+    """{message: DataFrame} des signaux demandés sur [t_start, t_end], un DataFrame par
+    message (index temps CAN, colonnes prefix + signal). Messages de moins de 2 trames ignorés."""
+    wanted = signal_messages(session.db, signals)
+    ids = [find_message(session.db, m)['ID'] for m in wanted]
+    frames = session.frames(ids, t_start, t_end, bus=bus)
+    out = {}
+    for name, df in decode_frames(session.db, frames, list(wanted)).items():
+        df = df[wanted[name]]
+        df = df[~df.index.duplicated(keep='first')].sort_index()
+        if len(df) >= 2:
+            out[name] = df.add_prefix(prefix)
+    return out
+
+
+def speed_factor(db, signal):
+    unit = next((m['Signals'][signal]['Unit'] for m in db.values() if signal in m['Signals']), '')
+    return SPEED_UNITS.get(unit.strip().lower(), DEFAULT_SPEED_FACTOR)
+
+
+def align_can(df_xsens, speed, time_col='TS_UTC', max_lag_s=MAX_LAG_S, drift=True, **kw):
+    """Horloge CAN -> Xsens depuis la vitesse véhicule speed (Series m/s, index temps CAN).
+    Retourne (ClockModel ou None si la corrélation n'est pas fiable, dict de estimate_offset,
+    fenêtres de dérive)."""
+    empty = pd.DataFrame(columns=WINDOW_COLS)
+    if not {'Vel_N', 'Vel_E'}.issubset(df_xsens.columns) or len(speed) < 2:
+        return None, None, empty
+    t_ref = df_xsens[time_col]
+    x_ref = np.hypot(df_xsens['Vel_N'].to_numpy(dtype=np.float64), df_xsens['Vel_E'].to_numpy(dtype=np.float64))
+    x_sig = speed.to_numpy(dtype=np.float64)
+    est = estimate_offset(t_ref, x_ref, speed.index, x_sig, max_lag_s=max_lag_s, **kw)
+    if not np.isfinite(est['Offset_s']) or est['Confidence'] < MIN_CONFIDENCE:
+        return None, est, empty
+    windows = empty
+    model = None
+    if drift:
+        model, windows = estimate_drift(t_ref, x_ref, speed.index, x_sig, lag0_s=est['Offset_s'])
+    if model is None:
+        model = ClockModel([0.0], [est['Offset_s']])
+    return model, est, windows
+
+
+def warp_streams(streams, clock, ref_ns):
+    """Recale tous les DataFrames d'un flux avec le même modèle (référence ref_ns)."""
+    out = {}
+    for name, df in streams.items():
+        df = df.copy()
+        df.index = clock.warp_index(df.index, ref_ns)
+        out[name] = df
+    return out
+
+
+def can_slaves(session, df_xsens, speed_signal, signals=(), time_col='TS_UTC', bus=None, max_lag_s=MAX_LAG_S,
+               drift=True, prefix=CAN_PREFIX):
+    """Flux CAN d'un essai prêt pour la fusion : (liste de DataFrames recalés sur Xsens,
+    rapport {'Offset_s', 'Confidence', 'Drift_ppm', 'Messages', 'Windows'}).
+    Liste vide si la vitesse CAN manque sur l'essai ou si la corrélation n'est pas fiable."""
+    report = {'Offset_s': None, 'Confidence': None, 'Drift_ppm': None, 'Messages': 0, 'Windows': None}
+    ts = as_ns(df_xsens[time_col])
+    if len(ts) == 0 or len(session) == 0:
+        return [], report
+    margin = pd.Timedelta(seconds=max_lag_s + MARGIN_S)
+    t_start, t_end = pd.Timestamp(ts.min()) - margin, pd.Timestamp(ts.max()) + margin
+    names = [speed_signal] + [s for s in signals if s != speed_signal]
+    streams = can_streams(session, names, t_start, t_end, bus=bus, prefix=prefix)
+    speed_msg = next((m for m, df in streams.items() if prefix + speed_signal in df.columns), None)
+    if speed_msg is None:
+        return [], report
+    speed = streams[speed_msg][prefix + speed_signal].dropna() * speed_factor(session.db, speed_signal)
+    clock, est, windows = align_can(df_xsens, speed, time_col, max_lag_s, drift)
+    if est is not None:
+        report.update(Offset_s=est['Offset_s'], Confidence=est['Confidence'])
+    report['Windows'] = windows
+    if clock is None:
+        return [], report
+    report['Drift_ppm'] = clock.drift_ppm
+    streams = warp_streams(streams, clock, as_ns(speed.index[0]))
+    report['Messages'] = len(streams)
+    return list(streams.values()), report
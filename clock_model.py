@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Modèle d'horloge esclave (cDAQ / TDMS) -> temps maître (GPS / Xsens)
+
+offset(t) = t_maître - t_esclave, linéaire par morceaux en t (secondes depuis le
+premier échantillon esclave) :
+- 1 nœud  : offset constant
+- 2 nœuds : offset + dérive (ppm)
+- plus    : dérive par morceaux (continue aux nœuds)
+Au-delà des nœuds extrêmes, les segments extrêmes sont prolongés.
+
+Le modèle s'applique comme un time warp vectorisé de l'axe TDMS avant
+l'interpolation : l'alignement reste bon jusqu'à la fin de l'essai, pas seulement
+au départ (MAGIC_OFFSET constant).
+
+Fichier clock_models.csv (un nœud par ligne) : File_Name, T_s, Offset_s
+Référence : l'axe TDMS déjà calé par load_tdms_smart (metadata ou départ Xsens +
+MAGIC_OFFSET, puis correction estimée). Les modèles enregistrés ne portent donc
+que la dérive (offset nul au premier échantillon, voir drift_only) ; un offset
+absolu serait compté deux fois.
+"""
+
+import numpy as np
+import pandas as pd
+
+CLOCK_COLS = ['File_Name', 'T_s', 'Offset_s']
+
+
+class ClockModel:
+    """offset(t) linéaire par morceaux défini par des nœuds (knots_s, offsets_s)."""
+
+    def __init__(self, knots_s, offsets_s):
+        k = np.atleast_1d(np.asarray(knots_s, dtype=np.float64))
+        o = np.atleast_1d(np.asarray(offsets_s, dtype=np.float64))
+        if len(k) == 0 or len(k) != len(o):
+            raise ValueError("knots_s et offsets_s doivent avoir la même longueur (>= 1)")
+        order = np.argsort(k, kind='stable')
+        self.knots_s, self.offsets_s = k[order], o[order]
+        if np.any(np.diff(self.knots_s) <= 0):
+            raise ValueError("Nœuds en double dans le modèle d'horloge")
+
+    @classmethod
+    def linear(cls, offset_s=0.0, drift_ppm=0.0):
+        """offset(t) = offset_s + drift_ppm * 1e-6 * t."""
+        return cls([0.0, 1.0], [offset_s, offset_s + drift_ppm * 1e-6])
+
+    @classmethod
+    def fit(cls, t_s, offsets_s, knots_s=None):
+        """Moindres carrés sur des offsets observés (t_s, offsets_s) :
+        offset + dérive si knots_s est None, sinon linéaire par morceaux aux nœuds donnés."""
+        t = np.asarray(t_s, dtype=np.float64)
+        y = np.asarray(offsets_s, dtype=np.float64)
+        ok = np.isfinite(t) & np.isfinite(y)
+        t, y = t[ok], y[ok]
+        if len(t) == 0:
+            raise ValueError("Aucun offset observé")
+        if knots_s is None:
+            if len(t) == 1 or np.ptp(t) == 0:
+                return cls([0.0], [np.mean(y)])
+            knots_s = [t.min(), t.max()]
+        model = cls(knots_s, np.zeros(len(knots_s)))
+        coef, *_ = np.linalg.lstsq(model._basis(t), y, rcond=None)
+        model.offsets_s = coef
+        return model
+
+    def __repr__(self):
+        if len(self.knots_s) == 1:
+            return f"ClockModel(offset={self.offsets_s[0]:+.6f} s)"
+        return f"ClockModel(offset={self.offset(0.0):+.6f} s, drift={self.drift_ppm:+.2f} ppm, knots={len(self.knots_s)})"
+
+    def drift_only(self):
+        """Même modèle décalé pour que offset(0) = 0 (la dérive seule)."""
+        return ClockModel(self.knots_s, self.offsets_s - self.offset(0.0))
+
+    @property
+    def drift_ppm(self):
+        """Dérive moyenne entre le premier et le dernier nœud."""
+        if len(self.knots_s) < 2:
+            return 0.0
+        return (self.offsets_s[-1] - self.offsets_s[0]) / (self.knots_s[-1] - self.knots_s[0]) * 1e6
+
+    def _basis(self, t):
+        """Matrice (n, nœuds) : offset(t) = _basis(t) @ offsets_s."""
+        t = np.asarray(t, dtype=np.float64)
+        A = np.zeros((len(t), len(self.knots_s)))
+        if len(self.knots_s) == 1:
+            A[:, 0] = 1.0
+            return A
+        i, w = self._segment(t)
+        rows = np.arange(len(t))
+        A[rows, i] = 1 - w
+        A[rows, i + 1] = w
+        return A
+
+    def _segment(self, t):
+        k = self.knots_s
+        i = np.clip(np.searchsorted(k, t, side='right') - 1, 0, len(k) - 2)
+        return i, (t - k[i]) / (k[i + 1] - k[i])
+
+    def offset(self, t_s):
+        """offset(t) en secondes (t : secondes depuis le premier échantillon esclave)."""
+        t = np.asarray(t_s, dtype=np.float64)
+        if len(self.knots_s) == 1:
+            return np.full(t.shape, self.offsets_s[0]) if t.ndim else float(self.offsets_s[0])
+        i, w = self._segment(t)
+        out = self.offsets_s[i] * (1 - w) + self.offsets_s[i + 1] * w
+        return out if t.ndim else float(out)
+
+    def warp(self, t_s, t_ref=0.0):
+        """Temps esclave (secondes, absolus) -> temps maître, t_ref = premier échantillon esclave."""
+        t = np.asarray(t_s, dtype=np.float64)
+        return t + self.offset(t - t_ref)
+
+    def warp_index(self, index, ref_ns=None):
+        """DatetimeIndex esclave -> DatetimeIndex maître (référence : premier échantillon, ou
+        ref_ns pour plusieurs index d'un même flux, ex. un DataFrame par message CAN)."""
+        ns = index.asi8
+        if len(ns) == 0:
+            return index
+        rel = (ns - (ns[0] if ref_ns is None else ref_ns)) / 1e9
+        shift = np.rint(self.offset(rel) * 1e9).astype(np.int64)
+        return pd.DatetimeIndex((ns + shift).view('datetime64[ns]'), name=index.name)
+
+
+def load_clock_models(path):
+    """clock_models.csv -> {File_Name: ClockModel}. Dictionnaire vide si le fichier n'existe pas."""
+    try:
+        df = pd.read_csv(path)
+    except FileNotFoundError:
+        return {}
+    return {name: ClockModel(g['T_s'].values, g['Offset_s'].values) for name, g in df.groupby('File_Name', sort=False)}
+
+
+def save_clock_models(models, path):
+    """{File_Name: ClockModel} -> clock_models.csv (remplace les entrées des mêmes fichiers)."""
+    rows = [(name, k, o) for name, m in models.items() for k, o in zip(m.knots_s, m.offsets_s)]
+    df = pd.DataFrame(rows, columns=CLOCK_COLS)
+    try:
+        old = pd.read_csv(path)
+        df = pd.concat([old[~old['File_Name'].isin(list(models))], df], ignore_index=True)
+    except FileNotFoundError:
+        pass
+    df.to_csv(path, index=False, float_format='%.9f')
@@ -4,9 +4,18 @@
 Estimation séparée du drift de script et du drift d'horloge
 """
 
+import os
 import pandas as pd
 import numpy as np
 from nptdms import TdmsFile
+from xsens_io import utc_timestamps
+from tdms_io import channel_time_base
+from clock_model import ClockModel, save_clock_models
+from sync_estimation import trial_drift
+
+# Fichier lu par run_batch_freinage.py (CLOCK_MODELS_CSV = BASE_DIR/clock_models.csv)
+BASE_DIR = r'Moto_Freinage_mouille'
+CLOCK_MODELS_CSV = os.path.join(BASE_DIR, 'clock_models.csv')
 
 print("=" * 80)
 print("ESTIMATION: DRIFT SCRIPT vs DRIFT HORLOGE")
@@ -28,29 +37,21 @@ if group is None:
     group = tdms_file.groups()[0]
 
 channel = group['Edges_RoueAR']
-start_time = pd.to_datetime(channel.properties.get('wf_start_time')).tz_localize(None)
-increment = channel.properties.get('wf_increment')
-edges_cal = channel[:]
-
-tdms_time = start_time + pd.to_timedelta(np.arange(len(edges_cal)) * increment, unit='s')
-df_tdms = pd.DataFrame({'timestamp': tdms_time, 'Edges': edges_cal})
+# Base de temps calculée (wf_start_time + i * wf_increment), sans tableau de timestamps
+tdms_base = channel_time_base(channel)
 
 # Xsens
 df_txt = pd.read_csv("Moto_Chicane_100_P1.txt", sep='\t', skiprows=12)
 df_txt.columns = df_txt.columns.str.strip()
 req_cols = ['UTC_Year', 'UTC_Month', 'UTC_Day', 'UTC_Hour', 'UTC_Minute', 'UTC_Second', 'UTC_Nano']
 df_txt = df_txt.dropna(subset=req_cols)
-time_series = pd.to_datetime(df_txt[req_cols[:-1]].astype(int).rename(columns={
-    'UTC_Year': 'year', 'UTC_Month': 'month', 'UTC_Day': 'day',
-    'UTC_Hour': 'hour', 'UTC_Minute': 'minute', 'UTC_Second': 'second'
-}))
-df_txt['timestamp'] = time_series + pd.to_timedelta(df_txt['UTC_Nano'], unit='ns')
+df_txt['timestamp'] = utc_timestamps(df_txt)
 
 # ============================================================================
 # 2. DONNÉES OBSERVÉES
 # ============================================================================
-tdms_start = df_tdms['timestamp'].min()
-tdms_end = df_tdms['timestamp'].max()
+tdms_start = tdms_base.start
+tdms_end = tdms_base.end
 xsens_start = df_txt['timestamp'].min()
 xsens_end = df_txt['timestamp'].max()
 
@@ -176,7 +177,33 @@ print(f"\nÀ 400 Hz:")
 print(f"  Échantillons dus au script (début+fin): {samples_script:.0f}")
 print(f"  Échantillons dus au drift d'horloge:    {samples_drift:.0f}")
 print(f"  Total théorique:                        {samples_script + samples_drift:.0f}")
-print(f"  Total observé:                          {len(df_txt) - len(df_tdms)}")
-print(f"  Différence:                             {abs((samples_script + samples_drift) - (len(df_txt) - len(df_tdms))):.0f}")
+print(f"  Total observé:                          {len(df_txt) - len(tdms_base)}")
+print(f"  Différence:                             {abs((samples_script + samples_drift) - (len(df_txt) - len(tdms_base))):.0f}")
 
 print("\n" + "=" * 80)
+
+# ============================================================================
+# 8. MODÈLE D'HORLOGE POUR LE MERGE
+# ============================================================================
+# Dérive estimée sur des fenêtres glissantes (vitesse roue vs vitesse Xsens) :
+# offset + ppm par régression robuste sur toutes les fenêtres, pas seulement début / fin
+df_tdms = pd.DataFrame({'TDMS_Edges_RoueAR': channel[:]}, index=tdms_base.to_index('TDMS_Timestamp'))
+clock, windows = trial_drift(df_txt, df_tdms, time_col='timestamp')
+
+if clock is not None:
+    inl = windows[windows['Inlier']]
+    print(f"\n🔹 Fenêtres retenues: {len(inl)}/{len(windows)}")
+    print(f"   Offset à t=0:  {clock.offset(0.0):+.6f} s")
+    print(f"   Dérive:        {clock.drift_ppm:+.2f} ppm (début/fin: {clock_drift_rate * 1e6:+.2f} ppm)")
+    print(f"   Résidu RMS:    {np.sqrt(np.mean(inl['Residual_s'] ** 2)) * 1e3:.3f} ms")
+    windows.to_csv("drift_windows.csv", index=False)
+else:
+    # Pas assez de fenêtres corrélées : modèle début / fin
+    print(f"\n⚠️  Corrélation par fenêtres insuffisante ({len(windows)} fenêtres) : modèle début / fin")
+    clock = ClockModel([0.0, tdms_duration], [0.0, clock_drift_total])
+# Le départ est déjà calé par load_tdms_smart (metadata / MAGIC_OFFSET) dans le batch :
+# le modèle enregistré ne porte que la dérive (l'offset à t=0 serait compté deux fois)
+clock = clock.drift_only()
+os.makedirs(BASE_DIR, exist_ok=True)
+save_clock_models({"Moto_Chicane_100_P1.txt": clock}, CLOCK_MODELS_CSV)
+print(f"\n💾 Modèle d'horloge sauvegardé ({CLOCK_MODELS_CSV}) : {clock}")
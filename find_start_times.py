@@ -7,6 +7,7 @@ Script pour trouver les start times des fichiers TDMS et TXT pour Moto_Chicane_1
 import pandas as pd
 from nptdms import TdmsFile
 from datetime import datetime
+from xsens_io import probe_xsens
 
 # Chemins des fichiers
 tdms_path = "Moto_Chicane_100.tdms"
@@ -62,6 +63,16 @@ print("\n\n📊 FICHIER TXT: Moto_Chicane_100_P1.txt")
 print("-" * 70)
 
 try:
+    # Start / End / Durée depuis le début et la fin du fichier (sans parsing complet)
+    info = probe_xsens(txt_path)
+    if info is not None:
+        print(f"  📍 Start Time (UTC): {info['Start']}")
+        print(f"  📍 End Time (UTC): {info['End']}")
+        print(f"  📍 Durée totale: {info['Duration_s']:.2f} secondes")
+        print(f"  📍 Lignes (estimation): {info['Rows_Est']} (~{info['Rate_Est_Hz'] or 0:.1f} Hz)")
+        print(f"  📍 PacketCounter: {info['PacketCounter_First']} -> {info['PacketCounter_Last']}")
+
+    # Lecture complète uniquement pour la détection de démarrage GPS
     # Lire le fichier TXT - skip les lignes de commentaire
     # Les données commencent après les lignes de commentaire (//)
     df_txt = pd.read_csv(txt_path, delimiter='\t', skiprows=11, low_memory=False)
@@ -85,17 +96,9 @@ try:
     df_txt = df_txt.sort_values('timestamp').reset_index(drop=True)
     
     # Informations sur le fichier
-    print(f"  Nombre total de lignes: {len(df_txt)}")
+    print(f"\n  Nombre total de lignes: {len(df_txt)}")
     print(f"  Colonnes: {', '.join(df_txt.columns[:10])}...")
-    
-    # Start time
     start_time_txt = df_txt['timestamp'].min()
-    end_time_txt = df_txt['timestamp'].max()
-    duration_txt = (end_time_txt - start_time_txt).total_seconds()
-    
-    print(f"\n  📍 Start Time: {start_time_txt}")
-    print(f"  📍 End Time: {end_time_txt}")
-    print(f"  📍 Durée totale: {duration_txt:.2f} secondes")
     
     # Détecter le démarrage (quand la vitesse GPS dépasse un seuil)
     if 'GPS_Speed' in df_txt.columns:
@@ -1,8 +1,8 @@
 
-import pandas as pd
-import numpy as np
 from nptdms import TdmsFile
 import os
+from xsens_io import probe_xsens
+from tdms_io import segment_edges
 
 # PATHS
 BASE = r"c:\Users\es-sabar\Documents\PreTest\Moto_04112025_chicane_sec"
@@ -11,24 +11,11 @@ XSENS_P1 = os.path.join(BASE, "Moto_chicane_TXT", "Moto_Chicane_50_P1.txt")
 XSENS_P2 = os.path.join(BASE, "Moto_chicane_TXT", "Moto_Chicane_50_P2.txt")
 
 def load_xsens_head(path):
-    # Quick Start Time Extract
-    try:
-        h_idx = None
-        with open(path, 'r', errors='ignore') as f:
-            for i, l in enumerate(f):
-                if 'UTC_Year' in l: h_idx=i; break
-        if h_idx is None: return None
-        
-        df = pd.read_csv(path, sep=None, header=h_idx, nrows=5, engine='python')
-        df.columns = df.columns.str.strip()
-        
-        req = ['UTC_Year', 'UTC_Month', 'UTC_Day', 'UTC_Hour', 'UTC_Minute', 'UTC_Second', 'UTC_Nano']
-        ts = pd.to_datetime(df[req[:-1]].astype(int).rename(columns={'UTC_Year':'year','UTC_Month':'month','UTC_Day':'day','UTC_Hour':'hour','UTC_Minute':'minute','UTC_Second':'second'}))
-        ts += pd.to_timedelta(df['UTC_Nano'], unit='ns')
-        return ts.min()
-    except Exception as e:
-        print(e)
-        return None
+    # Quick Start Time Extract (probe début/fin, sans parsing complet)
+    info = probe_xsens(path)
+    if info is None: return None
+    print(f"   {os.path.basename(path)}: {info['Start']} -> {info['End']} ({info['Duration_s']:.2f} s, ~{info['Rows_Est']} lignes)")
+    return info['Start']
 
 def inspect_tdms_group(path, group_name):
     tdms = TdmsFile.read(path)
@@ -50,10 +37,10 @@ def inspect_tdms_group(path, group_name):
                 print(f"First 10 values: {data[:10]}")
                 print(f"Last 10 values: {data[-10:]}")
                 
-                # Check Reset manual
-                diffs = np.diff(data)
-                resets = np.where(diffs < -100)[0]
-                print(f"Diffs < -100 found at: {resets}")
+                # Check Reset manual (tous les resets / wraps, pas seulement le premier)
+                segments = segment_edges(data)
+                print(f"Segments Edges_RoueAR ({len(segments) - 1} coupure(s)) :")
+                print(segments.to_string(index=False))
             else:
                 print("Channel Edges_RoueAR NOT FOUND")
                 
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Noyaux de fusion : ré-échantillonnage des canaux esclaves (TDMS) sur le temps maître (Xsens)
+
+Les indices d'encadrement et les écarts de temps sont calculés une seule fois
+(linear_bracket), puis appliqués à un bloc 2-D de tous les canaux en un seul gather
+vectorisé (interp_frame), au lieu d'un interp1d par colonne.
+
+Même arithmétique que scipy interp1d(kind='linear', fill_value='extrapolate') :
+slope = (y_hi - y_lo) / (x_hi - x_lo) ; y = slope * (x - x_lo) + y_lo
+-> résultats identiques au bit près.
+
+resample_frame choisit un noyau par canal (RESAMPLE_POLICY) :
+- 'linear'  : interpolation linéaire (interp_frame)
+- 'zoh'     : valeur tenue (dernier échantillon <= t), compteurs
+- 'nearest' : échantillon le plus proche, canaux discrets / états
+- 'poly'    : filtrage anti-repliement polyphase puis linéaire si la cible est plus
+              lente que la source, sinon identique à 'linear'
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+from scipy.signal import resample_poly
+
+THREAD_MIN_CELLS = 5_000_000  # points de sortie (lignes x colonnes) avant de passer en multi-thread
+TILE = 8192  # instants maître par tuile (temporaires petits et réutilisés)
+
+# Noyau par canal : premier motif (fnmatch, nom avec ou sans préfixe) qui correspond
+RESAMPLE_POLICY = [
+    ('*Edges_*', 'zoh'),         # compteurs de fronts (unité 'count') : pas de fronts fractionnaires
+    ('*PacketCounter', 'nearest'),
+    ('*SampleTime*', 'nearest'),
+    ('*Status*', 'nearest'),
+    ('*_Valid', 'nearest'),
+    ('*', 'poly'),               # capteurs analogiques
+]
+POLY_MAX_RATIO = 0.95   # 'poly' ne filtre que si f_cible / f_source < POLY_MAX_RATIO
+POLY_MAX_DEN = 100      # dénominateur max du rapport up / down de resample_poly
+
+
+def linear_bracket(t_src, t_dst):
+    """(lo, dx, dt) pour interpoler de t_src (trié) vers t_dst :
+    intervalle [lo, lo + 1], dx = largeur de l'intervalle, dt = t_dst - t_src[lo].
+    Hors bornes, le premier / dernier intervalle est prolongé (extrapolation)."""
+    t_src = np.asarray(t_src, dtype=np.float64)
+    t_dst = np.asarray(t_dst, dtype=np.float64)
+    if len(t_src) < 2:
+        raise ValueError("Au moins 2 points source sont nécessaires pour interpoler")
+    hi = np.searchsorted(t_src, t_dst).clip(1, len(t_src) - 1)
+    lo = hi - 1
+    x_lo = t_src[lo]
+    return lo, t_src[hi] - x_lo, t_dst - x_lo
+
+
+def interp_block(block, bracket, out=None):
+    """block : (k, n_src) -> out (k, n_dst) float64, une ligne par canal.
+    Calcul par tuiles d'instants maître, en place dans out."""
+    lo, dx, dt = bracket
+    if out is None:
+        out = np.empty((len(block), len(lo)))
+    for s in range(0, len(lo), TILE):
+        sl = slice(s, s + TILE)
+        y_lo = np.take(block, lo[sl], axis=1)
+        y_hi = np.take(block, lo[sl] + 1, axis=1)
+        np.subtract(y_hi, y_lo, out=y_hi)  # dans le dtype du bloc (float32 reste float32, comme interp1d)
+        o = out[:, sl]
+        np.divide(y_hi, dx[sl], out=o)
+        o *= dt[sl]
+        o += y_lo
+    return out
+
+
+def _dtype_groups(df):
+    """Positions des colonnes par dtype de calcul (les entiers passent en float64, comme interp1d)."""
+    groups = {}
+    for j, dt in enumerate(df.dtypes):
+        key = dt if isinstance(dt, np.dtype) and dt.kind in 'fc' else np.dtype(np.float64)
+        groups.setdefault(key, []).append(j)
+    return groups
+
+
+def interp_frame(df, t_src, t_dst, index=None, n_threads=None):
+    """Interpole toutes les colonnes de df (échantillonnées à t_src) aux instants t_dst.
+
+    n_threads : None = automatique (multi-thread au-delà de THREAD_MIN_CELLS), 1 = séquentiel.
+    Retourne un DataFrame float64 (mêmes colonnes que df, index donné)."""
+    bracket = linear_bracket(t_src, t_dst)
+    n_dst, n_cols = len(bracket[0]), df.shape[1]
+    if n_threads is None:
+        n_threads = 1 if n_dst * n_cols < THREAD_MIN_CELLS else min(os.cpu_count() or 1, n_cols)
+    n_threads = max(1, min(n_threads, n_cols))
+
+    # Lignes de out dans l'ordre des groupes de dtype, découpées en tâches contiguës
+    out = np.empty((n_cols, n_dst))
+    order, tasks = [], []
+    for dtype, cols in _dtype_groups(df).items():
+        block = np.ascontiguousarray(df.iloc[:, cols].to_numpy(dtype=dtype).T)
+        for part in np.array_split(np.arange(len(cols)), n_threads):
+            if len(part):
+                r0 = len(order)
+                tasks.append((block[part[0]:part[-1] + 1], out[r0:r0 + len(part)]))
+                order.extend(cols[part[0]:part[-1] + 1])
+
+    def run(task):
+        interp_block(task[0], bracket, out=task[1])
+
+    if n_threads == 1:
+        for task in tasks:
+            run(task)
+    else:
+        # Les ufuncs numpy relâchent le GIL : les groupes de colonnes avancent en parallèle
+        with ThreadPoolExecutor(max_workers=n_threads) as pool:
+            list(pool.map(run, tasks))
+
+    if order != list(range(n_cols)):
+        out = out[np.argsort(order)]
+    return pd.DataFrame(out.T, index=index, columns=df.columns, copy=False)
+
+
+def channel_kernel(name, policy=RESAMPLE_POLICY):
+    for pattern, kernel in policy:
+        if fnmatchcase(name, pattern):
+            return kernel
+    return 'linear'
+
+
+def hold_index(t_src, t_dst, kernel='zoh'):
+    """Indices source pour 'zoh' (dernier échantillon <= t) ou 'nearest' (le plus proche),
+    bornés au premier / dernier échantillon hors plage."""
+    t_src = np.asarray(t_src, dtype=np.float64)
+    t_dst = np.asarray(t_dst, dtype=np.float64)
+    n = len(t_src)
+    if kernel == 'zoh' or n == 1:
+        return (np.searchsorted(t_src, t_dst, side='right') - 1).clip(0, n - 1)
+    hi = np.searchsorted(t_src, t_dst).clip(1, n - 1)
+    lo = hi - 1
+    return np.where(t_dst - t_src[lo] > t_src[hi] - t_dst, hi, lo)
+
+
+def _rate(t):
+    d = np.diff(np.asarray(t, dtype=np.float64))
+    return 1.0 / np.median(d) if len(d) and np.median(d) > 0 else None
+
+
+def poly_ratio(fs_src, fs_dst):
+    """Rapport up / down (Fraction) de resample_poly de fs_src vers ~fs_dst, None si pas de décimation utile."""
+    if fs_src is None or fs_dst is None or fs_dst / fs_src >= POLY_MAX_RATIO:
+        return None
+    frac = Fraction(fs_dst / fs_src).limit_denominator(POLY_MAX_DEN)
+    return frac if frac.numerator else None
+
+
+def antialias_resample(df, t_src, fs_dst):
+    """Conversion polyphase (resample_poly) de df, supposé uniforme, vers ~fs_dst.
+    Retourne (DataFrame filtré, nouveaux instants) ; None si pas de décimation utile."""
+    fs_src = _rate(t_src)
+    frac = poly_ratio(fs_src, fs_dst)
+    if frac is None:
+        return None
+    t_src = np.asarray(t_src, dtype=np.float64)
+    y = resample_poly(df.to_numpy(dtype=np.float64), frac.numerator, frac.denominator, axis=0, padtype='line')
+    # Pas moyen entre les extrémités : 1 / fs_src (médiane de diff sur des secondes epoch)
+    # porte l'arrondi du float64 et la grille décimée dériverait sur un long essai
+    step = (t_src[-1] - t_src[0]) / (len(t_src) - 1)
+    t_new = t_src[0] + np.arange(len(y)) * (step * frac.denominator / frac.numerator)
+    return pd.DataFrame(y, columns=df.columns), t_new
+
+
+def resample_frame(df, t_src, t_dst, index=None, policy=RESAMPLE_POLICY, kernels=None, n_threads=None):
+    """Ré-échantillonne chaque colonne de df (instants t_src) aux instants t_dst avec le
+    noyau de la politique (kernels = {colonne: noyau} pour forcer), par lots de colonnes.
+    Les colonnes 'zoh' / 'nearest' gardent leur dtype, les autres passent en float64."""
+    kernels = kernels or {}
+    by_kernel = {}
+    for c in df.columns:
+        by_kernel.setdefault(kernels.get(c) or channel_kernel(str(c), policy), []).append(c)
+
+    parts = []
+    for kernel, cols in by_kernel.items():
+        sub = df[cols]
+        if kernel in ('zoh', 'nearest'):
+            part = sub.iloc[hold_index(t_src, t_dst, kernel)]
+            part.index = index if index is not None else pd.RangeIndex(len(part))
+        elif kernel in ('poly', 'linear'):
+            # 'poly' : colonnes sans NaN filtrées avant l'interpolation (le filtre propagerait les NaN)
+            clean = [c for c in cols if kernel == 'poly' and not sub[c].isna().any()]
+            conv = antialias_resample(sub[clean], t_src, _rate(t_dst)) if clean else None
+            if conv is not None:
+                part = interp_frame(conv[0], conv[1], t_dst, index=index, n_threads=n_threads)
+                rest = sub.drop(columns=clean)
+                if rest.shape[1]:
+                    part = pd.concat([part, interp_frame(rest, t_src, t_dst, index=index, n_threads=n_threads)], axis=1)
+            else:
+                part = interp_frame(sub, t_src, t_dst, index=index, n_threads=n_threads)
+        else:
+            raise ValueError(f"Noyau inconnu : {kernel}")
+        parts.append(part)
+
+    out = parts[0] if len(parts) == 1 else pd.concat(parts, axis=1)
+    return out[list(df.columns)] if list(out.columns) != list(df.columns) else out
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Fusion par tranches (streaming) pour les longs enregistrements
+
+La timeline maître (Xsens) est parcourue par tranches de durée fixe (chunk_s) :
+pour chaque tranche, seule la fenêtre TDMS correspondante (plus un halo) est
+ré-échantillonnée, puis le bloc fusionné est passé au writer avant la tranche
+suivante. La mémoire de la sortie est bornée par la taille d'une tranche, au lieu
+de la copie complète df_merged + toutes les colonnes TDMS interpolées.
+Plusieurs esclaves (TDMS, messages CAN) sont ré-échantillonnés dans la même passe,
+chacun dans sa propre fenêtre de la tranche.
+
+Noyaux 'linear' / 'zoh' / 'nearest' : résultat identique à la fusion en un bloc
+(la fenêtre contient toujours les échantillons qui encadrent la tranche).
+Noyau 'poly' : la fenêtre démarre sur la grille de décimation de l'essai complet et
+le halo couvre les effets de bord du filtre anti-repliement.
+"""
+
+import numpy as np
+import pandas as pd
+
+from merge_kernels import _rate, poly_ratio, resample_frame
+from time_base import as_ns
+
+CHUNK_S = 60.0  # durée d'une tranche maître (s)
+HALO_S = 1.0    # marge TDMS de part et d'autre de la tranche (s)
+RATE_PROBE = 1000  # échantillons pour estimer les fréquences maître / esclave
+
+
+def chunk_bounds(t_ns, chunk_s=CHUNK_S):
+    """Bornes [a, b) des tranches de chunk_s secondes sur t_ns (trié).
+    Une seule tranche si chunk_s est None ou si t_ns n'est pas monotone."""
+    n = len(t_ns)
+    if n == 0:
+        return []
+    if chunk_s is None or np.any(np.diff(t_ns) < 0):
+        return [(0, n)]
+    chunk_ns = int(round(chunk_s * 1e9))
+    n_chunks = int((t_ns[-1] - t_ns[0]) // chunk_ns) + 1
+    cuts = np.searchsorted(t_ns, t_ns[0] + chunk_ns * np.arange(1, n_chunks))
+    edges = np.concatenate(([0], cuts, [n]))
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+
+def _slave_window(slave_ns, t_chunk, halo_ns, align):
+    """[lo, hi) des échantillons esclaves d'une tranche : halo + l'échantillon qui encadre
+    chaque bord, lo calé sur la grille de décimation ('poly')."""
+    lo = max(int(np.searchsorted(slave_ns, t_chunk.min() - halo_ns)) - 1, 0)
+    lo -= lo % align
+    hi = min(int(np.searchsorted(slave_ns, t_chunk.max() + halo_ns, side='right')) + 1, len(slave_ns))
+    return lo, hi
+
+
+def iter_merged_chunks(df_master, df_slave, t_start, t_end, time_col='TS_UTC', chunk_s=CHUNK_S, halo_s=HALO_S,
+                       **resample_kw):
+    """Blocs fusionnés (index time_col, colonnes maître puis esclave(s)) des lignes maître
+    comprises dans [t_start, t_end], tranche par tranche.
+
+    df_slave : indexé par ses timestamps (trié), ou liste de tels DataFrames (flux esclaves
+    sur leurs propres bases de temps : TDMS, messages CAN...), ré-échantillonnés dans la
+    même passe avec resample_frame (resample_kw : policy, kernels, n_threads).
+    Lignes maître hors de la plage d'un esclave : NaN pour ses colonnes (pas d'extrapolation) ;
+    un esclave qui ne couvre pas toute la plage est alors sorti en float64 dans chaque bloc."""
+    slaves = [df_slave] if isinstance(df_slave, pd.DataFrame) else [s for s in df_slave if len(s) >= 2]
+    ts = as_ns(df_master[time_col])
+    keep = np.flatnonzero((ts >= as_ns(t_start)) & (ts <= as_ns(t_end)))
+    t_keep = ts[keep]
+    halo_ns = int(round(halo_s * 1e9))
+    slaves_ns, aligns, covers = [], [], []
+    for df in slaves:
+        slave_ns = as_ns(df.index)
+        # Types de sortie fixés une fois pour tout l'essai (mêmes dtypes dans chaque bloc)
+        covers.append(len(t_keep) == 0 or (slave_ns[0] <= t_keep.min() and slave_ns[-1] >= t_keep.max()))
+        # Pas de la grille décimée ('poly') : les fenêtres restent en phase avec l'essai complet
+        frac = poly_ratio(_rate(slave_ns[:RATE_PROBE] / 1e9), _rate(t_keep[:RATE_PROBE] / 1e9))
+        slaves_ns.append(slave_ns)
+        aligns.append(frac.denominator if frac is not None else 1)
+
+    for a, b in chunk_bounds(t_keep, chunk_s):
+        chunk = df_master.iloc[keep[a:b]].set_index(time_col)
+        t_chunk = t_keep[a:b]
+        parts = [chunk]
+        for df, slave_ns, align, cover in zip(slaves, slaves_ns, aligns, covers):
+            lo, hi = _slave_window(slave_ns, t_chunk, halo_ns, align)
+            if hi - lo < 2:
+                parts.append(pd.DataFrame(np.nan, index=chunk.index, columns=df.columns))
+                continue
+            interp = resample_frame(df.iloc[lo:hi], slave_ns[lo:hi] / 1e9, t_chunk / 1e9,
+                                    index=chunk.index, **resample_kw)
+            if not cover:
+                interp = interp.astype(np.float64)
+                interp.iloc[(t_chunk < slave_ns[0]) | (t_chunk > slave_ns[-1])] = np.nan
+            parts.append(interp)
+        yield pd.concat(parts, axis=1)
+
+
+def merge_to_writer(df_master, df_slave, t_start, t_end, writer, **kw):
+    """Écrit la fusion tranche par tranche dans writer. Retourne le nombre de lignes écrites."""
+    rows = 0
+    for block in iter_merged_chunks(df_master, df_slave, t_start, t_end, **kw):
+        writer.write(block)
+        rows += len(block)
+    return rows
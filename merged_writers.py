@@ -0,0 +1,488 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Écriture des essais fusionnés (Merged_CSV), bloc par bloc
+
+Un writer reçoit les blocs fusionnés dans l'ordre (write), puis est fermé (close,
+ou sortie du bloc with). Le fichier produit est le même que si le DataFrame
+complet avait été écrit en une fois.
+
+Formats (OUTPUT_FORMATS du batch, plusieurs possibles) :
+- 'parquet' : Parquet zstd (pyarrow)
+- 'feather' : Arrow IPC / Feather v2 lz4 (pyarrow), lisible en memory-map
+- 'hdf5'    : HDFStore table blosc:zstd (PyTables)
+- 'csv'     : CSV historique, dates au format CSV_DATE_FORMAT (FastCsvWriter, octet pour
+              octet identique à DataFrame.to_csv(date_format=CSV_DATE_FORMAT))
+Parquet / Feather / HDF5 gardent l'index TS_UTC en datetime64[ns] (int64 ns) et les
+dtypes natifs des colonnes : pas de formatage texte à l'écriture ni de parsing à la relecture.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+try:
+    import tables  # noqa: F401  (moteur de pd.HDFStore)
+    HAS_TABLES = True
+except ImportError:
+    HAS_TABLES = False
+
+CSV_DATE_FORMAT = '%d/%m/%Y %H:%M:%S.%f'
+CSV_BUFFER = 16 * 1024 * 1024
+CSV_ROWS = 20_000  # lignes converties ensemble (mémoire de travail du writer CSV)
+CSV_SPECIAL = (',', '"', '\n', '\r')  # caractères qui imposent des guillemets (csv.QUOTE_MINIMAL)
+CSV_LINE_END = os.linesep  # fin de ligne de DataFrame.to_csv
+PARQUET_COMPRESSION = 'zstd'
+PARQUET_LEVEL = 3
+FEATHER_COMPRESSION = 'lz4'
+HDF_KEY = 'merged'
+HDF_COMPLIB = 'blosc:zstd'
+HDF_COMPLEVEL = 5
+HDF_MIN_STR = 64  # largeur minimale des colonnes texte (fixée au premier bloc)
+
+
+class _Writer:
+    ext = ''
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+
+    def write(self, df):
+        self._write(df)
+        self.rows += len(df)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvWriter(_Writer):
+    """CSV historique (index daté au format CSV_DATE_FORMAT), header au premier bloc."""
+
+    ext = '.csv'
+
+    def __init__(self, path, date_format=CSV_DATE_FORMAT):
+        super().__init__(path)
+        self.date_format = date_format
+        self._f = None
+
+    def _write(self, df):
+        if self._f is None:
+            self._f = open(self.path, 'w', newline='', encoding='utf-8')
+            df.to_csv(self._f, date_format=self.date_format)
+        else:
+            df.to_csv(self._f, date_format=self.date_format, header=False)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def _civil_from_days(days):
+    """Jours depuis 1970-01-01 -> (année, mois, jour), calendrier grégorien (entiers, vectorisé)."""
+    z = days + 719468
+    era = np.floor_divide(z, 146097)
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    year = yoe + era * 400 + (month <= 2)
+    return year, month, day
+
+
+# Champs CSV en octets : matrice uint8 (n, largeur), octets NUL = remplissage (retirés à l'écriture)
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+_ZERO, _MINUS, _DOT = ord('0'), ord('-'), ord('.')
+
+# 'DD/MM/YYYY HH:MM:SS.ffffff' : (position du premier chiffre, nombre de chiffres) par champ
+_DATE_LAYOUT = ((0, 2), (3, 2), (6, 4), (11, 2), (14, 2), (17, 2), (20, 6))
+_DATE_TEMPLATE = np.frombuffer(b'00/00/0000 00:00:00.000000', dtype=np.uint8)
+
+
+def _ndigits(m):
+    """Nombre de chiffres décimaux de m >= 0 (0 compte pour 1)."""
+    return 1 + np.searchsorted(_POW10[1:], m, side='right')
+
+
+def _digits(m, width, lead=True):
+    """Chiffres de m >= 0 alignés à droite sur width colonnes ; lead=False : zéros de tête en NUL
+    (un chiffre au moins)."""
+    out = np.empty((len(m), width), dtype=np.uint8)
+    nd = width if lead else _ndigits(m)
+    r = m
+    for p in range(width):  # de droite à gauche
+        r, d = np.divmod(r, 10)
+        out[:, width - 1 - p] = np.where(p < nd, d + _ZERO, 0)
+    return out
+
+
+def _decimal_field(neg, m, dec):
+    """Signe, chiffres de m et point décimal avant les dec derniers chiffres ('.0' si dec = 0,
+    '0.00...' si m a moins de dec + 1 chiffres). Largeur limitée aux chiffres utiles du bloc."""
+    nd = np.maximum(_ndigits(m), dec + 1)
+    width = int(nd.max()) if len(m) else 1  # chiffres utiles du bloc (23 au plus)
+    out = np.empty((len(m), 2 * width + 2), dtype=np.uint8)
+    out[:, 0] = neg * np.uint8(_MINUS)
+    r = m
+    for p in range(width):  # de droite à gauche : [chiffre p][point si p == dec]
+        r, d = np.divmod(r, 10)
+        col = 1 + 2 * (width - 1 - p)
+        out[:, col] = (d.astype(np.uint8) + np.uint8(_ZERO)) * (p < nd)
+        out[:, col + 1] = (dec == p) * np.uint8(_DOT)
+    out[:, -1] = (dec == 0) * np.uint8(_ZERO)
+    return out
+
+
+def _sign(neg):
+    return np.where(neg, _MINUS, 0).astype(np.uint8)[:, None]
+
+
+def _const(text, n):
+    return np.broadcast_to(np.frombuffer(text.encode(), dtype=np.uint8), (n, len(text)))
+
+
+def _encode(strings):
+    """Chaînes Python -> champ (utf-8)."""
+    raw = [s.encode('utf-8') for s in strings]
+    width = max(map(len, raw), default=0) or 1
+    return np.array(raw, dtype=f'S{width}').view(np.uint8).reshape(len(raw), width)
+
+
+def _merge_rows(n, parts):
+    """Champ complet à partir de champs calculés sur des sous-ensembles : [(positions, champ), ...]."""
+    if len(parts) == 1 and len(parts[0][0]) == n:
+        return parts[0][1]
+    out = np.zeros((n, max([f.shape[1] for _, f in parts], default=1)), dtype=np.uint8)
+    for pos, field in parts:
+        out[pos, :field.shape[1]] = field
+    return out
+
+
+def timestamp_field(ns):
+    """int64 ns -> champ au format CSV_DATE_FORMAT (microsecondes tronquées comme strftime),
+    chiffres calculés par arithmétique entière sur tout le tableau. NaT -> champ vide."""
+    ns = np.asarray(ns, dtype=np.int64)
+    nat = ns == np.iinfo(np.int64).min
+    us = np.floor_divide(np.where(nat, 0, ns), 1000)
+    days, us_day = np.divmod(us, 86_400_000_000)
+    sec, frac = np.divmod(us_day, 1_000_000)
+    year, month, day = _civil_from_days(days)
+    fields = (day, month, year, sec // 3600, sec // 60 % 60, sec % 60, frac)
+
+    out = np.tile(_DATE_TEMPLATE, (len(ns), 1))
+    for (pos, width), value in zip(_DATE_LAYOUT, fields):
+        out[:, pos:pos + width] = _digits(value, width)
+    out[nat] = 0
+    return out
+
+
+def format_timestamps(ns):
+    """int64 ns -> chaînes au format CSV_DATE_FORMAT (NaT -> '')."""
+    out = timestamp_field(ns)
+    return out.view(f'S{out.shape[1]}').ravel().astype(f'U{out.shape[1]}')
+
+
+def _int_field(v):
+    """Entiers -> champ, comme str() (valeurs hors +-1e18 : str())."""
+    big = np.abs(v.astype(np.float64)) >= 1e18
+    if not big.any():
+        return np.hstack([_sign(v < 0), _digits(np.abs(v.astype(np.int64)), 18, lead=False)])
+    k = np.flatnonzero(~big)
+    return _merge_rows(len(v), [(k, _int_field(v[k])),
+                                (np.flatnonzero(big), _encode(v[big].astype(str).tolist()))])
+
+
+def _two_prod(a, b):
+    """a * b = p + err exactement (découpage de Veltkamp / Dekker, sans FMA)."""
+    p = a * b
+    t = 134217729.0 * a  # 2**27 + 1
+    a1 = t - (t - a)
+    t = 134217729.0 * b
+    b1 = t - (t - b)
+    a2, b2 = a - a1, b - b1
+    return p, ((a1 * b1 - p) + a1 * b2 + a2 * b1) + a2 * b2
+
+
+def _nearest_decimal(a, digits):
+    """Décimal à `digits` chiffres significatifs le plus proche de a (a > 0) : m / 10**k.
+    -> (redonne_a, sûr, m, k) ; sûr = False pour les cas limites à l'arrondi près du test
+    (égalité à départager, distance ~ demi-écart, puissance de 2), laissés au chemin lent."""
+    e10 = np.floor(np.log10(a)).astype(np.int64)
+    k = digits - 1 - e10
+    p = 10.0 ** k.clip(0, 22)
+    hi, lo = _two_prod(a, p)  # a * 10**k = hi + lo exactement
+    r = np.rint(hi)
+    f = (hi - r) + lo
+    step = np.rint(f)
+    m = r.astype(np.int64) + step.astype(np.int64)
+    dist = np.abs(step - f)  # |décimal - a| en unités de 10**-k
+    half = np.spacing(a) * p / 2
+    mant = a.view(np.int64) & ((1 << 52) - 1)
+    sure = ((k >= 0) & (k <= 22) & (m >= _POW10[digits - 1]) & (m < _POW10[digits])
+            & (np.abs(np.abs(f) - 0.5) > 1e-6) & (np.abs(dist - half) > 1e-6 * half) & (mant != 0))
+    return dist < half, sure, m, k
+
+
+def _shortest_decimal(a):
+    """Pour |x| = a en notation fixe (1e-4 <= a < 1e16) : mantisse m et décimales d du repr le
+    plus court (m / 10**d == a, même décimal que numpy / Python). -> (ok, m, d)
+
+    Jusqu'à 15 chiffres significatifs, le décimal qui redonne a est unique : c'est le plus
+    proche à 15 chiffres, zéros de fin retirés. Sinon c'est le plus proche à 16 chiffres
+    s'il redonne a, et à défaut celui à 17 chiffres (valeurs interpolées)."""
+    m = np.zeros(len(a), dtype=np.int64)
+    dec = np.zeros(len(a), dtype=np.int64)
+    ok = a == 0
+    todo = np.flatnonzero(np.isfinite(a) & (a >= 1e-4) & (a < 1e16))
+    for digits in (15, 16, 17):
+        if not len(todo):
+            break
+        back, sure, mk, k = _nearest_decimal(a[todo], digits)
+        hit = back & sure
+        m[todo[hit]], dec[todo[hit]], ok[todo[hit]] = mk[hit], k[hit], True
+        todo = todo[~back & sure]  # décidé négatif : un chiffre de plus
+
+    # Zéros de fin (chemin 15 chiffres) : ils ne font pas partie du repr (retrait par 8, 4, 2, 1)
+    for t in (8, 4, 2, 1):
+        z = (m % _POW10[t] == 0) & (dec >= t)
+        m[z] //= _POW10[t]
+        dec[z] -= t
+    return ok, m, dec
+
+
+def _float_field(x):
+    """Flottants -> champ identique à numpy astype(str) (= pandas to_csv), NaN -> vide."""
+    nan = np.isnan(x)
+    if x.dtype != np.float64:
+        text = x.astype(str).astype(object)
+        text[nan] = ''
+        return _encode(text.tolist())
+    ok, m, dec = _shortest_decimal(np.abs(x))
+    k = np.flatnonzero(ok)
+    parts = [(k, _decimal_field(np.signbit(x[k]), m[k], dec[k]))] if len(k) else []
+    rest = np.flatnonzero(~ok & ~nan)
+    if len(rest):
+        parts.append((rest, _encode(x[rest].astype(str).tolist())))
+    return _merge_rows(len(x), parts)
+
+
+def _csv_quote(values):
+    """Guillemets à la manière de csv.QUOTE_MINIMAL sur un tableau de chaînes."""
+    values = values.astype(object)
+    for i, v in enumerate(values):
+        if any(c in v for c in CSV_SPECIAL):
+            values[i] = '"' + v.replace('"', '""') + '"'
+    return values
+
+
+def csv_field(values, date_format=None):
+    """Colonne (ou index) -> champ dont le texte est celui de DataFrame.to_csv (na_rep = '')."""
+    dtype = values.dtype
+    if isinstance(dtype, np.dtype):
+        values = np.asarray(values)
+        if dtype.kind == 'f':
+            return _float_field(values)
+        if dtype.kind in 'iu':
+            return _int_field(values)
+        if dtype.kind == 'b':
+            return _encode(np.where(values, 'True', 'False').tolist())
+        if dtype.kind == 'M' and date_format == CSV_DATE_FORMAT:
+            return timestamp_field(values.astype('datetime64[ns]').view(np.int64))
+        if dtype.kind == 'M':
+            index = pd.DatetimeIndex(values)
+            text = index.strftime(date_format) if date_format else index.astype(str)
+            return _encode(pd.Index(text).fillna('').tolist())
+    # Texte / objets / extensions : str(), NA vides, guillemets si nécessaire
+    text = np.asarray(values, dtype=object)
+    mask = pd.isna(text)
+    text = np.array([str(v) for v in text], dtype=object)
+    text[mask] = ''
+    return _encode(_csv_quote(text).tolist())
+
+
+class FastCsvWriter(_Writer):
+    """CSV historique sans DataFrame.to_csv : dates et nombres convertis en octets par
+    arithmétique entière vectorisée (csv_field), champs juxtaposés en une matrice d'octets
+    par bloc de CSV_ROWS lignes (remplissage NUL retiré en une passe), écrits dans un
+    fichier à grand buffer. Sortie octet pour octet identique à CsvWriter."""
+
+    ext = '.csv'
+
+    def __init__(self, path, date_format=CSV_DATE_FORMAT, buffer_size=CSV_BUFFER, block_rows=CSV_ROWS):
+        super().__init__(path)
+        self.date_format = date_format
+        self.buffer_size = buffer_size
+        self.block_rows = block_rows
+        self._f = None
+
+    def _write(self, df):
+        if self._f is None:
+            self._f = open(self.path, 'wb', buffering=self.buffer_size)
+            header = ['' if df.index.name is None else str(df.index.name)] + [str(c) for c in df.columns]
+            self._f.write((','.join(_csv_quote(np.array(header, dtype=object))) + CSV_LINE_END).encode('utf-8'))
+        for a in range(0, len(df), self.block_rows):
+            block = df.iloc[a:a + self.block_rows]
+            n = len(block)
+            parts = [csv_field(block.index, self.date_format)]
+            for j in range(block.shape[1]):
+                parts += [_const(',', n), csv_field(block.iloc[:, j], self.date_format)]
+            parts.append(_const(CSV_LINE_END, n))
+            buf = np.hstack(parts).ravel()
+            self._f.write(buf[buf != 0].tobytes())
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+class _ArrowWriter(_Writer):
+    """Base Arrow : schéma fixé par le premier bloc, blocs suivants convertis vers ce schéma
+    (une colonne vide dans un bloc serait sinon typée null)."""
+
+    def __init__(self, path):
+        if not HAS_ARROW:
+            raise ImportError("pyarrow est nécessaire pour les formats Parquet / Feather")
+        super().__init__(path)
+        self.schema = None
+        self._w = None
+
+    def _table(self, df):
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=True)
+        if self.schema is None:
+            self.schema = table.schema
+        return table
+
+    def close(self):
+        if self._w is not None:
+            self._w.close()
+            self._w = None
+
+
+class ParquetWriter(_ArrowWriter):
+    ext = '.parquet'
+
+    def __init__(self, path, compression=PARQUET_COMPRESSION, level=PARQUET_LEVEL):
+        super().__init__(path)
+        self.compression = compression
+        self.level = level
+
+    def _write(self, df):
+        table = self._table(df)
+        if self._w is None:
+            self._w = pq.ParquetWriter(self.path, self.schema, compression=self.compression,
+                                       compression_level=self.level)
+        self._w.write_table(table)
+
+
+class FeatherWriter(_ArrowWriter):
+    ext = '.feather'
+
+    def __init__(self, path, compression=FEATHER_COMPRESSION):
+        super().__init__(path)
+        self.compression = compression
+
+    def _write(self, df):
+        table = self._table(df)
+        if self._w is None:
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            self._w = pa.ipc.new_file(self.path, self.schema, options=options)
+        self._w.write_table(table)
+
+
+class Hdf5Writer(_Writer):
+    ext = '.h5'
+
+    def __init__(self, path, key=HDF_KEY, complib=HDF_COMPLIB, complevel=HDF_COMPLEVEL):
+        if not HAS_TABLES:
+            raise ImportError("PyTables (tables) est nécessaire pour le format HDF5")
+        super().__init__(path)
+        self.key = key
+        self._store = pd.HDFStore(path, mode='w', complib=complib, complevel=complevel)
+        self._min_itemsize = None
+
+    def _write(self, df):
+        if self._min_itemsize is None:
+            text = [c for c, dt in df.dtypes.items() if dt.kind == 'O' or isinstance(dt, pd.StringDtype)]
+            self._min_itemsize = {c: max(HDF_MIN_STR, 2 * int(df[c].str.len().fillna(0).max())) for c in text}
+        self._store.append(self.key, df, format='table', min_itemsize=self._min_itemsize or None)
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+
+WRITERS = {
+    'csv': FastCsvWriter,
+    'parquet': ParquetWriter,
+    'feather': FeatherWriter,
+    'hdf5': Hdf5Writer,
+}
+
+
+class MultiWriter(_Writer):
+    """Envoie chaque bloc à plusieurs writers (ex. Parquet + export CSV)."""
+
+    def __init__(self, writers):
+        super().__init__(None)
+        self.writers = writers
+        self.paths = [w.path for w in writers]
+
+    def _write(self, df):
+        for w in self.writers:
+            w.write(df)
+
+    def close(self):
+        for w in self.writers:
+            w.close()
+
+
+def open_writers(base_path, formats=('csv',)):
+    """Writer(s) pour base_path (sans extension) dans les formats demandés."""
+    unknown = [f for f in formats if f not in WRITERS]
+    if unknown or not formats:
+        raise ValueError(f"Format(s) de sortie inconnu(s) : {unknown or formats} (disponibles : {list(WRITERS)})")
+    writers = []
+    try:
+        for fmt in formats:
+            cls = WRITERS[fmt]
+            writers.append(cls(base_path + cls.ext))
+    except Exception:
+        for w in writers:
+            w.close()
+        raise
+    return writers[0] if len(writers) == 1 else MultiWriter(writers)
+
+
+def read_merged(path, columns=None):
+    """Relit un essai fusionné (format déduit de l'extension), index TS_UTC en datetime64[ns]."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        return pd.read_parquet(path, columns=columns)
+    if ext == '.feather':
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        df = table.to_pandas()
+    elif ext == '.h5':
+        df = pd.read_hdf(path, HDF_KEY)
+    else:
+        df = pd.read_csv(path, index_col=0)
+        df.index = pd.to_datetime(df.index, format=CSV_DATE_FORMAT)
+    return df if columns is None else df[list(columns)]
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lecture native des fichiers .mtb Xsens (sans MT Manager)
+
+Un .mtb est un flux de messages Xbus :
+    0xFA | BID (0xFF) | MID | LEN (0xFF -> LEN étendue sur 2 octets) | DATA | CHECKSUM
+Les mesures sont dans les messages MTData2 (MID 0x36), chaque paquet étant une
+suite d'items XDI (2 octets) | taille (1 octet) | données big-endian.
+
+Le décodage est vectorisé : recherche des préambules et validation des checksums
+sur tout le fichier en numpy, puis décodage colonne par colonne pour tous les
+paquets de même structure (layout) en une seule opération.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from xsens_io import UTC_COLS, clean_xsens_frame
+
+MID_MTDATA2 = 0x36
+
+# XDI (sans les bits de format) -> colonnes, comme dans l'export TXT de MT Manager
+XDI_INT = {
+    0x1020: ('>u2', ['PacketCounter']),
+    0x1060: ('>u4', ['SampleTimeFine']),
+    0x1070: ('>u4', ['SampleTimeCoarse']),
+    0xE020: ('>u4', ['StatusWord']),
+}
+XDI_FLOAT = {
+    0x0810: ['Temperature'],
+    0x2010: ['Quat_q0', 'Quat_q1', 'Quat_q2', 'Quat_q3'],
+    0x2030: ['Roll', 'Pitch', 'Yaw'],
+    0x3010: ['Pressure'],
+    0x4010: ['dv[1]', 'dv[2]', 'dv[3]'],
+    0x4020: ['Acc_X', 'Acc_Y', 'Acc_Z'],
+    0x4030: ['FreeAcc_{0}', 'FreeAcc_{1}', 'FreeAcc_{2}'],
+    0x5020: ['Altitude'],
+    0x5040: ['Latitude', 'Longitude'],
+    0x8020: ['Gyr_X', 'Gyr_Y', 'Gyr_Z'],
+    0xC020: ['Mag_X', 'Mag_Y', 'Mag_Z'],
+    0xD010: ['Vel_{0}', 'Vel_{1}', 'Vel_{2}'],
+}
+XDI_UTC = 0x1010
+# Bits 2-3 du XDI : repère des vecteurs (FreeAcc / Vel)
+COORDS = {0x0: 'ENU', 0x4: 'NED', 0x8: 'NWU'}
+# Bits 0-1 du XDI : précision -> taille d'une composante en octets
+PRECISION_SIZE = {0x0: 4, 0x1: 4, 0x2: 6, 0x3: 8}
+
+
+def read_xbus_messages(buf):
+    """Localise les messages Xbus valides dans un buffer uint8.
+    Retourne (mid, payload_start, payload_len) sous forme de tableaux."""
+    n = len(buf)
+    cand = np.flatnonzero((buf[:-1] == 0xFA) & (buf[1:] == 0xFF))
+    cand = cand[cand + 5 < n]
+    if len(cand) == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+
+    ln = buf[cand + 3].astype(np.int64)
+    ext = ln == 0xFF
+    ext_len = (buf[np.minimum(cand + 4, n - 1)].astype(np.int64) << 8) | buf[np.minimum(cand + 5, n - 1)]
+    ln = np.where(ext, ext_len, ln)
+    start = cand + 4 + 2 * ext
+    end = start + ln + 1  # checksum inclus
+    ok = end <= n
+    cand, ln, start, end = cand[ok], ln[ok], start[ok], end[ok]
+
+    # Checksum : somme BID..CHECKSUM == 0 (mod 256), via cumsum uint8 (wrap natif)
+    csum = np.zeros(n + 1, dtype=np.uint8)
+    np.cumsum(buf, dtype=np.uint8, out=csum[1:])
+    ok = (csum[end] - csum[cand + 1]) == 0
+    cand, ln, start, end = cand[ok], ln[ok], start[ok], end[ok]
+
+    # Chevauchements : un préambule à l'intérieur d'un message accepté est un faux positif.
+    # Un candidat non couvert est forcément accepté ; on retire ce qu'il couvre et on itère.
+    keep = np.ones(len(cand), dtype=bool)
+    while True:
+        idx = np.flatnonzero(keep)
+        c, e = cand[idx], end[idx]
+        prev_end = np.concatenate(([0], np.maximum.accumulate(e)[:-1]))
+        covered = c < prev_end
+        if not covered.any():
+            break
+        firm_end = np.where(covered, 0, e)
+        prev_firm = np.concatenate(([0], np.maximum.accumulate(firm_end)[:-1]))
+        keep[idx[c < prev_firm]] = False
+    return buf[cand[keep] + 2].astype(np.int64), start[keep], ln[keep]
+
+
+def _layout(row):
+    """Liste des items (xdi, offset, taille) d'un paquet MTData2."""
+    items, off = [], 0
+    while off + 3 <= len(row):
+        xdi = (int(row[off]) << 8) | int(row[off + 1])
+        size = int(row[off + 2])
+        if off + 3 + size > len(row):
+            break
+        items.append((xdi, off + 3, size))
+        off += 3 + size
+    return items
+
+
+def _decode_floats(block, precision, k):
+    """block : (n, k*taille) uint8 -> (n, k) float64."""
+    n = len(block)
+    if precision == 0x0:
+        return block.copy().view('>f4').reshape(n, k).astype(np.float64)
+    if precision == 0x3:
+        return block.copy().view('>f8').reshape(n, k).astype(np.float64)
+    if precision == 0x1:  # FP12.20
+        return block.copy().view('>i4').reshape(n, k) / 2.0 ** 20
+    # FP16.32 : 4 octets de partie fractionnaire puis 2 octets de partie entière
+    b = block.reshape(n, k, 6)
+    frac = b[:, :, :4].copy().view('>u4').reshape(n, k)
+    whole = b[:, :, 4:].copy().view('>i2').reshape(n, k)
+    return whole + frac / 2.0 ** 32
+
+
+def _decode_group(M, items, out, rows):
+    for xdi, off, size in items:
+        base = xdi & 0xFFF0
+        block = M[:, off:off + size]
+        if base == XDI_UTC and size == 12:
+            out.setdefault('UTC_Nano', []).append((rows, block[:, 0:4].copy().view('>u4').ravel()))
+            out.setdefault('UTC_Year', []).append((rows, block[:, 4:6].copy().view('>u2').ravel()))
+            for j, c in enumerate(['UTC_Month', 'UTC_Day', 'UTC_Hour', 'UTC_Minute', 'UTC_Second', 'UTC_Valid']):
+                out.setdefault(c, []).append((rows, block[:, 6 + j]))
+        elif xdi in XDI_INT and np.dtype(XDI_INT[xdi][0]).itemsize == size:
+            dt, (col,) = XDI_INT[xdi]
+            out.setdefault(col, []).append((rows, block.copy().view(dt).ravel()))
+        elif base in XDI_FLOAT:
+            names = XDI_FLOAT[base]
+            precision = xdi & 0x3
+            if size != PRECISION_SIZE[precision] * len(names):
+                continue
+            axes = COORDS.get(xdi & 0xC, 'ENU')
+            vals = _decode_floats(block, precision, len(names))
+            for j, name in enumerate(names):
+                out.setdefault(name.format(*axes), []).append((rows, vals[:, j]))
+
+
+def decode_mtb(path):
+    """Décode tous les paquets MTData2 d'un .mtb en colonnes brutes
+    (mêmes noms que l'export TXT, UTC_* inclus). Retourne un DataFrame."""
+    buf = np.fromfile(path, dtype=np.uint8)
+    mid, start, ln = read_xbus_messages(buf)
+    sel = mid == MID_MTDATA2
+    start, ln = start[sel], ln[sel]
+    n = len(start)
+    if n == 0:
+        return pd.DataFrame()
+
+    out = {}
+    pending = np.arange(n)
+    while len(pending):
+        # Regroupement par layout : même longueur et mêmes en-têtes d'items que le 1er paquet
+        L = ln[pending[0]]
+        same_len = pending[ln[pending] == L]
+        M = np.lib.stride_tricks.sliding_window_view(buf, L)[start[same_len]]
+        items = _layout(M[0])
+        hdr = np.array([p for _, off, _ in items for p in (off - 3, off - 2, off - 1)], dtype=np.int64)
+        match = (M[:, hdr] == M[0, hdr]).all(axis=1) if len(hdr) else np.ones(len(M), dtype=bool)
+        _decode_group(M[match], items, out, same_len[match])
+        pending = np.setdiff1d(pending, same_len[match], assume_unique=True)
+
+    # Remise dans l'ordre des paquets (NaN si l'item est absent d'un layout)
+    data = {}
+    for col, parts in out.items():
+        arr = np.full(n, np.nan)
+        for rows, vals in parts:
+            arr[rows] = vals
+        data[col] = arr
+    df = pd.DataFrame(data)
+
+    int_cols = [cols[0] for _, cols in XDI_INT.values()]
+    for c in int_cols + UTC_COLS + ['UTC_Valid']:
+        if c in df.columns and not df[c].isna().any():
+            df[c] = df[c].values.astype(np.int64)
+    return df
+
+
+def load_mtb(path):
+    """Charge un .mtb avec le même résultat que load_xsens sur l'export TXT :
+    colonnes capteurs + 'TS_UTC' (trié, sans doublons). DataFrame vide si illisible."""
+    try:
+        df = decode_mtb(path)
+    except (OSError, ValueError):
+        return pd.DataFrame()
+    if df.empty or not set(UTC_COLS).issubset(df.columns):
+        return pd.DataFrame()
+    df = clean_xsens_frame(df)
+    df.sort_values('TS_UTC', inplace=True, kind='stable')
+    df.drop_duplicates(subset=['TS_UTC'], inplace=True)
+    return df
+
+
+def mtb_to_txt(path, out_path=None):
+    """Conversion .mtb -> .txt au format d'export MT Manager (header '//' + données tabulées),
+    pour que load_xsens et les batchs existants lisent le résultat sans changement."""
+    out_path = out_path or os.path.splitext(str(path))[0] + '.txt'
+    df = decode_mtb(path)
+    if df.empty:
+        raise ValueError(f"Aucun paquet MTData2 dans {path}")
+    with open(out_path, 'w', newline='') as f:
+        f.write("// General information:\n")
+        f.write(f"//  Source: {os.path.basename(str(path))} (mtb_reader)\n")
+        f.write(f"//  Packets: {len(df)}\n")
+        df.to_csv(f, sep='\t', index=False, na_rep='', lineterminator='\n')
+    return out_path
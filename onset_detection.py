@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Détection du début de mouvement (vitesse GPS Xsens, fréquence des fronts roue TDMS)
+
+Le bruit à l'arrêt (niveau, écart robuste) est estimé sur les premières secondes,
+puis tous les seuils sont évalués en une passe :
+- hystérésis : le signal doit rester au-dessus du seuil haut pendant hold_s
+  (minimum glissant), le départ est le dernier passage sous le seuil bas avant
+  la détection ;
+- CUSUM (Page) : g[t] = S[t] - min(0, min S[:t]), S = cumsum(x - niveau - dérive),
+  le départ est le dernier instant où g était nul avant l'alarme.
+Le premier dépassement de chaque seuil est un searchsorted sur le maximum cumulé,
+au lieu d'un filtrage du DataFrame par seuil.
+
+Les départs Xsens / TDMS donnent un offset grossier (onset_offset), utilisable
+comme centre de recherche (lag0_s) de la corrélation (sync_estimation).
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.ndimage import minimum_filter1d
+
+from time_base import as_ns
+
+BASELINE_S = 5.0    # début d'enregistrement supposé à l'arrêt (estimation du bruit)
+HOLD_S = 0.5        # durée minimale au-dessus du seuil haut (s)
+LOW_SIGMA = 3.0     # seuil bas de l'hystérésis : niveau + LOW_SIGMA * sigma
+CUSUM_DRIFT_SIGMA = 2.0  # dérive du CUSUM (en sigma du bruit)
+CUSUM_H_SIGMA = 50.0     # seuil d'alarme par défaut (en sigma.s : h / fs)
+SIGMA_FLOOR = 1e-6  # écart robuste minimal (signal constant à l'arrêt)
+ONSET_COLS = ['Threshold', 'Detect_Index', 'Onset_Index', 'Onset_Time']
+
+
+def _rate(t_ns):
+    d = np.diff(t_ns)
+    return 1e9 / np.median(d) if len(d) and np.median(d) > 0 else 1.0
+
+
+def noise_estimate(x, n_baseline):
+    """(niveau, sigma) du bruit sur les n_baseline premiers échantillons : médiane et
+    écart robuste (1.4826 * MAD)."""
+    base = np.asarray(x[:max(int(n_baseline), 1)], dtype=np.float64)
+    base = base[np.isfinite(base)]
+    if len(base) == 0:
+        return 0.0, SIGMA_FLOOR
+    level = float(np.median(base))
+    return level, max(1.4826 * float(np.median(np.abs(base - level))), SIGMA_FLOOR)
+
+
+def first_above(x, thresholds, hold=1):
+    """Premier indice où x reste > seuil pendant hold échantillons, pour chaque seuil
+    (une passe : minimum glissant, maximum cumulé, searchsorted). -1 si jamais."""
+    x = np.nan_to_num(np.asarray(x, dtype=np.float64), nan=-np.inf)
+    thresholds = np.atleast_1d(np.asarray(thresholds, dtype=np.float64))
+    hold = max(int(hold), 1)
+    if len(x) < hold:
+        return np.full(len(thresholds), -1)
+    if hold > 1:
+        # m[i] = min(x[i:i + hold]) (fenêtre tronquée en fin de signal)
+        m = minimum_filter1d(x, hold, origin=-(hold // 2), mode='nearest')
+        m[len(x) - hold + 1:] = -np.inf
+    else:
+        m = x
+    idx = np.searchsorted(np.maximum.accumulate(m), thresholds, side='right')
+    return np.where(idx < len(x), idx, -1)
+
+
+def _back_to(mask, detect):
+    """Pour chaque indice de détection, indice qui suit le dernier True de mask avant lui
+    (la détection elle-même si mask y est vrai)."""
+    last = np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+    return np.where(detect >= 0, np.minimum(last[np.clip(detect, 0, None)] + 1, detect), -1)
+
+
+def _onset_frame(thresholds, detect, onset, t_ns):
+    times = pd.to_datetime(np.where(onset >= 0, t_ns[np.clip(onset, 0, len(t_ns) - 1)], np.iinfo(np.int64).min))
+    return pd.DataFrame({'Threshold': thresholds, 'Detect_Index': detect, 'Onset_Index': onset, 'Onset_Time': times})
+
+
+def hysteresis_onsets(t, x, thresholds, hold_s=HOLD_S, baseline_s=BASELINE_S, low_sigma=LOW_SIGMA):
+    """Départs par hystérésis pour chaque seuil haut de thresholds (unités de x).
+    Retourne (DataFrame ONSET_COLS, {'Level', 'Sigma', 'Low'})."""
+    t_ns = as_ns(t)
+    x = np.asarray(x, dtype=np.float64)
+    fs = _rate(t_ns)
+    level, sigma = noise_estimate(x, baseline_s * fs)
+    low = level + low_sigma * sigma
+    thresholds = np.atleast_1d(np.asarray(thresholds, dtype=np.float64))
+    detect = first_above(x, thresholds, int(round(hold_s * fs)))
+    onset = _back_to(x <= low, detect)
+    return _onset_frame(thresholds, detect, onset, t_ns), {'Level': level, 'Sigma': sigma, 'Low': low}
+
+
+def cusum_onsets(t, x, h_values=None, drift_sigma=CUSUM_DRIFT_SIGMA, baseline_s=BASELINE_S):
+    """Départs par CUSUM (hausse de x) pour chaque seuil d'alarme de h_values (unités de x
+    x échantillons ; None = CUSUM_H_SIGMA * sigma * fs). Retourne (DataFrame ONSET_COLS,
+    {'Level', 'Sigma', 'Drift'})."""
+    t_ns = as_ns(t)
+    x = np.asarray(x, dtype=np.float64)
+    fs = _rate(t_ns)
+    level, sigma = noise_estimate(x, baseline_s * fs)
+    drift = drift_sigma * sigma
+    if h_values is None:
+        h_values = [CUSUM_H_SIGMA * sigma * fs]
+    h_values = np.atleast_1d(np.asarray(h_values, dtype=np.float64))
+    S = np.cumsum(np.nan_to_num(x - level - drift))
+    g = S - np.minimum(np.minimum.accumulate(S), 0.0)
+    detect = first_above(g, h_values)
+    onset = _back_to(g <= 0, detect)
+    return _onset_frame(h_values, detect, onset, t_ns), {'Level': level, 'Sigma': sigma, 'Drift': drift}
+
+
+def movement_onset(t, x, method='cusum', **kw):
+    """Départ unique (premier seuil) : {'Onset_Time', 'Onset_Index', 'Level', 'Sigma', 'Method'}.
+    Onset_Time = None si aucun départ n'est détecté."""
+    if method == 'cusum':
+        df, noise = cusum_onsets(t, x, **kw)
+    elif method == 'hysteresis':
+        df, noise = hysteresis_onsets(t, x, **kw)
+    else:
+        raise ValueError(f"Méthode inconnue : {method}")
+    row = df.iloc[0]
+    found = row['Onset_Index'] >= 0
+    return {'Onset_Time': row['Onset_Time'] if found else None, 'Onset_Index': int(row['Onset_Index']),
+            'Level': noise['Level'], 'Sigma': noise['Sigma'], 'Method': method}
+
+
+def onset_offset(t_ref, x_ref, t_sig, x_sig, method='cusum', **kw):
+    """Offset grossier t_ref - t_sig (s) entre les départs des deux signaux, NaN si l'un
+    des départs manque."""
+    a = movement_onset(t_ref, x_ref, method, **kw)
+    b = movement_onset(t_sig, x_sig, method, **kw)
+    if a['Onset_Time'] is None or b['Onset_Time'] is None:
+        return np.nan
+    return (as_ns(a['Onset_Time']) - as_ns(b['Onset_Time'])) / 1e9
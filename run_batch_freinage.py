@@ -5,12 +5,21 @@ import sys
 try:
     import pandas as pd
     import numpy as np
-    from nptdms import TdmsFile
-    from scipy.interpolate import interp1d
     from datetime import datetime, timedelta
     import os
     import glob
     import re
+    from xsens_io import load_xsens
+    from tdms_io import load_tdms_smart, TdmsSources
+    from merge_stream import merge_to_writer
+    from merged_writers import open_writers
+    from trial_cache import TrialCache
+    from clock_model import load_clock_models
+    from sync_estimation import forced_sync_offset, trial_drift, MIN_CONFIDENCE
+    from wheel_speed import wheel_speed_frame
+    from can_dbc import load_dbc
+    from can_session import CanSession
+    from can_stream import can_slaves
 except Exception as e:
     with open("script_error.log", "w") as f:
         f.write(f"IMPORT ERROR: {e}")
@@ -25,126 +34,101 @@ DIR_OUT = os.path.join(BASE_DIR, 'Merged_CSV')
 TDMS_FREQ = 400.0
 MAGIC_OFFSET = 0.2679
 
+# Sync forcée (reset Edges_RoueAR / fallback) : offset estimé par essai en corrélant la vitesse
+# roue avec la vitesse Xsens, dans +/- FORCED_MAX_LAG_S autour de MAGIC_OFFSET.
+# MAGIC_OFFSET seul si l'estimation est désactivée ou pas assez fiable (MIN_CONFIDENCE).
+FORCED_SYNC_ESTIMATE = True
+FORCED_MAX_LAG_S = 5.0
+
+# Modèles d'horloge par essai (offset + dérive, éventuellement par morceaux), optionnel
+CLOCK_MODELS_CSV = os.path.join(BASE_DIR, 'clock_models.csv')
+# Sans modèle dans le CSV : offset + dérive estimés sur l'essai (corrélations par fenêtres
+# glissantes) et rapportés (offsets par fenêtre dans *_drift.csv) ; appliqués seulement si
+# APPLY_ESTIMATED_DRIFT et assez de fenêtres fiables (sinon synchro inchangée)
+ESTIMATE_DRIFT = True
+APPLY_ESTIMATED_DRIFT = False
+
+# Fusion par tranches de la timeline Xsens (mémoire bornée), None = un seul bloc
+MERGE_CHUNK_S = 60.0
+
+# Formats de sortie des essais fusionnés : 'parquet', 'feather', 'hdf5', 'csv' (plusieurs possibles)
+# 'csv' = export historique (dates texte), les formats binaires gardent TS_UTC en int64 ns
+OUTPUT_FORMATS = ['csv']
+
+# Colonnes TDMS_Wheel_Speed / TDMS_Wheel_Acc (dérivées de Edges_RoueAR) ajoutées à la fusion
+ADD_WHEEL_SPEED = False
+
+# Flux CAN (CANedge MF4) fusionné avec le TDMS : horloge propre (offset par corrélation de
+# la vitesse véhicule CAN_SPEED_SIGNAL avec la vitesse Xsens, + dérive si assez de fenêtres),
+# colonnes CAN_<signal>. Désactivé tant que la session et le DBC du véhicule ne sont pas donnés.
+CAN_SESSION_DIR = None   # ex. r'E2008_CAYD2025W45_05112025_Mouille\Freinage Mouille bus CAN'
+CAN_DBC = None           # définition DBC du bus véhicule
+CAN_SPEED_SIGNAL = None  # signal de vitesse véhicule (km/h ou m/s selon l'unité du DBC)
+CAN_SIGNALS = []         # signaux fusionnés en plus de la vitesse
+CAN_BUS = None           # canal CAN (None = tous)
+CAN_MAX_LAG_S = 5.0
+
+# Cache des essais parsés (invalidé si le fichier source ou les paramètres changent)
+USE_CACHE = True
+CACHE_DIR = os.path.join(BASE_DIR, '.trial_cache')
+CACHE_MAX_BYTES = 2 * 1024**3
+
 try:
     os.makedirs(DIR_OUT, exist_ok=True)
+    TRIAL_CACHE = TrialCache(CACHE_DIR, CACHE_MAX_BYTES) if USE_CACHE else None
+    TDMS_FILES = TdmsSources()
+    CLOCK_MODELS = load_clock_models(CLOCK_MODELS_CSV)
+    CAN_SESSION = None
+    if CAN_SESSION_DIR and CAN_DBC and CAN_SPEED_SIGNAL:
+        CAN_SESSION = CanSession(CAN_SESSION_DIR, load_dbc(CAN_DBC))
 except Exception as e:
     with open("script_error.log", "w") as f:
         f.write(f"CONFIG ERROR (makedirs): {e}")
     sys.exit(1)
 
 # 3. FUNCTIONS
-def load_xsens(path):
-    h_idx = None
-    try:
-        with open(path, 'r', errors='ignore') as f:
-            for i, l in enumerate(f):
-                if l.strip().startswith('PacketCounter'): h_idx=i; break
-        if h_idx is None:
-             with open(path, 'r', errors='ignore') as f:
-                for i, l in enumerate(f): 
-                    if 'UTC_Year' in l: h_idx=i; break
-        if h_idx is None: return pd.DataFrame()
-        
-        try: df = pd.read_csv(path, sep='\t', header=h_idx)
-        except: df = pd.read_csv(path, sep=r'\s+', header=h_idx)
-        
-        df.columns = df.columns.str.strip()
-        # Cleaning Ghost Packets
-        check_cols = [c for c in ['Acc_X', 'FreeAcc_E', 'Gyr_X'] if c in df.columns]
-        if check_cols:
-            df.dropna(subset=check_cols, how='all', inplace=True)
-            
-        req = ['UTC_Year', 'UTC_Month', 'UTC_Day', 'UTC_Hour', 'UTC_Minute', 'UTC_Second', 'UTC_Nano']
-        if set(req).issubset(df.columns):
-            df.dropna(subset=req, inplace=True)
-            ts = pd.to_datetime(df[req[:-1]].astype(int).rename(columns={'UTC_Year':'year','UTC_Month':'month','UTC_Day':'day','UTC_Hour':'hour','UTC_Minute':'minute','UTC_Second':'second'}))
-            df['TS_UTC'] = ts + pd.to_timedelta(df['UTC_Nano'], unit='ns')
-            df.drop(columns=req, inplace=True)
-            df.sort_values('TS_UTC', inplace=True)
-            df.drop_duplicates(subset=['TS_UTC'], inplace=True)
-            return df
-    except: return pd.DataFrame()
+def cached(path, loader, *args, loader_kw=None):
+    if TRIAL_CACHE is None: return loader(path, *args, **(loader_kw or {}))
+    return TRIAL_CACHE.load(path, loader, *args, loader_kw=loader_kw)
 
-def load_tdms_smart(path, group_name, xsens_start_ref):
-    stats = {
-        "TDMS_Found": False, "Reset_Detected": False, "Reset_Index": 0,
-        "Sync_Method": "Unknown", "TDMS_Start_Time": None, "TDMS_Points_Valid": 0
-    }
-    
-    try:
-        tdms = TdmsFile.read(path)
-        stats["TDMS_Found"] = True
-        
-        target_group = None
-        for g in tdms.groups():
-            if g.name == group_name: target_group = g; break
-        if not target_group: return pd.DataFrame(), stats
-        
-        # 1. Données Brutes
-        data = {}
-        for c in target_group.channels(): data[c.name] = c[:]
-        if not data: return pd.DataFrame(), stats
-        l_min = min(len(v) for v in data.values())
-        data = {k: v[:l_min] for k,v in data.items()}
-        df = pd.DataFrame(data)
-        
-        base_start_time = None
-        
-        # 2. Detection Reset
-        start_index = 0
-        if 'Edges_RoueAR' in df.columns:
-            diffs = np.diff(df['Edges_RoueAR'].values)
-            resets = np.where(diffs < -100)[0]
-            if len(resets) > 0:
-                start_index = resets[0] + 1
-                stats["Reset_Detected"] = True
-                stats["Reset_Index"] = int(start_index)
+def estimate_forced_sync(df_xsens, df_tdms, entry):
+    # TDMS calé sur Xsens + MAGIC_OFFSET : correction estimée sur les signaux de l'essai
+    entry["Forced_Offset_s"] = MAGIC_OFFSET
+    if not FORCED_SYNC_ESTIMATE: return
+    est = forced_sync_offset(df_xsens, df_tdms, max_lag_s=FORCED_MAX_LAG_S)
+    if est is None:
+        entry["Sync_Strategy"] += " + Magic Offset (no signal)"
+        return
+    entry["Sync_Signal"] = est["Signal"]
+    entry["Sync_Confidence"] = est["Confidence"]
+    if not np.isfinite(est["Offset_s"]) or est["Confidence"] < MIN_CONFIDENCE:
+        entry["Sync_Strategy"] += " + Magic Offset (low confidence)"
+        return
+    df_tdms.index = df_tdms.index + pd.Timedelta(int(round(est["Offset_s"] * 1e9)), unit='ns')
+    entry["Forced_Offset_s"] = MAGIC_OFFSET + est["Offset_s"]
+    entry["TDMS_Start"] = df_tdms.index.min()
+    entry["Sync_Strategy"] += " + Estimated Offset"
 
-        # 3. Stratégie Timestamp
-        if stats["Reset_Detected"]:
-            # FORCED SYNC
-            base_start_time = xsens_start_ref + timedelta(seconds=MAGIC_OFFSET)
-            stats["Sync_Method"] = "Forced (Xsens+Offset)"
-        else:
-            # METADATA SYNC
-            try:
-                if 'Edges_RoueAR' in target_group:
-                    chan = target_group['Edges_RoueAR']
-                    if 'wf_start_time' in chan.properties:
-                         base_start_time = pd.to_datetime(chan.properties['wf_start_time']).tz_localize(None)
-                if not base_start_time and 'wf_start_time' in tdms.properties:
-                     base_start_time = pd.to_datetime(tdms.properties['wf_start_time']).tz_localize(None)
-            except: pass
-            
-            stats["Sync_Method"] = "Metadata"
-            
-        stats["TDMS_Start_Time"] = base_start_time
-        
-        # 4. Slice if reset
-        if start_index > 0:
-            df = df.iloc[start_index:].copy().reset_index(drop=True)
-            
-        stats["TDMS_Points_Valid"] = len(df)
-            
-        # 5. Index Create
-        if base_start_time:
-            time_index = pd.date_range(start=base_start_time, periods=len(df), freq=f'{1000/TDMS_FREQ}ms')
-            df['TDMS_Timestamp'] = time_index
-            df.set_index('TDMS_Timestamp', inplace=True)
-            df.columns = [f"TDMS_{c}" for c in df.columns]
-            return df, stats
-        else:
-            stats["Sync_Method"] = "FAILED (No Time)"
-            return pd.DataFrame(), stats
-
-    except Exception as e: 
-        stats["Error"] = str(e)
-        return pd.DataFrame(), stats
+def load_can(df_xsens, entry):
+    # Messages CAN recalés sur Xsens (liste vide si CAN désactivé / absent / non corrélé)
+    if CAN_SESSION is None: return []
+    streams, report = can_slaves(CAN_SESSION, df_xsens, CAN_SPEED_SIGNAL, CAN_SIGNALS, bus=CAN_BUS,
+                                 max_lag_s=CAN_MAX_LAG_S, drift=ESTIMATE_DRIFT)
+    entry["CAN_Offset_s"] = report["Offset_s"]
+    entry["CAN_Confidence"] = report["Confidence"]
+    entry["CAN_Drift_ppm"] = report["Drift_ppm"]
+    entry["CAN_Messages"] = report["Messages"]
+    if streams:
+        entry["Sync_Strategy"] += " + CAN"
+    return streams
 
 # 4. MAIN EXECUTION
 try:
     print(f"Searching in: {os.path.abspath(DIR_TXT)}")
     txt_files = glob.glob(os.path.join(DIR_TXT, "*.txt"))
+    # Regroupement par TDMS source (..._80_P1 / ..._80_P2 consécutifs) : chaque TDMS
+    # est ouvert une fois, puis libéré dès qu'on passe à la vitesse suivante
+    txt_files.sort(key=lambda p: (re.sub(r'_[^_]+\.txt$', '', os.path.basename(p)), p))
     print(f"Fichiers trouvés : {len(txt_files)}")
 
     LOG_DATA = []
@@ -161,7 +145,18 @@ try:
             "TDMS_Start": None,
             "Xsens_Points": 0,
             "TDMS_Points": 0,
-            "Reset_Index": 0
+            "Reset_Index": 0,
+            "Forced_Offset_s": None,
+            "Sync_Signal": None,
+            "Sync_Confidence": None,
+            "Clock_Drift_ppm": None,
+            "Drift_Estimated_ppm": None,
+            "Drift_Windows": None,
+            "Drift_Residual_ms": None,
+            "CAN_Offset_s": None,
+            "CAN_Confidence": None,
+            "CAN_Drift_ppm": None,
+            "CAN_Messages": 0
         }
         
         # REGEX Freinage : Moto_Freinage_mouille_80_P1.txt
@@ -181,6 +176,9 @@ try:
         print(f"Traitement : {basename} <-> {tdms_name} [{group}] ...", end='')
         sys.stdout.flush()
         
+        if f_tdms not in TDMS_FILES:
+            TDMS_FILES.release()
+
         if not os.path.exists(f_tdms):
             print(f" [ERR TDMS MISSING]")
             entry["Status"] = "Missing TDMS"
@@ -188,7 +186,7 @@ try:
             continue
         
         # 1. Load Xsens
-        df_xsens = load_xsens(f_txt)
+        df_xsens = cached(f_txt, load_xsens)
         if df_xsens.empty:
             print(" [ERR Xsens]")
             entry["Status"] = "Error Xsens Load"
@@ -200,7 +198,9 @@ try:
             
         # 2. Load TDMS (Smart)
         xsens_start = df_xsens['TS_UTC'].min()
-        df_tdms, stats = load_tdms_smart(f_tdms, group, xsens_start)
+        # P1 et P2 lisent le même TDMS : fichier ouvert une fois pour le run (TDMS_FILES, hors clé)
+        df_tdms, stats = cached(f_tdms, load_tdms_smart, group, xsens_start, MAGIC_OFFSET, TDMS_FREQ,
+                                loader_kw={'sources': TDMS_FILES})
         
         entry["TDMS_Start"] = stats.get("TDMS_Start_Time")
         entry["TDMS_Points"] = stats.get("TDMS_Points_Valid")
@@ -213,7 +213,10 @@ try:
             entry["Status"] = "Error TDMS Load"
             LOG_DATA.append(entry)
             continue
-            
+
+        if stats.get("Sync_Method", "").startswith("Forced"):
+            estimate_forced_sync(df_xsens, df_tdms, entry)
+
         # 3. Merge
         t_start = max(df_xsens['TS_UTC'].min(), df_tdms.index.min())
         t_end = min(df_xsens['TS_UTC'].max(), df_tdms.index.max())
@@ -251,6 +254,7 @@ try:
             entry["Sync_Strategy"] += " + FALLBACK (Force)"
             stats["TDMS_Start_Time"] = forced_start
             entry["TDMS_Start"] = forced_start
+            estimate_forced_sync(df_xsens, df_tdms, entry)
             
             # Re-calc Interval
             t_start = max(df_xsens['TS_UTC'].min(), df_tdms.index.min())
@@ -262,21 +266,43 @@ try:
                 LOG_DATA.append(entry)
                 continue
 
-        df_merged = df_xsens[(df_xsens['TS_UTC'] >= t_start) & (df_xsens['TS_UTC'] <= t_end)].copy()
-        df_merged.set_index('TS_UTC', inplace=True)
-        
+        out_name = basename.replace('.txt', '_merged')
+        out_path = os.path.join(DIR_OUT, out_name)
+
+        # Modèle d'horloge de l'essai : time warp de l'axe TDMS (dérive comprise) avant interpolation
+        clock = CLOCK_MODELS.get(basename)
+        clock_label = " + Clock Model"
+        if clock is None and ESTIMATE_DRIFT:
+            clock, windows = trial_drift(df_xsens, df_tdms)
+            if len(windows):
+                inl = windows[windows['Inlier']]
+                entry["Drift_Windows"] = f"{len(inl)}/{len(windows)}"
+                if len(inl):
+                    entry["Drift_Residual_ms"] = float(np.sqrt(np.mean(inl['Residual_s'] ** 2)) * 1e3)
+                windows.to_csv(out_path.replace('_merged', '_drift') + '.csv', index=False)
+            if clock is not None:
+                entry["Drift_Estimated_ppm"] = clock.drift_ppm
+            if not APPLY_ESTIMATED_DRIFT:
+                clock = None
+            clock_label = " + Clock Model (estimated)"
+        if clock is not None:
+            df_tdms.index = clock.warp_index(df_tdms.index)
+            entry["Sync_Strategy"] += clock_label
+            entry["Clock_Drift_ppm"] = clock.drift_ppm
+            t_start = max(df_xsens['TS_UTC'].min(), df_tdms.index.min())
+            t_end = min(df_xsens['TS_UTC'].max(), df_tdms.index.max())
+
+        if ADD_WHEEL_SPEED:
+            df_tdms = df_tdms.join(wheel_speed_frame(df_tdms))
+
         try:
-            t_slave = (df_tdms.index - pd.Timestamp("1970-01-01")) // pd.Timedelta('1ns') / 1e9
-            t_master = (df_merged.index - pd.Timestamp("1970-01-01")) // pd.Timedelta('1ns') / 1e9
-            
-            for col in df_tdms.columns:
-                f = interp1d(t_slave, df_tdms[col].values, kind='linear', fill_value="extrapolate")
-                df_merged[col] = f(t_master)
-                
-            out_name = basename.replace('.txt', '_merged.csv')
-            out_path = os.path.join(DIR_OUT, out_name)
-            df_merged.to_csv(out_path, date_format='%d/%m/%Y %H:%M:%S.%f')
-            
+            # Esclaves : TDMS puis un DataFrame par message CAN, chacun sur sa base de temps recalée
+            slaves = [df_tdms] + load_can(df_xsens, entry)
+            # Noyau par canal (RESAMPLE_POLICY) : compteurs tenus, analogiques interpolés en lot ;
+            # chaque tranche fusionnée est écrite (dans chaque format) avant de passer à la suivante
+            with open_writers(out_path, OUTPUT_FORMATS) as writer:
+                merge_to_writer(df_xsens, slaves, t_start, t_end, writer, chunk_s=MERGE_CHUNK_S)
+
             print(f" [OK] -> {entry['Sync_Strategy']}")
             entry["Status"] = "Success"
             
@@ -286,11 +312,16 @@ try:
 
         LOG_DATA.append(entry)
 
+    TDMS_FILES.release()
+
     # SAVE LOG REPORT
     df_log = pd.DataFrame(LOG_DATA)
     log_path = os.path.join(DIR_OUT, 'Batch_Report_Freinage.csv')
     df_log.to_csv(log_path, index=False)
     print(f"\nRapport généré : {log_path}")
+    if TRIAL_CACHE is not None:
+        TRIAL_CACHE.flush()
+        print(f"Cache : {TRIAL_CACHE.hits} hit(s), {TRIAL_CACHE.misses} miss(es), {TRIAL_CACHE.size_bytes()/1e6:.1f} Mo")
     if not df_log.empty:
         print(df_log[['File_Name', 'Status', 'Reset_Detected', 'Sync_Strategy']].to_string())
     else:
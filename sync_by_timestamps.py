@@ -11,6 +11,10 @@ Synchronisation basée sur les timestamps:
 import pandas as pd
 import numpy as np
 from nptdms import TdmsFile
+from xsens_io import utc_timestamps
+from tdms_io import channel_time_base
+from merge_kernels import resample_frame
+from wheel_speed import edge_increments, wheel_speed
 import matplotlib.pyplot as plt
 
 print("=" * 80)
@@ -26,22 +30,18 @@ print("\n📊 Chargement des données...")
 tdms_file = TdmsFile.read("Moto_Chicane_100.tdms")
 group = [g for g in tdms_file.groups() if 'P1' in g.name][0] if any('P1' in g.name for g in tdms_file.groups()) else tdms_file.groups()[0]
 channel = group['Edges_RoueAR']
-start_time = pd.to_datetime(channel.properties.get('wf_start_time')).tz_localize(None)
-increment = channel.properties.get('wf_increment')
-tdms_time = start_time + pd.to_timedelta(np.arange(len(channel[:])) * increment, unit='s')
-df_tdms = pd.DataFrame({'timestamp': tdms_time, 'Edges': channel[:]})
-df_tdms['Edge_Diff'] = df_tdms['Edges'].diff().fillna(0)
+# Base de temps calculée : les timestamps ne sont créés que pour la partie gardée
+tdms_base = channel_time_base(channel)
+edges = channel[:]
+edge_diff = edge_increments(edges)  # fronts par échantillon, sans pic aux resets du compteur
+wheel_mps, _ = wheel_speed(edges, tdms_base.freq)
 
 # Xsens
 df_txt = pd.read_csv("Moto_Chicane_100_P1.txt", sep='\t', skiprows=12)
 df_txt.columns = df_txt.columns.str.strip()
 req_cols = ['UTC_Year', 'UTC_Month', 'UTC_Day', 'UTC_Hour', 'UTC_Minute', 'UTC_Second', 'UTC_Nano']
 df_txt = df_txt.dropna(subset=req_cols)
-time_series = pd.to_datetime(df_txt[req_cols[:-1]].astype(int).rename(columns={
-    'UTC_Year': 'year', 'UTC_Month': 'month', 'UTC_Day': 'day',
-    'UTC_Hour': 'hour', 'UTC_Minute': 'minute', 'UTC_Second': 'second'
-}))
-df_txt['timestamp'] = time_series + pd.to_timedelta(df_txt['UTC_Nano'], unit='ns')
+df_txt['timestamp'] = utc_timestamps(df_txt)
 
 # Calculer GPS Speed
 if 'Vel_N' in df_txt.columns and 'Vel_E' in df_txt.columns:
@@ -49,10 +49,9 @@ if 'Vel_N' in df_txt.columns and 'Vel_E' in df_txt.columns:
     df_txt['Vel_E'] = pd.to_numeric(df_txt['Vel_E'], errors='coerce').fillna(0)
     df_txt['GPS_Speed'] = np.sqrt(df_txt['Vel_N']**2 + df_txt['Vel_E']**2)
 
-df_tdms = df_tdms.sort_values('timestamp').reset_index(drop=True)
 df_txt = df_txt.sort_values('timestamp').reset_index(drop=True)
 
-print(f"  TDMS: {len(df_tdms)} points, {df_tdms['timestamp'].min()} → {df_tdms['timestamp'].max()}")
+print(f"  TDMS: {len(tdms_base)} points, {tdms_base.start} → {tdms_base.end}")
 print(f"  Xsens: {len(df_txt)} points, {df_txt['timestamp'].min()} → {df_txt['timestamp'].max()}")
 
 # ============================================================================
@@ -67,7 +66,7 @@ sync_start = df_txt['timestamp'].min()
 print(f"\n📍 Point de départ (Xsens start): {sync_start}")
 
 # Point de fin = end time TDMS
-sync_end = df_tdms['timestamp'].max()
+sync_end = tdms_base.end
 print(f"📍 Point de fin (TDMS end): {sync_end}")
 
 # Durée de synchronisation
@@ -82,12 +81,16 @@ print("ÉTAPE 2: Trimmer TDMS")
 print("=" * 80)
 
 # Trouver l'index TDMS correspondant au start Xsens
-tdms_mask = df_tdms['timestamp'] >= sync_start
-df_tdms_trimmed = df_tdms[tdms_mask].copy()
-df_tdms_trimmed = df_tdms_trimmed.reset_index(drop=True)
+i_start = tdms_base.searchsorted(sync_start)
+df_tdms_trimmed = pd.DataFrame({
+    'timestamp': tdms_base[i_start:].to_index(),
+    'Edges': edges[i_start:],
+    'Edge_Diff': edge_diff[i_start:],
+    'Wheel_Speed': wheel_mps[i_start:],
+})
 
-samples_removed = len(df_tdms) - len(df_tdms_trimmed)
-time_removed = (sync_start - df_tdms['timestamp'].min()).total_seconds()
+samples_removed = i_start
+time_removed = (sync_start - tdms_base.start).total_seconds()
 
 print(f"\n✂️  Données TDMS avant {sync_start} supprimées:")
 print(f"  Échantillons supprimés: {samples_removed}")
@@ -133,17 +136,12 @@ df_txt_resampled = pd.DataFrame({'timestamp': time_index})
 
 # Interpoler GPS_Speed
 if 'GPS_Speed' in df_txt_trimmed.columns:
-    # Créer une fonction d'interpolation
-    from scipy.interpolate import interp1d
-    
     # Convertir timestamps en secondes depuis le début
     txt_time_sec = (df_txt_trimmed['timestamp'] - sync_start).dt.total_seconds()
     new_time_sec = (time_index - sync_start).total_seconds()
     
-    # Interpoler
-    f_speed = interp1d(txt_time_sec, df_txt_trimmed['GPS_Speed'], 
-                       kind='linear', fill_value='extrapolate')
-    df_txt_resampled['GPS_Speed'] = f_speed(new_time_sec)
+    # Interpoler (filtrage anti-repliement si la cible est plus lente que Xsens)
+    df_txt_resampled['GPS_Speed'] = resample_frame(df_txt_trimmed[['GPS_Speed']], txt_time_sec, new_time_sec)['GPS_Speed'].values
 
 print(f"   Xsens après resample: {len(df_txt_resampled)}")
 print(f"   ✅ Même nombre d'échantillons que TDMS!")
@@ -190,7 +188,10 @@ end_idx = min(len(df_tdms_trimmed), center_idx + window_samples)
 ax1.plot(df_txt_resampled['timestamp'].iloc[start_idx:end_idx], 
          df_txt_resampled['GPS_Speed'].iloc[start_idx:end_idx], 
          'b-', linewidth=1, label='GPS Speed (resampled)')
-ax1.set_ylabel('GPS Speed (m/s)')
+ax1.plot(df_tdms_trimmed['timestamp'].iloc[start_idx:end_idx],
+         df_tdms_trimmed['Wheel_Speed'].iloc[start_idx:end_idx],
+         'g-', linewidth=1, alpha=0.7, label='Wheel Speed (TDMS)')
+ax1.set_ylabel('Speed (m/s)')
 ax1.set_title('Données synchronisées - GPS Speed')
 ax1.legend()
 ax1.grid(True, alpha=0.3)
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Estimation automatique du décalage Xsens / TDMS par corrélation croisée
+
+Le décalage est cherché dans une fenêtre bornée [lag0 - max_lag, lag0 + max_lag] :
+1. Recherche grossière : signaux décimés à COARSE_FS (filtre anti-repliement),
+   corrélation normalisée par FFT (toutes les lags en O(n log n)).
+2. Affinage : signaux à FINE_FS (400 Hz), corrélation calculée seulement autour du
+   pic grossier, puis interpolation parabolique du pic (précision sous-échantillon).
+
+Convention : offset = t_ref - t_sig (comme ClockModel), c.-à-d. t_sig + offset est
+aligné sur t_ref. La confiance combine la hauteur du pic (corrélation de Pearson
+sur le recouvrement) et son écart au plus haut pic hors du lobe principal.
+
+forced_sync_offset : offset d'un essai en sync forcée (reset de Edges_RoueAR,
+TDMS calé sur le départ Xsens + MAGIC_OFFSET), estimé sur les signaux de l'essai :
+vitesse roue (wheel_speed) contre vitesse horizontale Xsens (Vel_N, Vel_E), ou
+accélération roue contre Acc_X si l'export n'a pas de vitesse.
+
+estimate_drift : offsets locaux sur des fenêtres glissantes (toutes les fenêtres
+corrélées en un lot FFT), puis offset + dérive (ppm) ajustés par moindres carrés
+itératifs avec rejet des fenêtres aberrantes (MAD) -> ClockModel pour le merge.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import fft, signal
+
+from clock_model import ClockModel
+from time_base import as_ns
+from wheel_speed import wheel_speed
+
+MAX_LAG_S = 5.0       # demi-largeur de la fenêtre de recherche (s)
+COARSE_FS = 25.0      # fréquence de la recherche grossière (Hz)
+FINE_FS = 400.0       # fréquence de l'affinage (Hz)
+MIN_OVERLAP = 0.5     # recouvrement minimal (fraction du signal le plus court) pour un lag valide
+MIN_CONFIDENCE = 0.3  # confiance minimale pour appliquer un offset estimé
+EDGES_CHANNEL = 'TDMS_Edges_RoueAR'
+
+# Dérive (fenêtres glissantes)
+DRIFT_WINDOW_S = 20.0    # durée d'une fenêtre de corrélation locale (s)
+DRIFT_STEP_S = 10.0      # pas entre fenêtres (s)
+DRIFT_MAX_LAG_S = 1.0    # recherche locale autour de l'offset global (s)
+DRIFT_FS = 200.0         # fréquence de la grille commune (Hz)
+DRIFT_BATCH = 256        # fenêtres par lot FFT (mémoire bornée)
+DRIFT_MIN_CORR = 0.5     # corrélation minimale d'une fenêtre utilisable
+DRIFT_MIN_WINDOWS = 5    # fenêtres retenues minimales pour un modèle
+OUTLIER_MAD = 3.0        # rejet des fenêtres à plus de OUTLIER_MAD écarts robustes
+RESIDUAL_FLOOR_S = 1e-3  # écart robuste minimal (s), évite de rejeter sur un bruit sub-ms
+WINDOW_COLS = ['T_s', 'Offset_s', 'Corr', 'Residual_s', 'Inlier']
+
+
+def _uniform(t_s, x, t0, n, fs):
+    """x (instants t_s, secondes) interpolé sur la grille t0 + i / fs (i < n).
+    Centré sur son support, 0 hors support. Retourne (valeurs, masque du support)."""
+    order = np.argsort(t_s, kind='stable')
+    t_s, x = t_s[order], np.asarray(x, dtype=np.float64)[order]
+    ok = np.isfinite(t_s) & np.isfinite(x)
+    t_s, x = t_s[ok], x[ok]
+    grid = t0 + np.arange(n) / fs
+    mask = (grid >= t_s[0]) & (grid <= t_s[-1])
+    y = np.zeros(n)
+    y[mask] = np.interp(grid[mask], t_s, x)
+    if mask.any():
+        y[mask] -= y[mask].mean()
+    return y, mask.astype(np.float64)
+
+
+def _decimate(y, mask, q):
+    """Décimation par q (resample_poly) du signal et de son masque (recouvrement)."""
+    if q <= 1:
+        return y, mask
+    yd = signal.resample_poly(y, 1, q)
+    md = mask[::q][:len(yd)]
+    return yd * (md > 0.5), (md > 0.5).astype(np.float64)
+
+
+def _pearson(n, sa, sb, saa, sbb, sab):
+    """Corrélation de Pearson depuis les sommes sur le recouvrement (0 si variance nulle)."""
+    n = np.maximum(n, 1.0)
+    cov = sab - sa * sb / n
+    var = np.clip(saa - sa * sa / n, 0, None) * np.clip(sbb - sb * sb / n, 0, None)
+    return np.where(var > 0, cov / np.sqrt(np.where(var > 0, var, 1.0)), 0.0)
+
+
+def normalized_xcorr(a, ma, b, mb, max_lag):
+    """Corrélation de Pearson de a[i] et b[i - L] sur leur recouvrement (masques ma, mb),
+    pour |L| <= max_lag : six corrélations FFT (sommes, carrés, produits croisés).
+    Retourne (lags, c, recouvrement en échantillons)."""
+    corr = lambda u, v: signal.correlate(u, v, mode='full', method='fft')[keep]
+    lags = signal.correlation_lags(len(a), len(b), mode='full')
+    keep = np.abs(lags) <= max_lag
+    overlap = np.rint(corr(ma, mb))
+    c = _pearson(overlap, corr(a, mb), corr(ma, b), corr(a * a, mb), corr(ma, b * b), corr(a, b))
+    return lags[keep], c, overlap
+
+
+def _lag_xcorr(a, ma, b, mb, lags):
+    """Même corrélation que normalized_xcorr, calculée directement pour quelques lags."""
+    n = len(a)
+    c = np.zeros(len(lags))
+    for k, L in enumerate(lags):
+        i0, i1 = max(0, L), min(n, n + L)
+        if i1 <= i0:
+            continue
+        sa, sma = a[i0:i1], ma[i0:i1]
+        sb, smb = b[i0 - L:i1 - L], mb[i0 - L:i1 - L]
+        c[k] = _pearson(np.dot(sma, smb), np.dot(sa, smb), np.dot(sma, sb), np.dot(sa * sa, smb),
+                        np.dot(sma, sb * sb), np.dot(sa, sb))
+    return c
+
+
+def main_lobe(c, i):
+    """Bornes [lo, hi] du lobe de c autour du pic i (décroissance monotone de part et d'autre)."""
+    lo = i
+    while lo > 0 and c[lo - 1] <= c[lo]:
+        lo -= 1
+    hi = i
+    while hi < len(c) - 1 and c[hi + 1] <= c[hi]:
+        hi += 1
+    return lo, hi
+
+
+def parabolic_peak(y, i):
+    """Position sous-échantillon (décalage dans [-0.5, 0.5]) et hauteur du pic en y[i]."""
+    if i <= 0 or i >= len(y) - 1:
+        return 0.0, y[i]
+    y0, y1, y2 = y[i - 1], y[i], y[i + 1]
+    d = y0 - 2 * y1 + y2
+    if d >= 0:
+        return 0.0, y1
+    delta = float(np.clip(0.5 * (y0 - y2) / d, -0.5, 0.5))
+    return delta, y1 - 0.25 * (y0 - y2) * delta
+
+
+def estimate_offset(t_ref, x_ref, t_sig, x_sig, lag0_s=0.0, max_lag_s=MAX_LAG_S, coarse_fs=COARSE_FS,
+                    fine_fs=FINE_FS, min_overlap=MIN_OVERLAP):
+    """Décalage offset (s) tel que x_sig(t - offset) ~ x_ref(t), cherché dans
+    [lag0_s - max_lag_s, lag0_s + max_lag_s].
+
+    t_ref, t_sig : timestamps (datetime64, Series / Index de dates ou ns epoch).
+    Retourne un dict : Offset_s, Coarse_Offset_s, Peak_Corr (Pearson au pic),
+    Confidence (0..1 : Peak_Corr pondéré par l'écart au second pic), Overlap_s.
+    Offset_s = NaN (Confidence 0) si le recouvrement est insuffisant ou si le pic est
+    au bord de la fenêtre de recherche (vrai décalage probablement au-delà)."""
+    ref_ns, sig_ns = as_ns(t_ref), as_ns(t_sig)
+    origin = int(ref_ns.min())
+    tr = (ref_ns - origin) / 1e9
+    ts = (sig_ns - origin) / 1e9 + lag0_s
+    out = {"Offset_s": np.nan, "Coarse_Offset_s": np.nan, "Peak_Corr": 0.0, "Confidence": 0.0, "Overlap_s": 0.0}
+    if len(tr) < 2 or len(ts) < 2:
+        return out
+
+    # Grille commune : support de ref + fenêtre de recherche (signal décalé de lag0)
+    t0 = min(tr.min(), ts.min()) - max_lag_s
+    t1 = max(tr.max(), ts.max()) + max_lag_s
+    n = int(np.floor((t1 - t0) * fine_fs)) + 1
+    a, ma = _uniform(tr, x_ref, t0, n, fine_fs)
+    b, mb = _uniform(ts, x_sig, t0, n, fine_fs)
+    need = min_overlap * min(ma.sum(), mb.sum())
+
+    # 1. Recherche grossière (signaux décimés, FFT)
+    q = max(1, int(round(fine_fs / coarse_fs)))
+    ad, mad = _decimate(a, ma, q)
+    bd, mbd = _decimate(b, mb, q)
+    fs_c = fine_fs / q
+    lags, c, overlap = normalized_xcorr(ad, mad, bd, mbd, int(np.ceil(max_lag_s * fs_c)))
+    c = np.where(overlap * q >= need, c, -np.inf)
+    if not np.isfinite(c).any():
+        return out
+    i = int(np.argmax(c))
+    coarse_lag = lags[i]
+    out["Coarse_Offset_s"] = float(lag0_s + coarse_lag / fs_c)
+    # Pic au bord de la plage de lags (ou des lags de recouvrement suffisant) : pas un maximum
+    if i == 0 or i == len(c) - 1 or not np.isfinite(c[i - 1]) or not np.isfinite(c[i + 1]):
+        out["Peak_Corr"] = float(c[i])
+        return out
+
+    # Second pic hors du lobe principal (ambiguïté de la corrélation)
+    lo, hi = main_lobe(c, i)
+    side = np.concatenate((c[:lo], c[hi + 1:]))
+    second = side.max() if np.isfinite(side).any() else 0.0
+
+    # 2. Affinage à fine_fs autour du pic grossier (+/- 2 échantillons grossiers)
+    half = 2 * q
+    max_fine = int(np.floor(max_lag_s * fine_fs))
+    fine_lags = np.arange(max(coarse_lag * q - half, -max_fine), min(coarse_lag * q + half, max_fine) + 1)
+    cf = _lag_xcorr(a, ma, b, mb, fine_lags)
+    j = int(np.argmax(cf))
+    if abs(fine_lags[j]) >= max_fine:
+        out["Peak_Corr"] = float(cf[j])
+        return out
+    delta, peak = parabolic_peak(cf, j)
+    lag = float(np.clip(fine_lags[j] + delta, -max_fine, max_fine))
+
+    L = int(fine_lags[j])
+    out["Offset_s"] = float(lag0_s + lag / fine_fs)
+    out["Peak_Corr"] = float(peak)
+    out["Confidence"] = float(np.clip(peak, 0, 1) * np.clip(1 - max(second, 0) / max(c[i], 1e-12), 0, 1))
+    out["Overlap_s"] = float(np.dot(ma[max(0, L):n + min(0, L)], mb[max(0, -L):n - max(0, L)]) / fine_fs)
+    return out
+
+
+def sync_signals(df_xsens, df_tdms):
+    """Signaux comparables d'un essai : (x_ref Xsens, x_sig TDMS, nom) avec
+    vitesse horizontale Xsens / vitesse roue ('Speed'), ou Acc_X / accélération roue
+    ('Acc'). None si les canaux nécessaires manquent."""
+    if EDGES_CHANNEL not in df_tdms.columns or len(df_tdms) < 2:
+        return None
+    t_tdms = df_tdms.index
+    fs = (len(t_tdms) - 1) / ((as_ns(t_tdms[-1]) - as_ns(t_tdms[0])) / 1e9)
+    speed, acc = wheel_speed(df_tdms[EDGES_CHANNEL].to_numpy(), fs)
+
+    if {'Vel_N', 'Vel_E'}.issubset(df_xsens.columns):
+        x_ref = np.hypot(df_xsens['Vel_N'].to_numpy(dtype=np.float64), df_xsens['Vel_E'].to_numpy(dtype=np.float64))
+        return x_ref, speed, 'Speed'
+    if 'Acc_X' in df_xsens.columns:
+        return df_xsens['Acc_X'].to_numpy(dtype=np.float64), acc, 'Acc'
+    return None
+
+
+def forced_sync_offset(df_xsens, df_tdms, time_col='TS_UTC', max_lag_s=MAX_LAG_S, **kw):
+    """Correction (s) à ajouter à l'index de df_tdms (calé sur le départ Xsens) pour l'aligner
+    sur df_xsens, par estimate_offset dans [-max_lag_s, max_lag_s].
+
+    Retourne le dict de estimate_offset + Signal ('Speed' ou 'Acc'), ou None si les
+    canaux nécessaires manquent (EDGES_CHANNEL, Vel_N / Vel_E ou Acc_X)."""
+    sig = sync_signals(df_xsens, df_tdms)
+    if sig is None:
+        return None
+    x_ref, x_sig, kind = sig
+    est = estimate_offset(df_xsens[time_col], x_ref, df_tdms.index, x_sig, max_lag_s=max_lag_s, **kw)
+    est["Signal"] = kind
+    return est
+
+
+def sliding_offsets(t_ref, x_ref, t_sig, x_sig, lag0_s=0.0, window_s=DRIFT_WINDOW_S, step_s=DRIFT_STEP_S,
+                    max_lag_s=DRIFT_MAX_LAG_S, fs=DRIFT_FS, batch=DRIFT_BATCH):
+    """Offset local (t_ref - t_sig) de chaque fenêtre de window_s secondes (pas step_s),
+    cherché dans [lag0_s - max_lag_s, lag0_s + max_lag_s].
+
+    Chaque fenêtre ref (w échantillons) est corrélée avec la fenêtre sig élargie de
+    max_lag de chaque côté : un rfft / irfft par lot de fenêtres, Pearson exact pour
+    chaque lag (moyenne et variance glissantes de sig par sommes cumulées), pic affiné
+    par interpolation parabolique.
+    Retourne un DataFrame : T_s (temps sig depuis son premier échantillon, centre de
+    fenêtre), Offset_s (NaN si le pic est au bord de la recherche), Corr."""
+    ref_ns, sig_ns = as_ns(t_ref), as_ns(t_sig)
+    origin = int(sig_ns.min())
+    tr = (ref_ns - origin) / 1e9
+    ts = (sig_ns - origin) / 1e9 + lag0_s
+    empty = pd.DataFrame(columns=WINDOW_COLS[:3], dtype=np.float64)
+    if len(tr) < 2 or len(ts) < 2:
+        return empty
+
+    w = int(round(window_s * fs))
+    m = int(np.ceil(max_lag_s * fs))
+    hop = max(int(round(step_s * fs)), 1)
+    t0 = max(tr.min(), ts.min())
+    n = int(np.floor((min(tr.max(), ts.max()) - t0) * fs)) + 1
+    if n < w:
+        return empty
+    a, ma = _uniform(tr, x_ref, t0, n, fs)
+    b, mb = _uniform(ts, x_sig, t0 - m / fs, n + 2 * m, fs)
+
+    starts = np.arange(0, n - w + 1, hop)
+    A_all = np.lib.stride_tricks.sliding_window_view(a, w)[starts]
+    E_all = np.lib.stride_tricks.sliding_window_view(b, w + 2 * m)[starts]
+    # Fenêtres entièrement couvertes par les deux signaux
+    full = (np.lib.stride_tricks.sliding_window_view(ma, w)[starts].min(axis=1) > 0) & \
+           (np.lib.stride_tricks.sliding_window_view(mb, w + 2 * m)[starts].min(axis=1) > 0)
+    starts, A_all, E_all = starts[full], A_all[full], E_all[full]
+
+    nfft = fft.next_fast_len(w + 2 * m, real=True)
+    lags = np.empty(len(starts))
+    corr = np.empty(len(starts))
+    for s in range(0, len(starts), batch):
+        A = A_all[s:s + batch] - A_all[s:s + batch].mean(axis=1, keepdims=True)
+        E = E_all[s:s + batch]
+        # C[:, k] = sum_i A[i] E[i + k], k = m - L (pas de repliement : i + k < w + 2m <= nfft)
+        C = fft.irfft(np.conj(fft.rfft(A, nfft, axis=1)) * fft.rfft(E, nfft, axis=1), nfft, axis=1)[:, :2 * m + 1]
+        S1 = np.cumsum(np.pad(E, ((0, 0), (1, 0))), axis=1)
+        S2 = np.cumsum(np.pad(E * E, ((0, 0), (1, 0))), axis=1)
+        se = S1[:, w:w + 2 * m + 1] - S1[:, :2 * m + 1]
+        var_e = np.clip(S2[:, w:w + 2 * m + 1] - S2[:, :2 * m + 1] - se * se / w, 0, None)
+        var_a = (A * A).sum(axis=1, keepdims=True)
+        den = np.sqrt(var_a * var_e)
+        r = np.where(den > 0, C / np.where(den > 0, den, 1.0), 0.0)
+
+        k = r.argmax(axis=1)
+        rows = np.arange(len(k))
+        inner = (k > 0) & (k < 2 * m)
+        y0 = r[rows, np.clip(k - 1, 0, 2 * m)]
+        y1 = r[rows, k]
+        y2 = r[rows, np.clip(k + 1, 0, 2 * m)]
+        d = y0 - 2 * y1 + y2
+        ok = inner & (d < 0)
+        delta = np.where(ok, np.clip(0.5 * (y0 - y2) / np.where(ok, d, -1.0), -0.5, 0.5), 0.0)
+        # Pic au bord de [-max_lag, +max_lag] : vrai offset hors de la recherche
+        lags[s:s + batch] = np.where(inner, m - (k + delta), np.nan)
+        corr[s:s + batch] = np.where(ok, y1 - 0.25 * (y0 - y2) * delta, y1)
+
+    offsets = lag0_s + lags / fs
+    t_centre = t0 + (starts + w / 2) / fs  # temps ref (depuis le premier échantillon sig)
+    t_sig_s = t_centre - np.where(np.isfinite(offsets), offsets, lag0_s)
+    return pd.DataFrame({'T_s': t_sig_s, 'Offset_s': offsets, 'Corr': corr})
+
+
+def fit_drift(windows, knots_s=None, min_corr=DRIFT_MIN_CORR, k=OUTLIER_MAD, n_iter=10):
+    """ClockModel ajusté sur les offsets locaux (offset + dérive, ou nœuds knots_s) :
+    moindres carrés itératifs, fenêtres à plus de k écarts robustes (MAD) rejetées.
+    Retourne (modèle ou None, windows + Residual_s et Inlier)."""
+    t = windows['T_s'].to_numpy(dtype=np.float64)
+    y = windows['Offset_s'].to_numpy(dtype=np.float64)
+    ok = np.isfinite(t) & np.isfinite(y) & (windows['Corr'].to_numpy(dtype=np.float64) >= min_corr)
+    inlier = ok.copy()
+    model, resid = None, np.full(len(t), np.nan)
+    for _ in range(n_iter):
+        if inlier.sum() < 2:
+            break
+        model = ClockModel.fit(t[inlier], y[inlier], knots_s)
+        resid = y - model.offset(t)
+        r = resid[inlier]
+        sigma = max(1.4826 * np.median(np.abs(r - np.median(r))), RESIDUAL_FLOOR_S)
+        new = ok & (np.abs(resid) <= k * sigma)
+        if np.array_equal(new, inlier):
+            break
+        inlier = new
+    return model, windows.assign(Residual_s=resid, Inlier=inlier)
+
+
+def estimate_drift(t_ref, x_ref, t_sig, x_sig, lag0_s=None, knots_s=None, min_windows=DRIFT_MIN_WINDOWS, **kw):
+    """Modèle d'horloge sig -> ref estimé sur des fenêtres glissantes.
+
+    lag0_s : centre de la recherche locale ; None = offset global (estimate_offset),
+    abandon si sa confiance est sous MIN_CONFIDENCE.
+    Retourne (ClockModel ou None si moins de min_windows fenêtres retenues, ou moins
+    que de fenêtres au bord de la recherche, windows)."""
+    if lag0_s is None:
+        est = estimate_offset(t_ref, x_ref, t_sig, x_sig)
+        if not np.isfinite(est["Offset_s"]) or est["Confidence"] < MIN_CONFIDENCE:
+            return None, pd.DataFrame(columns=WINDOW_COLS)
+        lag0_s = est["Offset_s"]
+    windows = sliding_offsets(t_ref, x_ref, t_sig, x_sig, lag0_s=lag0_s, **kw)
+    model, windows = fit_drift(windows, knots_s)
+    # Plus de fenêtres au bord de la recherche que de fenêtres retenues : lag0_s faux
+    pinned = windows['Offset_s'].isna().sum()
+    if model is None or windows['Inlier'].sum() < max(min_windows, pinned):
+        return None, windows
+    return model, windows
+
+
+def trial_drift(df_xsens, df_tdms, time_col='TS_UTC', **kw):
+    """estimate_drift sur les signaux d'un essai (sync_signals). (None, fenêtres vides) si
+    les canaux manquent."""
+    sig = sync_signals(df_xsens, df_tdms)
+    if sig is None:
+        return None, pd.DataFrame(columns=WINDOW_COLS)
+    x_ref, x_sig, _ = sig
+    return estimate_drift(df_xsens[time_col], x_ref, df_tdms.index, x_sig, **kw)
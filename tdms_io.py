@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lecture des fichiers TDMS LabVIEW (groupes P1 / P2)
+
+Le fichier est ouvert en streaming (TdmsFile.open) : seules les métadonnées sont
+lues à l'ouverture, puis on ne lit que les segments des canaux demandés du
+groupe demandé, éventuellement sur une plage d'échantillons / de temps.
+TdmsFile.read chargeait tous les groupes et tous les canaux du fichier.
+"""
+
+import os
+from contextlib import contextmanager
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from nptdms import TdmsFile
+
+from time_base import UniformTimeBase
+
+TDMS_FREQ = 400.0
+MAGIC_OFFSET = 0.2679
+REF_CHANNEL = 'Edges_RoueAR'
+RESET_THRESHOLD = -100
+SEGMENT_CHUNK = 1_000_000  # échantillons (~40 min à 400 Hz)
+SEGMENT_COLS = ['Segment', 'Start', 'Stop', 'Length', 'Kind', 'Edges_First', 'Edges_Last']
+
+
+class TdmsSources:
+    """Fichiers TDMS ouverts pour la durée d'un run : un fichier partagé par plusieurs
+    essais (groupes P1 / P2 d'une même vitesse) n'est ouvert et indexé qu'une fois.
+    Les fichiers restent ouverts jusqu'à release() (ou la sortie du bloc with)."""
+
+    def __init__(self):
+        self.files = {}
+
+    def __contains__(self, path):
+        return os.path.abspath(path) in self.files
+
+    def get(self, path):
+        key = os.path.abspath(path)
+        if key not in self.files:
+            self.files[key] = TdmsFile.open(path)
+        return self.files[key]
+
+    def release(self, path=None):
+        """Ferme un fichier, ou tous si path est None."""
+        keys = list(self.files) if path is None else [os.path.abspath(path)]
+        for key in keys:
+            tdms = self.files.pop(key, None)
+            if tdms is not None:
+                tdms.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+@contextmanager
+def open_tdms(source, sources=None):
+    """TdmsFile en lecture streaming. Un TdmsFile déjà ouvert est utilisé tel quel ;
+    avec sources (TdmsSources), le fichier est pris / gardé dans le cache du run."""
+    if isinstance(source, TdmsFile):
+        yield source
+    elif sources is not None:
+        yield sources.get(source)
+    else:
+        with TdmsFile.open(source) as tdms:
+            yield tdms
+
+
+def get_group(tdms, group_name):
+    return next((g for g in tdms.groups() if g.name == group_name), None)
+
+
+def select_channels(group, channels=None):
+    return [c for c in group.channels() if channels is None or c.name in channels]
+
+
+def wf_start_time(tdms, group, channel=REF_CHANNEL):
+    """wf_start_time du canal de référence, sinon celui du fichier (sans timezone), ou None."""
+    props = group[channel].properties if channel in group else {}
+    for p in (props, tdms.properties):
+        if 'wf_start_time' in p:
+            return pd.to_datetime(p['wf_start_time']).tz_localize(None)
+    return None
+
+
+def channel_time_base(channel, length=None):
+    """UniformTimeBase d'un canal depuis wf_start_time / wf_increment, ou None."""
+    props = channel.properties
+    if 'wf_start_time' not in props or not props.get('wf_increment'):
+        return None
+    start = pd.to_datetime(props['wf_start_time']).tz_localize(None)
+    return UniformTimeBase.from_increment(start, props['wf_increment'], len(channel) if length is None else length)
+
+
+def time_index(start_time, n, freq=TDMS_FREQ, offset=0):
+    """Index 'TDMS_Timestamp' de n points à freq Hz, à partir de l'échantillon offset."""
+    return UniformTimeBase.from_freq(start_time, freq, offset + n)[offset:].to_index('TDMS_Timestamp')
+
+
+def read_group(tdms, group_name, channels=None, start=0, stop=None):
+    """Canaux d'un groupe (échantillons [start:stop)) en DataFrame, tronqués à la longueur commune.
+    DataFrame vide si le groupe ou les canaux sont absents."""
+    group = get_group(tdms, group_name)
+    if group is None:
+        return pd.DataFrame()
+    chans = select_channels(group, channels)
+    if not chans:
+        return pd.DataFrame()
+    n = min(len(c) for c in chans)
+    stop = n if stop is None else min(stop, n)
+    start = min(start, stop)
+    return pd.DataFrame({c.name: c.read_data(start, stop - start) for c in chans})
+
+
+def read_tdms_group(path, group_name, channels=None, t_start=None, t_end=None, freq=TDMS_FREQ, sources=None):
+    """Lit un groupe TDMS sur la base de temps des métadonnées (wf_start_time),
+    en ne lisant que les échantillons compris dans [t_start, t_end] si fournis.
+    Retourne un DataFrame indexé par 'TDMS_Timestamp', vide si pas de start time."""
+    with open_tdms(path, sources) as tdms:
+        group = get_group(tdms, group_name)
+        if group is None:
+            return pd.DataFrame()
+        t0 = wf_start_time(tdms, group)
+        chans = select_channels(group, channels)
+        if t0 is None or not chans:
+            return pd.DataFrame()
+        base = UniformTimeBase.from_freq(t0, freq, min(len(c) for c in chans))
+        sl = base.slice_time(t_start, t_end)
+        df = read_group(tdms, group_name, channels, sl.start, sl.stop)
+    df.index = base[sl].to_index('TDMS_Timestamp')
+    return df
+
+
+def segment_edges(channel, chunk=SEGMENT_CHUNK, threshold=RESET_THRESHOLD, modulus=None, length=None):
+    """Découpe le compteur Edges_RoueAR en segments continus, en le lisant par blocs.
+
+    channel : canal TDMS (lu via read_data, mémoire bornée par chunk) ou tableau.
+    Une chute < threshold est un 'Wrap' si elle correspond au débordement du compteur
+    (modulus, déduit du dtype entier <= 32 bits si None), sinon un 'Reset'.
+    Retourne un DataFrame (SEGMENT_COLS) : échantillons [Start, Stop) de chaque segment,
+    Kind = cause du début du segment ('Start', 'Reset' ou 'Wrap')."""
+    n = len(channel) if length is None else min(length, len(channel))
+    if n == 0:
+        return pd.DataFrame(columns=SEGMENT_COLS)
+    read = channel.read_data if hasattr(channel, 'read_data') else (lambda off, ln: channel[off:off + ln])
+
+    breaks, kinds, firsts, lasts = [], [], [], []
+    first = prev = None
+    for off in range(0, n, chunk):
+        x = np.asarray(read(off, min(chunk, n - off)))
+        if modulus is None and x.dtype.kind in 'iu' and x.dtype.itemsize <= 4:
+            modulus = 2 ** (8 * x.dtype.itemsize)
+        # Différences signées (un uint soustrait déborderait au lieu de devenir négatif)
+        x = x.astype(np.int64 if x.dtype.kind in 'iu' else np.float64)
+        if first is None:
+            first = prev = x[0]
+        d = np.diff(x, prepend=prev)
+        idx = np.flatnonzero(d < threshold)
+        if len(idx):
+            step = d[idx] + (modulus or 0)
+            wrap = (modulus is not None) & (step >= 0) & (step <= -threshold)
+            breaks.extend(off + idx)
+            kinds.extend(np.where(wrap, 'Wrap', 'Reset'))
+            firsts.extend(x[idx])
+            lasts.extend(np.where(idx > 0, x[idx - 1], prev))
+        prev = x[-1]
+
+    starts = np.array([0] + breaks, dtype=np.int64)
+    stops = np.append(starts[1:], n)
+    return pd.DataFrame({
+        'Segment': np.arange(len(starts)),
+        'Start': starts,
+        'Stop': stops,
+        'Length': stops - starts,
+        'Kind': ['Start'] + [str(k) for k in kinds],
+        'Edges_First': [first] + firsts,
+        'Edges_Last': lasts + [prev],
+    })
+
+
+def load_tdms_smart(path, group_name, xsens_start_ref, magic_offset=MAGIC_OFFSET, freq=TDMS_FREQ, channels=None,
+                    sources=None):
+    """Charge un groupe TDMS avec détection de reset de Edges_RoueAR.
+
+    Sans reset : base de temps wf_start_time (Metadata).
+    Avec reset : données après le reset, start = départ Xsens + magic_offset (Forced).
+    sources (TdmsSources) : réutilise le fichier déjà ouvert par un autre essai du run.
+    Retourne (DataFrame indexé 'TDMS_Timestamp' avec colonnes 'TDMS_*', stats)."""
+    stats = {
+        "TDMS_Found": False, "Reset_Detected": False, "Reset_Index": 0,
+        "Sync_Method": "Unknown", "TDMS_Start_Time": None, "TDMS_Points_Valid": 0
+    }
+
+    try:
+        with open_tdms(path, sources) as tdms:
+            stats["TDMS_Found"] = True
+
+            target_group = get_group(tdms, group_name)
+            if target_group is None:
+                return pd.DataFrame(), stats
+            chans = select_channels(target_group, channels)
+            if not chans:
+                return pd.DataFrame(), stats
+            n = min(len(c) for c in chans)
+
+            # 1. Detection Reset (segmentation de Edges_RoueAR par blocs, wraps ignorés)
+            start_index = 0
+            if any(c.name == REF_CHANNEL for c in chans):
+                segments = segment_edges(target_group[REF_CHANNEL], length=n)
+                resets = segments.loc[segments['Kind'] == 'Reset', 'Start']
+                if len(resets) > 0:
+                    start_index = int(resets.iloc[0])
+                    stats["Reset_Detected"] = True
+                    stats["Reset_Index"] = start_index
+
+            # 2. Stratégie Timestamp
+            base_start_time = None
+            if stats["Reset_Detected"]:
+                # FORCED SYNC
+                base_start_time = xsens_start_ref + timedelta(seconds=magic_offset)
+                stats["Sync_Method"] = "Forced (Xsens+Offset)"
+            else:
+                # METADATA SYNC
+                try:
+                    base_start_time = wf_start_time(tdms, target_group)
+                except Exception:
+                    pass
+                stats["Sync_Method"] = "Metadata"
+
+            stats["TDMS_Start_Time"] = base_start_time
+            stats["TDMS_Points_Valid"] = n - start_index
+            if not base_start_time:
+                stats["Sync_Method"] = "FAILED (No Time)"
+                return pd.DataFrame(), stats
+
+            # 3. Lecture des canaux à partir du reset uniquement
+            data = {c.name: c.read_data(start_index, n - start_index) for c in chans}
+
+        df = pd.DataFrame(data, index=time_index(base_start_time, n - start_index, freq))
+        df.columns = [f"TDMS_{c}" for c in df.columns]
+        return df, stats
+
+    except Exception as e:
+        stats["Error"] = str(e)
+        return pd.DataFrame(), stats
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Base de temps uniforme "virtuelle" (données TDMS à fréquence fixe)
+
+t[i] = start_ns + i * increment_ns, pour i dans [0, length)
+
+Aucun tableau de timestamps n'est créé : indexation, découpage, recherche
+(searchsorted) et interpolation sont calculés par arithmétique. Seuls to_index()
+et values_ns() matérialisent les timestamps, et seulement sur la plage demandée.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def as_ns(t):
+    """Timestamp(s) -> ns depuis l'epoch (int, ou tableau int64)."""
+    if isinstance(t, (pd.Series, pd.Index)):
+        t = t.to_numpy()
+    if isinstance(t, np.ndarray):
+        return t.astype('datetime64[ns]').view(np.int64) if t.dtype.kind == 'M' else t.astype(np.int64)
+    if isinstance(t, (int, np.integer)):
+        return int(t)
+    return pd.Timestamp(t).value
+
+
+class UniformTimeBase:
+    """Base de temps uniforme (start_ns, increment_ns, length)."""
+
+    __slots__ = ('start_ns', 'increment_ns', 'length')
+
+    def __init__(self, start_ns, increment_ns, length):
+        inc = float(increment_ns)
+        if not inc > 0:
+            raise ValueError(f"increment_ns doit être > 0 ({increment_ns})")
+        self.start_ns = int(start_ns)
+        self.increment_ns = int(inc) if inc.is_integer() else inc
+        self.length = max(int(length), 0)
+
+    @classmethod
+    def from_freq(cls, start, freq, length):
+        """start : timestamp, freq : Hz."""
+        return cls(as_ns(start), 1e9 / freq, length)
+
+    @classmethod
+    def from_increment(cls, start, increment_s, length):
+        """start : timestamp, increment_s : secondes (wf_increment)."""
+        return cls(as_ns(start), increment_s * 1e9, length)
+
+    @classmethod
+    def from_index(cls, index):
+        """Base équivalente à un DatetimeIndex à pas constant, sinon None."""
+        ns = as_ns(index)
+        if len(ns) < 2:
+            return cls(ns[0], 1, 1) if len(ns) else None
+        d = np.diff(ns)
+        if d[0] <= 0 or not np.all(d == d[0]):
+            return None
+        return cls(ns[0], d[0], len(ns))
+
+    # --- propriétés ---
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return f"UniformTimeBase(start={self.start}, freq={self.freq:g} Hz, length={self.length})"
+
+    def __eq__(self, other):
+        return (isinstance(other, UniformTimeBase) and self.start_ns == other.start_ns
+                and self.increment_ns == other.increment_ns and self.length == other.length)
+
+    @property
+    def freq(self):
+        return 1e9 / self.increment_ns
+
+    @property
+    def start(self):
+        return pd.Timestamp(self.start_ns)
+
+    @property
+    def end(self):
+        """Timestamp du dernier échantillon."""
+        return pd.Timestamp(int(self._ns(self.length - 1)))
+
+    @property
+    def duration_s(self):
+        return (self._ns(self.length - 1) - self.start_ns) / 1e9 if self.length else 0.0
+
+    # --- matérialisation ---
+    def _ns(self, i):
+        if isinstance(self.increment_ns, int):
+            return self.start_ns + np.asarray(i, dtype=np.int64) * self.increment_ns
+        return self.start_ns + np.rint(np.asarray(i, dtype=np.float64) * self.increment_ns).astype(np.int64)
+
+    def values_ns(self, start=0, stop=None):
+        start, stop, _ = slice(start, stop).indices(self.length)
+        return self._ns(np.arange(start, stop))
+
+    def to_index(self, name=None):
+        return pd.DatetimeIndex(self.values_ns().view('datetime64[ns]'), name=name)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step <= 0:
+                raise ValueError("Pas négatif non supporté")
+            n = len(range(start, stop, step))
+            return UniformTimeBase(int(self._ns(start)) if n else self.start_ns, self.increment_ns * step, n)
+        if np.ndim(key) == 0:
+            i = int(key) + (self.length if key < 0 else 0)
+            if not 0 <= i < self.length:
+                raise IndexError(key)
+            return pd.Timestamp(int(self._ns(i)))
+        return self._ns(np.asarray(key)).view('datetime64[ns]')
+
+    # --- requêtes ---
+    def position(self, t):
+        """Position fractionnaire de t (0 = premier échantillon), hors bornes comprise."""
+        return (as_ns(t) - self.start_ns) / self.increment_ns
+
+    def searchsorted(self, t, side='left'):
+        """Équivalent de np.searchsorted(self.values_ns(), t, side) sans matérialiser."""
+        t = np.asarray(as_ns(t))
+        last = max(self.length - 1, 0)
+        # k = dernier échantillon <= t (position flottante, puis correction exacte de l'arrondi)
+        k = np.clip(np.floor(self.position(t)), -1, self.length - 1).astype(np.int64)
+        k -= (k >= 0) & (self._ns(np.maximum(k, 0)) > t)
+        k += (k + 1 < self.length) & (self._ns(np.minimum(k + 1, last)) <= t)
+        out = k + 1
+        if side == 'left':
+            out -= (k >= 0) & (self._ns(np.maximum(k, 0)) == t)
+        return int(out) if out.ndim == 0 else out
+
+    def slice_time(self, t_start=None, t_end=None):
+        """slice des échantillons dans [t_start, t_end] (bornes incluses)."""
+        i0 = 0 if t_start is None else self.searchsorted(t_start, 'left')
+        i1 = self.length if t_end is None else self.searchsorted(t_end, 'right')
+        return slice(i0, max(i0, i1))
+
+    def bracket(self, t):
+        """(i0, w) pour l'interpolation linéaire : v(t) = v[i0] * (1 - w) + v[i0 + 1] * w.
+        Hors bornes, i0 reste sur le premier / dernier intervalle (extrapolation linéaire)."""
+        pos = self.position(t)
+        i0 = np.clip(np.floor(pos), 0, max(self.length - 2, 0)).astype(np.int64)
+        return i0, pos - i0
+
+    def interp(self, t, values):
+        """Interpolation linéaire de values (axe 0 = échantillons) aux instants t,
+        extrapolée hors bornes comme interp1d(fill_value='extrapolate')."""
+        values = np.asarray(values)
+        if self.length < 2:
+            return np.broadcast_to(values[:1], (np.size(t),) + values.shape[1:]).astype(np.float64)
+        i0, w = self.bracket(t)
+        if values.ndim > 1:
+            w = w.reshape(w.shape + (1,) * (values.ndim - 1))
+        return values[i0] * (1 - w) + values[i0 + 1] * w
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cache disque des essais parsés (Xsens TXT, TDMS)
+
+Chaque résultat de loader est stocké en binaire colonne (Arrow IPC / Feather non
+compressé, lu en memory-map si pyarrow est installé, sinon npz) et indexé par :
+- le fichier source : chemin, taille, mtime, hash du contenu (blake2b)
+- le loader : nom, arguments, paramètres supplémentaires (params), CACHE_VERSION et
+  hash des sources du parseur : module du loader et modules voisins qu'il importe
+  (ex. tdms_io + time_base) ; modifier le parseur invalide ses entrées
+
+Tant que taille + mtime n'ont pas changé, le hash n'est pas recalculé. Si le
+fichier a été touché/copié sans modification, le hash du contenu retrouve l'entrée.
+Taille totale plafonnée (max_bytes) avec éviction LRU. L'index n'est réécrit qu'aux
+ajouts / suppressions ; les accès (LRU) sont écrits par flush(), appelé en fin de process.
+"""
+
+import atexit
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+CACHE_VERSION = 1
+DEFAULT_DIR = '.trial_cache'
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 Go
+HASH_BLOCK = 1024 * 1024
+_SOURCE_DIGESTS = {}  # fichier source -> hash (calculé une fois par processus)
+
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _source_hash(path):
+    if path not in _SOURCE_DIGESTS:
+        try:
+            _SOURCE_DIGESTS[path] = file_digest(path)
+        except OSError:
+            _SOURCE_DIGESTS[path] = ''
+    return _SOURCE_DIGESTS[path]
+
+
+def source_files(func):
+    """Fichiers source du parseur func : son module et les modules du même dossier qu'il
+    importe (un niveau : from time_base import ... dans tdms_io). [] si introuvable."""
+    try:
+        path = inspect.getsourcefile(func)
+    except TypeError:
+        return []
+    if not path:
+        return []
+    folder = os.path.dirname(os.path.abspath(path))
+    files = {os.path.abspath(path)}
+    module = inspect.getmodule(func)
+    for obj in vars(module).values() if module is not None else ():
+        name = obj.__name__ if inspect.ismodule(obj) else getattr(obj, '__module__', None)
+        dep = getattr(sys.modules.get(name) if isinstance(name, str) else None, '__file__', None)
+        if dep and os.path.dirname(os.path.abspath(dep)) == folder:
+            files.add(os.path.abspath(dep))
+    return sorted(files)
+
+
+def source_digest(func):
+    """Hash des sources du parseur func ('' si introuvable : builtin, partial, console)."""
+    files = source_files(func)
+    if not files:
+        return ''
+    desc = repr([(os.path.basename(f), _source_hash(f)) for f in files])
+    return hashlib.blake2b(desc.encode(), digest_size=16).hexdigest()
+
+
+def _write_feather(df, path):
+    feather.write_feather(df.rename_axis('__index__').reset_index(), path, compression='uncompressed')
+
+
+def _read_feather(path, index_name):
+    df = feather.read_table(path, memory_map=True).to_pandas(split_blocks=True)
+    return df.set_index('__index__').rename_axis(index_name)
+
+
+def _write_npz(df, path):
+    arrays = {f"c{i}": df[c].to_numpy() for i, c in enumerate(df.columns)}
+    np.savez(path, __index__=df.index.to_numpy(), __columns__=np.array(list(df.columns), dtype=object),
+             __index_name__=np.array([df.index.name], dtype=object), **arrays)
+
+
+def _read_npz(path):
+    with np.load(path, allow_pickle=True) as z:
+        cols = list(z['__columns__'])
+        index = pd.Index(z['__index__'], name=z['__index_name__'][0])
+        return pd.DataFrame({c: z[f"c{i}"] for i, c in enumerate(cols)}, index=index)
+
+
+class TrialCache:
+    """Cache des loaders d'essais : cache.load(path, loader, *args, params=None).
+
+    Le loader peut retourner un DataFrame ou (DataFrame, dict) comme load_tdms_smart.
+    Les résultats vides (erreur de lecture) ne sont pas mis en cache."""
+
+    def __init__(self, cache_dir=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES, fmt=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fmt = fmt or ('feather' if HAS_ARROW else 'npz')
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self._read_index()
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        atexit.register(self.flush)
+
+    # --- index ---
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self):
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp, self.index_path)
+        self._dirty = False
+
+    def flush(self):
+        """Écrit l'index si des accès n'ont pas encore été enregistrés."""
+        if self._dirty:
+            self._write_index()
+
+    @staticmethod
+    def _loader_key(loader, args, params):
+        desc = repr((CACHE_VERSION, getattr(loader, '__module__', ''), loader.__name__, source_digest(loader), args,
+                     sorted((params or {}).items())))
+        return hashlib.blake2b(desc.encode(), digest_size=8).hexdigest()
+
+    def _lookup(self, path, st, loader_key):
+        """Retourne la clé d'entrée valide, ou (None, hash du contenu)."""
+        src = os.path.abspath(path)
+        for key, e in self.index.items():
+            if (e['loader'] == loader_key and e['path'] == src
+                    and e['size'] == st.st_size and e['mtime_ns'] == st.st_mtime_ns):
+                return key, e['hash']
+        digest = file_digest(path)
+        key = f"{digest}_{loader_key}"
+        if key in self.index:
+            # Même contenu (fichier copié / touché) : on met à jour la source
+            self.index[key].update(path=src, size=st.st_size, mtime_ns=st.st_mtime_ns)
+            return key, digest
+        # Fichier modifié : les anciennes entrées de cette source sont périmées
+        for k in [k for k, e in self.index.items() if e['path'] == src and e['loader'] == loader_key]:
+            self._drop(k)
+        return None, digest
+
+    # --- API ---
+    def load(self, path, loader, *args, params=None, loader_kw=None):
+        """Résultat de loader(path, *args, **loader_kw), relu du cache si possible.
+        loader_kw : arguments hors clé (ressources comme sources=TdmsSources)."""
+        st = os.stat(path)
+        loader_key = self._loader_key(loader, args, params)
+        key, digest = self._lookup(path, st, loader_key)
+
+        if key is not None:
+            e = self.index[key]
+            try:
+                result = self._read_entry(e)
+                e['last_access'] = time.time()
+                self._dirty = True
+                self.hits += 1
+                return result
+            except (OSError, ValueError, KeyError, pickle.UnpicklingError):
+                self._drop(key)
+
+        self.misses += 1
+        result = loader(path, *args, **(loader_kw or {}))
+        df = result[0] if isinstance(result, tuple) else result
+        if isinstance(df, pd.DataFrame) and not df.empty:
+            self._store(f"{digest}_{loader_key}", path, st, digest, loader_key, result)
+        return result
+
+    def _read_entry(self, e):
+        data_path = os.path.join(self.cache_dir, e['file'])
+        if e['file'].endswith('.feather'):
+            df = _read_feather(data_path, e.get('index_name'))
+        else:
+            df = _read_npz(data_path)
+        if e.get('meta'):
+            with open(os.path.join(self.cache_dir, e['meta']), 'rb') as f:
+                return df, pickle.load(f)
+        return df
+
+    def _store(self, key, path, st, digest, loader_key, result):
+        df, meta = (result[0], result[1]) if isinstance(result, tuple) else (result, None)
+        ext = '.feather' if self.fmt == 'feather' else '.npz'
+        fname = key + ext
+        data_path = os.path.join(self.cache_dir, fname)
+        if ext == '.feather':
+            _write_feather(df, data_path)
+        else:
+            _write_npz(df, data_path)
+        nbytes = os.path.getsize(data_path)
+
+        meta_name = None
+        if meta is not None:
+            meta_name = key + '.meta.pkl'
+            with open(os.path.join(self.cache_dir, meta_name), 'wb') as f:
+                pickle.dump(meta, f)
+            nbytes += os.path.getsize(os.path.join(self.cache_dir, meta_name))
+
+        self.index[key] = {
+            "path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "hash": digest, "loader": loader_key, "file": fname, "meta": meta_name,
+            "index_name": df.index.name,
+            "bytes": nbytes, "last_access": time.time(),
+        }
+        self._evict()
+        self._write_index()
+
+    def _drop(self, key):
+        e = self.index.pop(key)
+        for name in (e['file'], e.get('meta')):
+            if name:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    def _evict(self):
+        """Éviction LRU jusqu'à repasser sous max_bytes."""
+        total = sum(e['bytes'] for e in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= self.index[key]['bytes']
+            self._drop(key)
+
+    def size_bytes(self):
+        return sum(e['bytes'] for e in self.index.values())
+
+    def clear(self):
+        for key in list(self.index):
+            self._drop(key)
+        self._write_index()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Vitesse et accélération roue depuis le compteur de fronts Edges_RoueAR
+
+1. Incréments de fronts par échantillon : les chutes du compteur sont soit un
+   débordement (wrap, corrigé par le modulus), soit un reset (aucun front compté).
+2. Vitesse = fronts comptés sur une fenêtre de window_s (somme cumulée) x distance
+   par front (circonférence / fronts par tour), puis filtre passe-bas Butterworth :
+   zéro-phase (sosfiltfilt, analyse / sync) ou causal (sosfilt, fenêtre en retard).
+3. Accélération = dérivée de la vitesse filtrée.
+Sorties float32, à la fréquence du TDMS.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import signal
+
+from tdms_io import REF_CHANNEL, RESET_THRESHOLD
+from time_base import as_ns
+
+WHEEL_DIA_INCH = 17.0
+WHEEL_CIRCUM_M = WHEEL_DIA_INCH * 0.0254 * np.pi
+EDGES_PER_REV = 50
+SPEED_WINDOW_S = 0.25   # fenêtre de comptage des fronts (s)
+CUTOFF_HZ = 5.0         # coupure du passe-bas vitesse (Hz)
+FILTER_ORDER = 2
+
+
+def edge_increments(edges, threshold=RESET_THRESHOLD, modulus=None):
+    """Fronts par échantillon (int64, premier = 0). Chute < threshold : wrap si elle
+    correspond au débordement du compteur (modulus, déduit du dtype entier <= 32 bits
+    si None), sinon reset ; dans les deux cas aucun front négatif n'est compté."""
+    x = np.asarray(edges)
+    if modulus is None and x.dtype.kind in 'iu' and x.dtype.itemsize <= 4:
+        modulus = 2 ** (8 * x.dtype.itemsize)
+    x = x.astype(np.int64 if x.dtype.kind in 'iu' else np.float64)
+    d = np.diff(x, prepend=x[:1])
+    if modulus is not None:
+        wrap = (d < threshold) & (d + modulus >= 0) & (d + modulus <= -threshold)
+        d[wrap] += modulus
+    if d.dtype.kind == 'f':
+        d[~np.isfinite(d)] = 0
+    d[d < 0] = 0  # reset (ou gigue du compteur)
+    return d
+
+
+def lowpass(x, fs, cutoff_hz=CUTOFF_HZ, order=FILTER_ORDER, zero_phase=True):
+    """Butterworth passe-bas (sections du second ordre), zéro-phase ou causal.
+    x inchangé si la coupure est absente ou au-delà de Nyquist."""
+    if not cutoff_hz or cutoff_hz >= fs / 2:
+        return x
+    sos = signal.butter(order, cutoff_hz, fs=fs, output='sos')
+    if zero_phase:
+        if len(x) <= 3 * (2 * len(sos) + 1):  # padlen de sosfiltfilt
+            return x
+        return signal.sosfiltfilt(sos, x)
+    return signal.sosfilt(sos, x, zi=signal.sosfilt_zi(sos) * x[0])[0] if len(x) else x
+
+
+def wheel_speed(edges, fs, edges_per_rev=EDGES_PER_REV, circumference_m=WHEEL_CIRCUM_M, window_s=SPEED_WINDOW_S,
+                cutoff_hz=CUTOFF_HZ, zero_phase=True):
+    """(vitesse m/s, accélération m/s²) float32 depuis le compteur de fronts échantillonné à fs.
+    zero_phase=False : fenêtre de comptage en retard et filtre causal (temps réel)."""
+    d = edge_increments(edges).astype(np.float64)
+    n = len(d)
+    if n == 0:
+        return np.zeros(0, np.float32), np.zeros(0, np.float32)
+    w = min(max(int(round(window_s * fs)), 1), n)
+    c = np.concatenate(([0.0], np.cumsum(d)))
+    i = np.arange(n)
+    if zero_phase:
+        lo = np.clip(i - w // 2, 0, n - w)  # fenêtre centrée, tronquée aux bords
+    else:
+        lo = np.clip(i - w + 1, 0, None)
+    hi = np.minimum(lo + w, n)
+    rate = (c[hi] - c[lo]) / ((hi - lo) / fs)
+    speed = lowpass(rate * (circumference_m / edges_per_rev), fs, cutoff_hz, zero_phase=zero_phase)
+    acc = np.gradient(speed) * fs if n > 1 else np.zeros(n)
+    return speed.astype(np.float32), acc.astype(np.float32)
+
+
+def wheel_speed_frame(df_tdms, channel='TDMS_' + REF_CHANNEL, prefix='TDMS_', **kw):
+    """Colonnes {prefix}Wheel_Speed / {prefix}Wheel_Acc (float32) d'un DataFrame TDMS indexé
+    par ses timestamps (fréquence déduite de l'index). DataFrame vide si le canal manque."""
+    if channel not in df_tdms.columns or len(df_tdms) < 2:
+        return pd.DataFrame(index=df_tdms.index)
+    t = as_ns(df_tdms.index)
+    fs = (len(t) - 1) / ((t[-1] - t[0]) / 1e9)
+    speed, acc = wheel_speed(df_tdms[channel].to_numpy(), fs, **kw)
+    return pd.DataFrame({f'{prefix}Wheel_Speed': speed, f'{prefix}Wheel_Acc': acc}, index=df_tdms.index)
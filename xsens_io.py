@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lecture des exports TXT Xsens (MT Manager)
+
+Un seul passage sur le fichier :
+1. Recherche du header (PacketCounter / UTC_Year) en lisant ligne à ligne
+2. Inférence du schéma sur la première ligne de données
+3. Parsing par blocs (chunks) avec des dtypes fixes, nettoyage au fil de l'eau ;
+   si un jeton plus loin ne respecte pas le schéma (ex. '-' dans Acc_X), relecture
+   des colonnes numériques en texte puis conversion (jetons invalides -> NaN)
+
+probe_xsens : start/end/fréquence sans parsing complet (lecture du début et de la fin)
+"""
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+UTC_COLS = ['UTC_Year', 'UTC_Month', 'UTC_Day', 'UTC_Hour', 'UTC_Minute', 'UTC_Second', 'UTC_Nano']
+GHOST_CHECK_COLS = ['Acc_X', 'FreeAcc_E', 'Gyr_X']
+CHUNK_ROWS = 250_000  # ~10 min à 400 Hz
+PROBE_BLOCK = 64 * 1024
+
+
+def split_fields(line, sep):
+    return line.rstrip('\r\n').split('\t') if sep == '\t' else line.split()
+
+
+def parse_header_line(line):
+    """Retourne (colonnes, sep) si la ligne est le header Xsens, sinon None."""
+    s = line.strip()
+    if s.startswith('//') or not (s.startswith('PacketCounter') or 'UTC_Year' in s):
+        return None
+    sep = '\t' if '\t' in line else r'\s+'
+    cols = [n.strip() or f"Unnamed: {i}" for i, n in enumerate(split_fields(line, sep))]
+    return cols, sep
+
+
+def find_header(f):
+    """Avance le fichier ouvert jusqu'après le header.
+    Retourne (colonnes, sep) ou (None, None) si aucun header."""
+    for line in iter(f.readline, ''):
+        header = parse_header_line(line)
+        if header:
+            return header
+    return None, None
+
+
+def infer_schema(f, cols, sep):
+    """Dtypes fixes à partir de la première ligne de données (sans consommer la ligne).
+    Les entiers sont lus en float64 (ghost packets = champs vides) et re-typés à la fin."""
+    pos = f.tell()
+    line = f.readline()
+    f.seek(pos)
+    fields = split_fields(line, sep)
+
+    dtypes, int_cols = {}, []
+    for i, c in enumerate(cols):
+        tok = fields[i].strip() if i < len(fields) else ''
+        try:
+            float(tok or 'nan')
+        except ValueError:
+            dtypes[c] = str
+            continue
+        dtypes[c] = 'float64'
+        if tok.lstrip('+-').isdigit():
+            int_cols.append(c)
+    return dtypes, int_cols
+
+
+NAT_NS = np.iinfo(np.int64).min
+_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+
+def utc_to_ns(year, month, day, hour, minute, second, nano):
+    """Colonnes UTC entières -> int64 ns depuis l'epoch (arithmétique entière pure).
+    Les lignes hors bornes ou incomplètes (NaN) valent NAT_NS."""
+    cols = [np.asarray(c) for c in (year, month, day, hour, minute, second, nano)]
+    valid = np.ones(cols[0].shape, dtype=bool)
+    for c in cols:
+        if c.dtype.kind == 'f':
+            valid &= np.isfinite(c)
+    y, mo, d, h, mi, s, ns = [np.where(valid, c, 0).astype(np.int64) for c in cols]
+
+    leap = (y % 4 == 0) & ((y % 100 != 0) | (y % 400 == 0))
+    mo_ok = (mo >= 1) & (mo <= 12)
+    dim = _DAYS_IN_MONTH[np.where(mo_ok, mo, 0)] + ((mo == 2) & leap)
+    valid &= ((y >= 1678) & (y <= 2261) & mo_ok & (d >= 1) & (d <= dim)
+              & (h >= 0) & (h <= 23) & (mi >= 0) & (mi <= 59) & (s >= 0) & (s <= 59)
+              & (ns >= 0) & (ns < 1_000_000_000))
+
+    # days_from_civil (calendrier grégorien proleptique)
+    y = y - (mo <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * ((mo + 9) % 12) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    days = era * 146097 + doe - 719468
+
+    out = ((days * 24 + h) * 60 + mi) * 60 + s
+    out = out * 1_000_000_000 + ns
+    out[~valid] = NAT_NS
+    return out
+
+
+def utc_timestamps(df, cols=UTC_COLS):
+    """Timestamps datetime64[ns] depuis les colonnes UTC_* d'un DataFrame (NaT si invalide)."""
+    return utc_to_ns(*(df[c].to_numpy() for c in cols)).view('datetime64[ns]')
+
+
+def clean_xsens_frame(df):
+    # Cleaning Ghost Packets
+    check_cols = [c for c in GHOST_CHECK_COLS if c in df.columns]
+    if check_cols:
+        df = df.dropna(subset=check_cols, how='all')
+
+    ts = utc_timestamps(df)
+    ok = ~np.isnat(ts)
+    return df.loc[ok].drop(columns=UTC_COLS).assign(TS_UTC=ts[ok])
+
+
+def read_chunks(f, cols, sep, dtypes, int_cols, chunksize=CHUNK_ROWS, coerce=False):
+    """Blocs nettoyés (clean_xsens_frame) et {colonne entière: valeur manquante vue}.
+    coerce : colonnes numériques lues en texte puis converties (jeton invalide -> NaN)."""
+    num_cols = [c for c, t in dtypes.items() if t == 'float64']
+    read_types = {c: (str if coerce and c in num_cols else t) for c, t in dtypes.items()}
+    reader = pd.read_csv(f, sep=sep, header=None, names=cols, dtype=read_types,
+                         index_col=False, chunksize=chunksize)
+    parts = []
+    had_na = dict.fromkeys(int_cols, False)
+    for chunk in reader:
+        if coerce:
+            for c in num_cols:
+                chunk[c] = pd.to_numeric(chunk[c], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        for c in int_cols:
+            had_na[c] = had_na[c] or bool(chunk[c].isna().any())
+        parts.append(clean_xsens_frame(chunk))
+    return parts, had_na
+
+
+def load_xsens(path, chunksize=CHUNK_ROWS):
+    """Charge un export TXT Xsens. Retourne un DataFrame avec 'TS_UTC' (trié, sans doublons),
+    ou un DataFrame vide (avec un warning donnant la raison) si le fichier est illisible."""
+    try:
+        with open(path, 'r', errors='ignore') as f:
+            cols, sep = find_header(f)
+            if cols is None or not set(UTC_COLS).issubset(cols):
+                warnings.warn(f"load_xsens : pas de header Xsens avec les colonnes UTC dans {path}")
+                return pd.DataFrame()
+
+            dtypes, int_cols = infer_schema(f, cols, sep)
+            data_start = f.tell()
+            try:
+                parts, had_na = read_chunks(f, cols, sep, dtypes, int_cols, chunksize)
+            except ValueError as e:
+                warnings.warn(f"load_xsens : {path} ne suit pas le schéma de la première ligne ({e}), "
+                              f"jetons non numériques lus comme NaN")
+                f.seek(data_start)
+                parts, had_na = read_chunks(f, cols, sep, dtypes, int_cols, chunksize, coerce=True)
+
+        if not parts:
+            warnings.warn(f"load_xsens : aucune ligne de données dans {path}")
+            return pd.DataFrame()
+        df = parts[0] if len(parts) == 1 else pd.concat(parts)
+        if df.empty:
+            warnings.warn(f"load_xsens : aucun paquet avec un horodatage UTC valide dans {path}")
+            return pd.DataFrame()
+
+        # Même typage que l'inférence pandas : entier si aucune valeur manquante
+        for c in int_cols:
+            if c in df.columns and not had_na[c]:
+                vals = df[c].values
+                if np.all(vals == np.floor(vals)):
+                    df[c] = vals.astype(np.int64)
+
+        df.sort_values('TS_UTC', inplace=True, kind='stable')
+        df.drop_duplicates(subset=['TS_UTC'], inplace=True)
+        return df
+    except Exception as e:
+        warnings.warn(f"load_xsens : lecture de {path} impossible ({type(e).__name__}: {e})")
+        return pd.DataFrame()
+
+
+def _decode_packet(line, sep, idx_utc, idx_check, idx_counter):
+    """(ns, PacketCounter) d'une ligne de données, ou None si incomplète / ghost packet."""
+    fields = split_fields(line.decode('latin-1'), sep)
+    try:
+        if idx_check and not any(i < len(fields) and fields[i].strip() for i in idx_check):
+            return None
+        utc = [float(fields[i]) for i in idx_utc]
+        counter = int(float(fields[idx_counter])) if idx_counter is not None and fields[idx_counter].strip() else None
+    except (ValueError, IndexError):
+        return None
+    ns = utc_to_ns(*(np.array([v]) for v in utc))[0]
+    return (int(ns), counter) if ns != NAT_NS else None
+
+
+def probe_xsens(path, block_size=PROBE_BLOCK):
+    """Start/end d'un export TXT Xsens sans parsing complet.
+
+    Décode le premier paquet valide après le header et le dernier paquet valide
+    en lisant la fin du fichier (seek), puis estime le nombre de lignes à partir
+    des offsets en octets. Retourne un dict ou None si le fichier est illisible."""
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            header = None
+            for raw in iter(f.readline, b''):
+                header = parse_header_line(raw.decode('latin-1'))
+                if header:
+                    break
+            if not header or not set(UTC_COLS).issubset(header[0]):
+                return None
+            cols, sep = header
+            data_start = f.tell()
+
+            idx_utc = [cols.index(c) for c in UTC_COLS]
+            idx_check = [cols.index(c) for c in GHOST_CHECK_COLS if c in cols]
+            idx_counter = cols.index('PacketCounter') if 'PacketCounter' in cols else None
+            decode = lambda l: _decode_packet(l, sep, idx_utc, idx_check, idx_counter)
+
+            # 1. Début : premier paquet valide
+            head_lines = f.read(block_size).split(b'\n')[:-1]
+            first = next((p for p in map(decode, head_lines) if p), None)
+            if first is None:
+                return None
+
+            # 2. Fin : dernier paquet valide (bloc agrandi si besoin)
+            last, tail_lines, block = None, [], block_size
+            while last is None:
+                pos = max(data_start, size - block)
+                f.seek(pos)
+                tail_lines = f.read().split(b'\n')
+                if pos > data_start:
+                    tail_lines = tail_lines[1:]  # ligne coupée
+                last = next((p for p in map(decode, reversed(tail_lines)) if p), None)
+                if pos == data_start:
+                    break
+                block *= 4
+    except OSError:
+        return None
+
+    # 3. Nombre de lignes estimé depuis la taille moyenne d'une ligne
+    sample = [len(l) + 1 for l in head_lines + tail_lines if l.strip()]
+    rows_est = int(round((size - data_start) / np.mean(sample))) if sample else 0
+
+    start = pd.Timestamp(first[0])
+    end = pd.Timestamp(last[0])
+    duration = (end - start).total_seconds()
+    return {
+        "Start": start,
+        "End": end,
+        "Duration_s": duration,
+        "Rows_Est": rows_est,
+        "Rate_Est_Hz": (rows_est - 1) / duration if duration > 0 else None,
+        "PacketCounter_First": first[1],
+        "PacketCounter_Last": last[1],
+    }